@@ -1,16 +1,65 @@
-"""Preload spacy and model here, to reuse and speed up the process."""
-import spacy
-
-NLP = spacy.load(
-    "de_core_news_sm",
-    exclude=[
-        "tok2vec",
-        "tagger",
-        "morphologizer",
-        "parser",
-        "attribute_ruler",
-        "lemmatizer",
-        "ner",
-    ],
-)
-NLP.enable_pipe("senter")
+"""Provide the spacy model, loaded once and reused to speed up the process.
+
+The model (and other heavy dependencies) are loaded lazily on first use, so importing
+the package stays fast for code paths that never split sentences. Call warm_up() to load
+everything upfront, e.g. when a worker starts. `from lawinprogress import NLP` still
+works and loads the model on access.
+"""
+import threading
+
+_NLP = None
+_NLP_LOCK = threading.Lock()
+
+
+def get_nlp():
+    """Return the spacy pipeline for sentence splitting, loading it on first use."""
+    global _NLP  # pylint: disable=global-statement
+    if _NLP is None:
+        with _NLP_LOCK:
+            if _NLP is None:
+                # pylint: disable=import-outside-toplevel
+                import spacy
+
+                nlp = spacy.load(
+                    "de_core_news_sm",
+                    exclude=[
+                        "tok2vec",
+                        "tagger",
+                        "morphologizer",
+                        "parser",
+                        "attribute_ruler",
+                        "lemmatizer",
+                        "ner",
+                    ],
+                )
+                nlp.enable_pipe("senter")
+                _NLP = nlp
+    return _NLP
+
+
+def warm_up(nlp: bool = True, lookup: bool = True):
+    """Load the heavy dependencies upfront instead of on first use.
+
+    Args:
+        nlp: Load the spacy model.
+        lookup: Load the law lookup index, if the lookup file exists.
+    """
+    # pylint: disable=import-outside-toplevel,unused-import
+    import pdfplumber
+    import rapidfuzz
+
+    from lawinprogress.processing import source_law_retrieval
+
+    if nlp:
+        get_nlp()
+    if lookup:
+        try:
+            source_law_retrieval.FuzzyLawSlugRetriever.get_index()
+        except FileNotFoundError:
+            pass
+
+
+def __getattr__(name: str):
+    if name == "NLP":
+        return get_nlp()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,68 @@
+"""Admission control of the web app: a bounded number of uploads is processed at once.
+
+Without a limit, uploads pile up under load until every one of them is too slow. With
+it, the uploads beyond the limit are turned away right away with a 503 and a
+Retry-After header, while the admitted ones finish in time.
+"""
+import threading
+import weakref
+from typing import Optional
+
+from starlette.background import BackgroundTask
+from starlette.responses import Response
+
+
+class Admission:
+    """Slot of an admitted request; release it once the request is done."""
+
+    def __init__(self, limiter: "AdmissionLimit"):
+        self._limiter = limiter
+        self._released = False
+        self._lock = threading.Lock()
+
+    def release(self):
+        """Free the slot; releasing it again does nothing."""
+        with self._lock:
+            if self._released:
+                return
+            self._released = True
+        self._limiter._release()  # pylint: disable=protected-access
+
+    def release_with(self, response: Response) -> Response:
+        """Free the slot once the response is sent.
+
+        Also if it is never sent or the client goes away meanwhile: then the slot is
+        freed when the response is dropped.
+        """
+        if response.background is not None:
+            raise ValueError("The response has a background task already")
+        response.background = BackgroundTask(self.release)
+        weakref.finalize(response, self.release)
+        return response
+
+
+class AdmissionLimit:
+    """Admit at most limit requests at the same time, without waiting for a slot.
+
+    Args:
+        limit: Number of requests processed at the same time; 0 admits all.
+        retry_after: Seconds after which turned away clients should try again.
+    """
+
+    def __init__(self, limit: int, retry_after: int = 30):
+        self.limit = limit
+        self.retry_after = retry_after
+        self.active = 0
+        self._lock = threading.Lock()
+
+    def try_admit(self) -> Optional[Admission]:
+        """A slot for a request or None if all are taken."""
+        with self._lock:
+            if self.limit > 0 and self.active >= self.limit:
+                return None
+            self.active += 1
+        return Admission(self)
+
+    def _release(self):
+        with self._lock:
+            self.active -= 1
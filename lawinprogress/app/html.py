@@ -1,22 +1,75 @@
 """LiP Webapp."""
+import dataclasses
+import json
 import logging
+import logging.config
 import os
 import random
 import string
 import time
+from concurrent.futures import Future
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
-from anytree import PreOrderIter
-from fastapi import FastAPI, Form, HTTPException, Request, UploadFile
-from fastapi.responses import FileResponse
+from fastapi import FastAPI, Form, HTTPException, Query, Request, UploadFile
+from fastapi.responses import (
+    FileResponse,
+    HTMLResponse,
+    JSONResponse,
+    PlainTextResponse,
+    StreamingResponse,
+)
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 
-from lawinprogress.apply_changes.apply_changes import apply_changes
-from lawinprogress.libdiff.html_diff import html_diffs
-from lawinprogress.parsing.parse_change_law import parse_changes
+from lawinprogress import warm_up
+from lawinprogress.app import prefork
+from lawinprogress.app.admission import Admission, AdmissionLimit
+from lawinprogress.app.job_queue import (
+    DONE,
+    FAILED,
+    QUEUED,
+    JobQueue,
+    QueueFull,
+    process_upload,
+)
+from lawinprogress.app.jobs import Job, JobStore
+from lawinprogress.app.uploads import (
+    UploadRejected,
+    accept_upload,
+    check_content_length,
+)
+from lawinprogress.apply_changes.apply_changes import (
+    preflight_changes,
+    summarize_preflight,
+)
+from lawinprogress.deadline import Deadline, DeadlineExceeded, check_deadline
+from lawinprogress.libdiff.export import EXPORT_FORMATS, export_diff
+from lawinprogress.libdiff.html_diff import collapse_rows
+from lawinprogress.metrics import (
+    REQUEST_SECONDS,
+    REQUESTS,
+    STAGE_SECONDS,
+    count_cache,
+    registry,
+)
 from lawinprogress.parsing.parse_source_law import parse_source_law
+from lawinprogress.pipeline import (
+    FAILED_HTML,
+    LawResult,
+    apply_law,
+    iter_process_laws,
+    load_law,
+    process_laws,
+    shutdown_executor,
+)
+from lawinprogress.processing.law_cache import SizedTTLCache
 from lawinprogress.processing.proposal_pdf_to_artikles import process_pdf
-from lawinprogress.processing.source_law_retrieval import retrieve_source_law
+from lawinprogress.processing.source_law_retrieval import (
+    FuzzyLawSlugRetriever,
+    LawLookupIndex,
+)
+from lawinprogress.result_store import result_store
+from lawinprogress.singleflight import SingleFlight
 
 # setup loggers
 logging.config.fileConfig("logging.conf", disable_existing_loggers=True)
@@ -30,25 +83,166 @@ app.mount("/css", StaticFiles(directory="lawinprogress/templates/css"), name="cs
 
 templates = Jinja2Templates(directory="lawinprogress/templates/")
 
+# seconds between checks for a new version of the law lookup
+LOOKUP_RELOAD_INTERVAL = float(os.environ.get("LIP_LOOKUP_RELOAD_INTERVAL", 60))
+# send the results page law by law as soon as each law is processed
+STREAM_RESULTS = os.environ.get("LIP_STREAM_RESULTS", "1") == "1"
+# unchanged lines shown before and after every change in the collapsed synopsis
+CONTEXT_LINES = int(os.environ.get("LIP_CONTEXT_LINES", 5))
+# render the diff of a law only when it is opened in the results page
+LAZY_DIFFS = os.environ.get("LIP_LAZY_DIFFS", "1") == "1"
+# the full diffs of the laws are kept to serve them and their collapsed lines on demand
+DIFF_CACHE_BYTES = int(os.environ.get("LIP_DIFF_CACHE_BYTES", 256 * 2**20))
+DIFF_CACHE_TTL = float(os.environ.get("LIP_DIFF_CACHE_TTL", 3600))
+# the uploaded change laws are kept to render the diffs of their laws on demand
+JOB_STORE_BYTES = int(os.environ.get("LIP_JOB_STORE_BYTES", 64 * 2**20))
+JOB_TTL = float(os.environ.get("LIP_JOB_TTL", 3600))
+# the jobs are shared with the other workers of the app in this folder; "" disables it
+JOB_DIR = os.environ.get("LIP_JOB_DIR", "./data/jobs/")
+# worker processes for uploads submitted to /jobs and the uploads waiting or running
+UPLOAD_WORKERS = int(os.environ.get("LIP_UPLOAD_WORKERS", 2))
+UPLOAD_QUEUE_DEPTH = int(os.environ.get("LIP_UPLOAD_QUEUE_DEPTH", 16))
+# uploads processed at the same time by this worker of the app; 0 disables the limit
+MAX_CONCURRENT_UPLOADS = int(os.environ.get("LIP_MAX_CONCURRENT_UPLOADS", 4))
+# seconds after which uploads turned away with a 503 should be tried again
+RETRY_AFTER = int(os.environ.get("LIP_RETRY_AFTER", 30))
+# seconds to process an upload or a diff; laws not done by then are marked unfinished
+REQUEST_DEADLINE = float(os.environ.get("LIP_REQUEST_DEADLINE", 120))
+# seconds between writes of the metrics of this worker, for /metrics of the others
+METRICS_FLUSH_INTERVAL = float(os.environ.get("LIP_METRICS_FLUSH_INTERVAL", 1))
+
+diff_cache = SizedTTLCache(max_bytes=DIFF_CACHE_BYTES, ttl=DIFF_CACHE_TTL, name="diff")
+jobs = JobStore(max_bytes=JOB_STORE_BYTES, ttl=JOB_TTL, directory=JOB_DIR or None)
+# uploads of the same pdf in flight, by its hash
+upload_flight = SingleFlight()
+upload_queue = JobQueue(
+    workers=UPLOAD_WORKERS, max_queued=UPLOAD_QUEUE_DEPTH, initializer=warm_up
+)
+upload_admission = AdmissionLimit(MAX_CONCURRENT_UPLOADS, retry_after=RETRY_AFTER)
+
+
+@app.on_event("startup")
+def load_models():
+    """Load the spacy model and the lookup before the first request, not during it."""
+    warm_up()
+
+
+@app.on_event("startup")
+def start_lookup_reloader():
+    """Pick up a new law lookup without restarting the worker."""
+    if LOOKUP_RELOAD_INTERVAL > 0:
+        FuzzyLawSlugRetriever.start_reloader(interval=LOOKUP_RELOAD_INTERVAL)
+
+
+@app.on_event("startup")
+def clear_metrics():
+    """Drop the metrics of an earlier run; with prefork the master already did."""
+    if not prefork.is_worker():
+        registry.clear()
+
+
+@app.on_event("shutdown")
+def stop_workers():
+    """Stop the worker processes."""
+    shutdown_executor()
+
+
+@app.on_event("shutdown")
+def stop_upload_queue():
+    """Stop the worker processes of the queued uploads."""
+    upload_queue.shutdown()
+
+
+@app.on_event("shutdown")
+def stop_lookup_reloader():
+    """Stop watching the law lookup."""
+    FuzzyLawSlugRetriever.stop_reloader()
+
 
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
-    """Log runtime of requests with a unique id."""
+    """Log runtime of requests with a unique id and record it in the metrics."""
     idem = "".join(random.choices(string.ascii_uppercase + string.digits, k=6))
     logger.info(f"rid={idem} start request path={request.url.path}")
     start_time = time.time()
 
     response = await call_next(request)
 
-    process_time = (time.time() - start_time) * 1000
-    formatted_process_time = "{0:.2f}".format(process_time)
+    process_time = time.time() - start_time
+    formatted_process_time = "{0:.2f}".format(process_time * 1000)
     logger.info(
         f"rid={idem} completed_in={formatted_process_time}ms status_code={response.status_code}"
     )
+    # by the path of the route, not of the request, to not get a label per job id
+    route = request.scope.get("route")
+    route_path = getattr(route, "path", "other")
+    REQUEST_SECONDS.observe(process_time, route=route_path)
+    REQUESTS.inc(route=route_path, status=str(response.status_code))
+    registry.flush(interval=METRICS_FLUSH_INTERVAL)
 
     return response
 
 
+@app.middleware("http")
+async def limit_upload_size(request: Request, call_next):
+    """Reject uploads that are too big by their Content-Length, before they are read."""
+    if request.method == "POST":
+        try:
+            check_content_length(request.headers.get("content-length"))
+        except UploadRejected as err:
+            logger.info(f"Rejected upload to {request.url.path}: {err}")
+            if request.url.path == "/":
+                return _error_page(request, str(err), status_code=err.status_code)
+            return JSONResponse(
+                status_code=err.status_code, content={"detail": str(err)}
+            )
+    return await call_next(request)
+
+
+def _error_page(
+    request: Request,
+    message: Optional[str] = None,
+    status_code: int = 200,
+    headers: Optional[Dict[str, str]] = None,
+):
+    """The error page; with the reason if there is one."""
+    return templates.TemplateResponse(
+        "errorpage.html",
+        context={"request": request, "message": message},
+        status_code=status_code,
+        headers=headers,
+    )
+
+
+def _busy_page(request: Request):
+    """The error page of uploads turned away because too many are processed."""
+    logger.info(f"Turned away {request.url.path}: {upload_admission.active} active")
+    return _error_page(
+        request,
+        "Gerade werden zu viele Entwürfe verarbeitet, bitte versuche es gleich nochmal.",
+        status_code=503,
+        headers={"Retry-After": str(upload_admission.retry_after)},
+    )
+
+
+def _busy_error() -> HTTPException:
+    """The 503 of json requests turned away because too many uploads are processed."""
+    logger.info(f"Turned away a request: {upload_admission.active} active")
+    return HTTPException(
+        status_code=503,
+        detail="Too many uploads in progress, try again later.",
+        headers={"Retry-After": str(upload_admission.retry_after)},
+    )
+
+
+def _timeout_page(request: Request, err: DeadlineExceeded):
+    """The error page of uploads whose pdf was not read in time."""
+    logger.info(err)
+    return _error_page(
+        request, "Das Lesen des Entwurfs hat zu lange gedauert.", status_code=503
+    )
+
+
 @app.get("/")
 async def upload_pdf(request: Request):
     """Get the upload form page."""
@@ -59,73 +253,727 @@ async def upload_pdf(request: Request):
 
 
 @app.post("/")
-def generate_diff(request: Request, change_law_pdf: UploadFile = Form(...)):
+def generate_diff(
+    request: Request,
+    change_law_pdf: UploadFile = Form(...),
+    collapse: bool = Form(False),
+):
     """
     Submit the upload form with the pdf path and process it.
 
-    Return the result.
+    Return the result; with STREAM_RESULTS the page is sent law by law as soon as the
+    changes to each law are applied. With LAZY_DIFFS, the page only holds the overview
+    and the diff of a law is loaded from /jobs/ when it is opened. With collapse, only
+    the lines around the changes are shown and the others are loaded on demand.
+    Pdfs that were processed before are served from the result store. Uploads beyond
+    MAX_UPLOAD_BYTES or MAX_UPLOAD_PAGES are rejected before they are processed.
+    At most MAX_CONCURRENT_UPLOADS uploads are processed at a time, further ones get a
+    503; the laws not done within REQUEST_DEADLINE seconds are marked unfinished.
     """
+    deadline = Deadline(REQUEST_DEADLINE)
+    admission = upload_admission.try_admit()
+    if admission is None:
+        return _busy_page(request)
     try:
-        law_titles, proposals_list, full_law_title = process_pdf(change_law_pdf.file)
-        logger.info(f"Processing {change_law_pdf.filename}...")
-
-        results, n_changes, n_success = [], [], []
-        for law_idx, (law_title, change_law_text) in enumerate(
-            zip(law_titles, proposals_list)
-        ):
-            logger.info(f"Started processing change for {law_title}...")
-            # find and load the source law
-            source_law = retrieve_source_law(law_title)
-            if not source_law:
-                results.append("<p></p><p>Source law not found.</p><p></p>")
-
-            # Parse the source and change law and apply the requested changes.
-            # parse source law
-            parsed_law_tree = parse_source_law(source_law, law_title=law_title)
-
-            # parse changes
-            change_requests = parse_changes(change_law_text, law_title)
-
-            # apply changes to the source law
-            res_law_tree, change_results, n_succesfull_applied_changes = apply_changes(
-                parsed_law_tree,
-                change_requests,
+        upload = accept_upload(change_law_pdf.file)
+    except UploadRejected as err:
+        admission.release()
+        logger.info(f"Rejected {change_law_pdf.filename}: {err}")
+        return _error_page(request, str(err), status_code=err.status_code)
+    try:
+        return _results_page(
+            request,
+            upload.sha256,
+            upload.path,
+            name=change_law_pdf.filename,
+            collapse=collapse,
+            deadline=deadline,
+            admission=admission,
+        )
+    except DeadlineExceeded as err:
+        return _timeout_page(request, err)
+    except Exception as err:
+        logger.info(err)
+        return _error_page(request)
+    finally:
+        # the pdf is processed (or stored) once the header of the page is rendered
+        upload.remove()
+
+
+@app.get("/results/{key}")
+def permalink(request: Request, key: str, collapse: bool = False):
+    """Show the stored results of a pdf; processed again if the pipeline changed."""
+    overview = result_store.get_overview(key)
+    pdf_path = result_store.pdf_path(key) if overview is None else None
+    if overview is None and pdf_path is None:
+        raise HTTPException(status_code=404, detail="No results for this pdf.")
+    admission = None
+    if overview is None:
+        # processed again like an upload
+        admission = upload_admission.try_admit()
+        if admission is None:
+            return _busy_page(request)
+    try:
+        return _results_page(
+            request,
+            key,
+            pdf_path,
+            name=overview["name"] if overview else f"{key}.pdf",
+            collapse=collapse,
+            deadline=Deadline(REQUEST_DEADLINE),
+            admission=admission,
+        )
+    except DeadlineExceeded as err:
+        return _timeout_page(request, err)
+    except Exception as err:
+        logger.info(err)
+        return _error_page(request)
+
+
+def _results_page(
+    request: Request,
+    key: str,
+    pdf_path: Optional[str],
+    name: str,
+    collapse: bool,
+    deadline: Optional[Deadline] = None,
+    admission: Optional[Admission] = None,
+):
+    """The results page of the pdf with the hash key, from the store or processed now.
+
+    The pdf at pdf_path is only read before this returns. The admission is released
+    once the page is sent.
+    """
+    try:
+        context = _results_context(request, key, pdf_path, name, collapse, deadline)
+        if STREAM_RESULTS:
+            # render the page incrementally while the laws are processed
+            timer = _RenderTimer()
+            context["result"] = timer.exclude(context["result"])
+            chunks = timer.render(
+                templates.get_template("results_index.html").generate(context)
             )
+            response = StreamingResponse(chunks, media_type="text/html")
+            if admission is not None:
+                admission.release_with(response)
+                admission = None
+            return response
+        context["result"] = list(context["result"])
+        with STAGE_SECONDS.time(stage="render"):
+            return templates.TemplateResponse("results_index.html", context=context)
+    finally:
+        if admission is not None:
+            admission.release()
+
+
+class _RenderTimer:
+    """Time rendering a streamed page, without the time of processing the laws in it."""
+
+    def __init__(self):
+        self.excluded = 0.0
+
+    def exclude(self, items: Iterator) -> Iterator:
+        """Pass on the items, not counting the time to produce them."""
+        for item, seconds in _timed(items):
+            self.excluded += seconds
+            yield item
+
+    def render(self, chunks: Iterator[str]) -> Iterator[str]:
+        """Pass on the chunks of the page and record the render time after them."""
+        spent = 0.0
+        try:
+            for chunk, seconds in _timed(chunks):
+                spent += seconds
+                yield chunk
+        finally:
+            STAGE_SECONDS.observe(max(spent - self.excluded, 0.0), stage="render")
+            registry.flush(interval=METRICS_FLUSH_INTERVAL)
+
+
+def _timed(items: Iterator) -> Iterator[Tuple[Any, float]]:
+    """The items with the seconds it took to produce each."""
+    items = iter(items)
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(items)
+        except StopIteration:
+            return
+        yield item, time.perf_counter() - start
+
+
+def _results_context(
+    request: Request,
+    key: str,
+    pdf_path: Optional[str],
+    name: str,
+    collapse: bool,
+    deadline: Optional[Deadline],
+) -> Dict[str, Any]:
+    """The context of the results page; the sections of the laws are an iterator."""
+    stored_job = _stored_job(key, name, collapse)
+    if stored_job is not None:
+        logger.info(f"Serving the stored results of {name}...")
+        job = dataclasses.replace(stored_job, results=[])
+        jobs.add(job)
+        law_results = _kept_law_results(
+            job, _stored_law_results(job, stored_job.results), store=False
+        )
+    else:
+        # concurrent uploads of the same pdf share its processing and its job
+        law_results = upload_flight.iterate(
+            (key, collapse),
+            _process_pdf_results,
+            pdf_path,
+            key,
+            name,
+            collapse,
+            FuzzyLawSlugRetriever.get_index(),
+            deadline,
+        )
+        job = next(law_results)
+
+    return {
+        "request": request,
+        "law_titles": job.html_titles,
+        "result": _law_sections(job, law_results),
+        "full_title": job.full_title,
+        "name": name,
+        "permalink": f"/results/{key}",
+    }
+
+
+def _process_pdf_results(
+    pdf_path: str,
+    key: str,
+    name: str,
+    collapse: bool,
+    index: LawLookupIndex,
+    deadline: Optional[Deadline],
+) -> Iterator[Any]:
+    """Process a pdf: yield its job, then the results of its laws.
+
+    The laws are processed in parallel in the worker processes. The results are kept
+    here, so only once for all uploads sharing the processing.
+    """
+    law_titles, proposals_list, full_law_title = process_pdf(
+        pdf_path, deadline=deadline
+    )
+    result_store.put_pdf_file(key, pdf_path)
+    logger.info(f"Processing {name}...")
+    job = Job(
+        job_id=JobStore.new_job_id(),
+        name=name,
+        full_title=full_law_title,
+        laws=list(zip(law_titles, proposals_list)),
+        html_titles=[
+            f"{law_idx+1}. {law_title}" for law_idx, law_title in enumerate(law_titles)
+        ],
+        collapse=collapse,
+        pdf_hash=key,
+        index=index,
+    )
+    jobs.add(job)
+    yield job
+    # use the same lookup version for all laws, even if a new one is swapped in
+    # meanwhile (see iter_process_laws)
+    law_results = iter_process_laws(
+        job.laws,
+        html_titles=None if LAZY_DIFFS else job.html_titles,
+        index=index,
+        deadline=deadline,
+    )
+    yield from _kept_law_results(job, law_results)
+
 
-            # generate the html diff
-            applied_change_results = [
-                node.changes
-                for node in PreOrderIter(
-                    res_law_tree,
-                )
-                if node.changes
-            ]
-            # get the diff
-            html_side_by_side = html_diffs(
-                parsed_law_tree.to_text(),
-                res_law_tree.to_text(),
-                applied_change_results,
-                title=f"{law_idx+1}. {law_title}",
+def _stored_job(key: str, name: str, collapse: bool) -> Optional[Job]:
+    """A new job with the stored results of a pdf or None if there are none."""
+    overview = result_store.get_overview(key)
+    count_cache("results", hit=overview is not None)
+    if overview is None:
+        return None
+    return dataclasses.replace(
+        Job.fromdict(overview),
+        job_id=JobStore.new_job_id(),
+        name=name,
+        collapse=collapse,
+        index=FuzzyLawSlugRetriever.get_index(),
+    )
+
+
+def _stored_law_results(
+    job: Job, stored_results: List[LawResult]
+) -> Iterator[LawResult]:
+    """The stored results of the laws of a job, with their diffs unless LAZY_DIFFS."""
+    for law_idx, law_result in enumerate(stored_results):
+        if not LAZY_DIFFS:
+            law_result = dataclasses.replace(
+                law_result, html=_law_rows(job.job_id, law_idx)
             )
-            results.append(html_side_by_side)
-            n_changes.append(len(change_requests))
-            n_success.append(n_succesfull_applied_changes)
-
-        # prepare the html output and return it
-        law_titles = [f"{idx+1}. {title}" for idx, title in enumerate(law_titles)]
-        result = list(zip(law_titles, n_changes, n_success, results))
-        return templates.TemplateResponse(
-            "results_index.html",
-            context={
-                "request": request,
-                "result": result,
-                "full_title": full_law_title,
-                "name": change_law_pdf.filename,
-            },
+        yield law_result
+
+
+def _cache_rows(job_id: str, law_idx: int, rows: List[Tuple[str, str, str]]):
+    """Keep the diff of a law to serve it and its collapsed lines later."""
+    diff_cache.put(
+        (job_id, law_idx), rows, size=sum(len(cell) for row in rows for cell in row)
+    )
+
+
+def _collapse(job: Job, law_idx: int, rows: List[Tuple[str, str, str]]):
+    """Collapse the lines of the diff of a law far from the changes, if requested."""
+    if not job.collapse:
+        return rows
+    return collapse_rows(
+        rows,
+        context=CONTEXT_LINES,
+        url=lambda start, end: (
+            f"/diff/{job.job_id}/{law_idx}/rows?start={start}&end={end}"
+        ),
+    )
+
+
+def _kept_law_results(
+    job: Job, law_results: Iterator[LawResult], store: bool = True
+) -> Iterator[LawResult]:
+    """Pass on the results of the laws of a job and keep them.
+
+    The overview of every law is added to the job, which is shared with the other
+    workers of the app once all laws are processed. With store, the diffs and the
+    overview are kept in the result store as well.
+    """
+    for law_idx, law_result in enumerate(law_results):
+        job.add_result(law_result)
+        if not LAZY_DIFFS and not law_result.unfinished:
+            if store and not law_result.error:
+                result_store.put_rows(job.pdf_hash, law_idx, law_result.html)
+            if job.collapse:
+                _cache_rows(job.job_id, law_idx, law_result.html)
+        yield law_result
+    # share the overview of all laws with the other workers of the app
+    jobs.add(job)
+    if store and not any(law_result.error for law_result in job.results):
+        # failures may be temporary, e.g. the api of the source laws is down
+        result_store.put_overview(job.pdf_hash, job.todict())
+
+
+def _law_sections(job: Job, law_results: Iterator[LawResult]) -> Iterator[Tuple]:
+    """The sections of the results page, one per law.
+
+    Laws that were not done in time get a note instead of their diff. If processing
+    the laws fails once the page is streamed, the remaining laws get a note, so the
+    page is still completed.
+
+    Yields:
+        Title, number of changes, number of successful changes, the rows of the diff
+        (None if it is loaded when the law is opened) and the url of the diff.
+    """
+    law_results = iter(law_results)
+    failed = False
+    for law_idx, html_title in enumerate(job.html_titles):
+        n_changes, n_success, rows = 0, 0, FAILED_HTML
+        if not failed:
+            try:
+                law_result = next(law_results)
+                n_changes, n_success = law_result.n_changes, law_result.n_success
+                rows = None
+                if law_result.unfinished:
+                    rows = law_result.html
+                elif not LAZY_DIFFS:
+                    rows = _collapse(job, law_idx, law_result.html)
+            except StopIteration:
+                return
+            except Exception as err:  # pylint: disable=broad-except
+                logger.warning(f"Failed to process {job.name}: {err!r}", exc_info=err)
+                failed = True
+                rows = FAILED_HTML
+        yield (
+            html_title,
+            n_changes,
+            n_success,
+            rows,
+            f"/jobs/{job.job_id}/laws/{law_idx}",
         )
-    except Exception as err:
+    if not failed:
+        # let the results be kept once all laws are processed
+        try:
+            next(law_results, None)
+        except Exception as err:  # pylint: disable=broad-except
+            logger.warning(f"Failed to keep {job.name}: {err!r}", exc_info=err)
+
+
+def _law_rows(
+    job_id: str, law_idx: int, deadline: Optional[Deadline] = None
+) -> List[Tuple[str, str, str]]:
+    """The diff of a law of a job, from the caches or rendered now.
+
+    Rendering it takes a slot of the uploads; if there is none, a 503 is raised. If it
+    is not rendered before the deadline, a note is returned and nothing is kept.
+    """
+    found, rows = diff_cache.get((job_id, law_idx))
+    if found:
+        return rows
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="The job is not known anymore.")
+    if not 0 <= law_idx < len(job.laws):
+        raise HTTPException(status_code=404, detail="The job has no such law.")
+    rows = result_store.get_rows(job.pdf_hash, law_idx) if job.pdf_hash else None
+    count_cache("results", hit=rows is not None)
+    if rows is None:
+        admission = upload_admission.try_admit()
+        if admission is None:
+            raise _busy_error()
+        try:
+            law_result = process_laws(
+                [job.laws[law_idx]],
+                html_titles=[job.html_titles[law_idx]],
+                index=job.index,
+                deadline=deadline,
+            )[0]
+        finally:
+            admission.release()
+        rows = law_result.html
+        if law_result.unfinished:
+            return rows
+        if job.pdf_hash and not law_result.error:
+            result_store.put_rows(job.pdf_hash, law_idx, rows)
+    _cache_rows(job_id, law_idx, rows)
+    return rows
+
+
+def _rows_html(rows: List[Tuple[str, str, str]]) -> HTMLResponse:
+    """The divs of the rows of a diff, as they are placed in the page."""
+    return HTMLResponse("\n".join("\n".join(row) for row in rows))
+
+
+@app.post("/jobs", status_code=202)
+def submit_job(change_law_pdf: UploadFile = Form(...), collapse: bool = Form(False)):
+    """
+    Queue the uploaded change law to be processed by the worker processes.
+
+    Return the job id and the urls to poll its status and to get its result.
+    """
+    try:
+        upload = accept_upload(change_law_pdf.file)
+    except UploadRejected as err:
+        logger.info(f"Rejected {change_law_pdf.filename}: {err}")
+        raise HTTPException(status_code=err.status_code, detail=str(err))
+    try:
+        return _queue_upload(
+            upload.sha256, upload.path, change_law_pdf.filename, collapse
+        )
+    finally:
+        upload.remove()
+
+
+def _queue_upload(key: str, pdf_path: str, name: str, collapse: bool):
+    """Queue the pdf with the hash key, unless its results are stored or in flight."""
+    job = _stored_job(key, name, collapse)
+    if job is not None:
+        # processed before; done right away
+        jobs.add(job)
+        jobs.set_status(job.job_id, {"status": DONE})
+        return _job_urls(job.job_id, key)
+
+    # the workers read the pdf from the result store, it outlives the request
+    result_store.put_pdf_file(key, pdf_path)
+    job_id = JobStore.new_job_id()
+    # tell the other workers of the app about the job
+    jobs.set_status(job_id, {"status": QUEUED})
+    try:
+        queued_job_id, future = upload_queue.submit_once(
+            key,
+            job_id,
+            process_upload,
+            job_id,
+            name,
+            result_store.pdf_path(key),
+            key,
+            collapse,
+        )
+    except QueueFull:
+        jobs.set_status(job_id, None)
+        raise HTTPException(
+            status_code=503, detail="Too many uploads in progress, try again later."
+        )
+    if queued_job_id != job_id:
+        # the same pdf is in the queue already; share its job
+        jobs.set_status(job_id, None)
+        return _job_urls(queued_job_id, key)
+    logger.info(f"Queued {name} as job {job_id}")
+    future.add_done_callback(lambda future: _store_finished_job(job_id, future))
+    return _job_urls(job_id, key)
+
+
+def _job_urls(job_id: str, key: str) -> Dict[str, str]:
+    """The job id and the urls of a submitted job."""
+    return {
+        "job_id": job_id,
+        "status_url": f"/jobs/{job_id}/status",
+        "result_url": f"/jobs/{job_id}/result",
+        "permalink": f"/results/{key}",
+    }
+
+
+def _task_error(future: Future) -> str:
+    """The error of a failed task as shown to the user."""
+    if future.cancelled():
+        return "The job was cancelled."
+    err = future.exception()
+    return f"{type(err).__name__}: {err}"
+
+
+def _store_finished_job(job_id: str, future: Future):
+    """Keep the job of a processed upload to serve its result and diffs."""
+    if future.cancelled() or future.exception() is not None:
+        jobs.set_status(job_id, {"status": FAILED, "error": _task_error(future)})
+        return
+    job = future.result()
+    # the diffs are rendered with the lookup of the web app process
+    job.index = FuzzyLawSlugRetriever.get_index()
+    jobs.add(job)
+    jobs.set_status(job_id, {"status": DONE})
+    if not any(law_result.error for law_result in job.results):
+        result_store.put_overview(job.pdf_hash, job.todict())
+
+
+def _job_status(job_id: str) -> Tuple[str, Optional[Job], Optional[str]]:
+    """Status of a job, the job itself if it is done and the error if it failed."""
+    job = jobs.get(job_id)
+    if job is not None:
+        return DONE, job, None
+    status = upload_queue.status(job_id)
+    if status == DONE:
+        # the job is not stored yet or was too big to store
+        return status, upload_queue.result(job_id), None
+    if status == FAILED:
+        return status, None, _task_error(upload_queue.future(job_id))
+    if status is not None:
+        return status, None, None
+    # queued by another worker of the app
+    shared_status = jobs.status(job_id)
+    if shared_status is None or shared_status["status"] == DONE:
+        raise HTTPException(status_code=404, detail="The job is not known anymore.")
+    return shared_status["status"], None, shared_status.get("error")
+
+
+@app.get("/jobs/{job_id}/status")
+def job_status(job_id: str):
+    """Return whether a job is queued, running, done or failed."""
+    status, _, _ = _job_status(job_id)
+    return {"job_id": job_id, "status": status}
+
+
+@app.get("/jobs/{job_id}/result")
+def job_result(job_id: str):
+    """
+    Return the overview of the laws of a processed job and the urls of their diffs.
+
+    Responds with 202 and the status while the job is queued or running.
+    """
+    status, job, error = _job_status(job_id)
+    if status == FAILED:
+        return JSONResponse(
+            status_code=422,
+            content={"job_id": job_id, "status": status, "error": error},
+        )
+    if job is None:
+        return JSONResponse(
+            status_code=202, content={"job_id": job_id, "status": status}
+        )
+    result = job.overview()
+    result["status"] = status
+    for law_idx, law in enumerate(result["laws"]):
+        law["url"] = f"/jobs/{job_id}/laws/{law_idx}"
+    return result
+
+
+@app.get("/jobs/{job_id}")
+def job_overview(job_id: str):
+    """Return the affected laws of an uploaded change law and their number of changes."""
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="The job is not known anymore.")
+    return job.overview()
+
+
+@app.get("/jobs/{job_id}/laws/{law_idx}")
+def law_diff(job_id: str, law_idx: int):
+    """Return the html of the diff of one law of a job, rendered when first requested."""
+    rows = _law_rows(job_id, law_idx, deadline=Deadline(REQUEST_DEADLINE))
+    job = jobs.get(job_id)
+    return _rows_html(_collapse(job, law_idx, rows) if job is not None else rows)
+
+
+def _export_job(
+    job: Job, export_format: str, law_indices: List[int], deadline: Deadline
+) -> Iterator[str]:
+    """Export the diffs of the laws of a job line by line.
+
+    The laws not done before the deadline are exported with an error instead.
+    """
+    for law_idx in law_indices:
+        law_title, change_law_text = job.laws[law_idx]
+        try:
+            applied = apply_law(
+                law_title, change_law_text, index=job.index, deadline=deadline
+            )
+            error = None if applied.source_tree else "Source law not found."
+        except DeadlineExceeded as err:
+            logger.info(f"Failed to export {law_title}: {err}")
+            error = "Not finished within the time limit."
+        except Exception as err:  # pylint: disable=broad-except
+            logger.warning(f"Failed to export {law_title}: {err!r}")
+            error = "Failed to apply the changes to this law."
+        if error:
+            if export_format == "jsonl":
+                yield json.dumps({"law": law_title, "error": error}) + "\n"
+            continue
+        yield from export_diff(
+            applied.source_tree,
+            applied.result_tree,
+            applied.change_results(),
+            law_title,
+            export_format,
+        )
+
+
+@app.get("/jobs/{job_id}/export")
+def export_job(
+    job_id: str,
+    export_format: str = Query("jsonl", alias="format"),
+    law: Optional[int] = None,
+):
+    """
+    Export the diffs of all laws of a job, or of one law, as json lines or unified diff.
+
+    The export is streamed law by law. Like uploads, it takes one of the
+    MAX_CONCURRENT_UPLOADS slots until it is sent and has REQUEST_DEADLINE seconds.
+    """
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="The job is not known anymore.")
+    if export_format not in EXPORT_FORMATS:
+        raise HTTPException(
+            status_code=422, detail=f"Use one of the formats {list(EXPORT_FORMATS)}."
+        )
+    if law is not None and not 0 <= law < len(job.laws):
+        raise HTTPException(status_code=404, detail="The job has no such law.")
+    law_indices = list(range(len(job.laws))) if law is None else [law]
+    admission = upload_admission.try_admit()
+    if admission is None:
+        raise _busy_error()
+    response = StreamingResponse(
+        _export_job(
+            job, export_format, law_indices, deadline=Deadline(REQUEST_DEADLINE)
+        ),
+        media_type=EXPORT_FORMATS[export_format],
+    )
+    return admission.release_with(response)
+
+
+@app.get("/diff/{diff_id}/{law_idx}/rows")
+def diff_rows(diff_id: str, law_idx: int, start: int, end: int):
+    """Return the html of a range of rows of a diff, to expand collapsed lines."""
+    rows = _law_rows(diff_id, law_idx, deadline=Deadline(REQUEST_DEADLINE))
+    if not 0 <= start < end <= len(rows):
+        raise HTTPException(status_code=422, detail="Invalid range of rows.")
+    return _rows_html(rows[start:end])
+
+
+@app.get("/metrics")
+def get_metrics():
+    """Return the metrics of all processes of the app in the Prometheus text format."""
+    return PlainTextResponse(
+        registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+@app.post("/preflight")
+def preflight(change_law_pdf: UploadFile = Form(...)):
+    """
+    Check how many changes of the uploaded change law would resolve, without applying them.
+
+    Return the classification of the changes per affected law as json; laws that
+    could not be checked hold the error instead. Like uploads, at most
+    MAX_CONCURRENT_UPLOADS are checked at a time, further ones get a 503, and each has
+    REQUEST_DEADLINE seconds.
+    """
+    deadline = Deadline(REQUEST_DEADLINE)
+    admission = upload_admission.try_admit()
+    if admission is None:
+        raise _busy_error()
+    try:
+        return _preflight(change_law_pdf, deadline)
+    except DeadlineExceeded as err:
         logger.info(err)
-        return templates.TemplateResponse(
-            "errorpage.html",
-            context={"request": request},
+        raise HTTPException(
+            status_code=503, detail="The check of the pdf took too long."
+        )
+    finally:
+        admission.release()
+
+
+def _preflight(change_law_pdf: UploadFile, deadline: Deadline) -> Dict[str, Any]:
+    """The classification of the changes per affected law of an uploaded pdf."""
+    try:
+        upload = accept_upload(change_law_pdf.file)
+    except UploadRejected as err:
+        logger.info(f"Rejected {change_law_pdf.filename}: {err}")
+        raise HTTPException(status_code=err.status_code, detail=str(err))
+    try:
+        law_titles, proposals_list, full_law_title = process_pdf(
+            upload.path, deadline=deadline
         )
+    except DeadlineExceeded:
+        raise
+    except Exception as err:
+        logger.info(err)
+        raise HTTPException(status_code=422, detail="Could not process the pdf.")
+    finally:
+        upload.remove()
+    logger.info(f"Preflight {change_law_pdf.filename}...")
+    lookup_index = FuzzyLawSlugRetriever.get_index()
+
+    laws = []
+    for law_title, change_law_text in zip(law_titles, proposals_list):
+        law = {
+            "title": law_title,
+            "source_law_found": False,
+            "n_changes": 0,
+            "counts": None,
+            "changes": [],
+            "error": None,
+        }
+        # one failing law does not fail the others
+        try:
+            _preflight_law(law, change_law_text, lookup_index, deadline)
+        except DeadlineExceeded as err:
+            logger.info(err)
+            law["error"] = "Not finished within the time limit."
+        except Exception as err:  # pylint: disable=broad-except
+            logger.warning(f"Failed to check {law_title}: {err!r}", exc_info=err)
+            law["error"] = f"{type(err).__name__}: {err}"
+        laws.append(law)
+    return {"name": change_law_pdf.filename, "full_title": full_law_title, "laws": laws}
+
+
+def _preflight_law(
+    law: Dict[str, Any],
+    change_law_text: str,
+    lookup_index: LawLookupIndex,
+    deadline: Deadline,
+):
+    """Fill in the classification of the changes to a law."""
+    applied = load_law(
+        law["title"], change_law_text, index=lookup_index, deadline=deadline
+    )
+    law["n_changes"] = applied.n_changes
+    if applied.source_law:
+        check_deadline(deadline, "parsing the source law")
+        parsed_law_tree = parse_source_law(applied.source_law, law_title=law["title"])
+        preflight_results = preflight_changes(parsed_law_tree, applied.changes)
+        law["source_law_found"] = True
+        law["counts"] = summarize_preflight(preflight_results)
+        law["changes"] = [result.todict() for result in preflight_results]
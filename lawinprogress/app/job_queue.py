@@ -0,0 +1,209 @@
+"""Queue of uploads of the web app, processed by a pool of worker processes.
+
+Processing an upload (reading the pdf, parsing and applying the changes) is CPU work
+for seconds. Instead of doing it in a request handler, uploads are submitted to a pool
+of worker processes and their status and result are polled by the job id. The pool is
+part of the web app process, no broker is needed.
+"""
+import collections
+import logging
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from lawinprogress.app.jobs import Job
+from lawinprogress.metrics import registry
+from lawinprogress.pipeline import iter_process_laws
+from lawinprogress.processing.proposal_pdf_to_artikles import process_pdf
+from lawinprogress.processing.source_law_retrieval import FuzzyLawSlugRetriever
+
+logger = logging.getLogger(__name__)
+
+# status of a task
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class QueueFull(Exception):
+    """Raised if too many tasks are waiting or running."""
+
+
+class JobQueue:
+    """Run tasks in a pool of worker processes and keep their status by id.
+
+    Args:
+        workers: Number of worker processes.
+        max_queued: Upper bound of the tasks waiting or running at the same time.
+        initializer: Called in every worker process when it starts.
+        keep_finished: Number of finished tasks whose results are kept.
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        max_queued: int,
+        initializer: Optional[Callable[[], Any]] = None,
+        keep_finished: int = 1000,
+    ):
+        self.workers = workers
+        self.max_queued = max_queued
+        self.initializer = initializer
+        self.keep_finished = keep_finished
+        self._executor = None
+        self._tasks = collections.OrderedDict()
+        self._keys: Dict[Hashable, str] = {}  # task in flight per key of submit_once
+        self._lock = threading.RLock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, initializer=self.initializer
+            )
+        return self._executor
+
+    def pending(self) -> int:
+        """Number of tasks waiting or running."""
+        with self._lock:
+            return sum(not future.done() for future in self._tasks.values())
+
+    def submit(self, task_id: str, func: Callable, *args) -> Future:
+        """Run func(*args) in a worker process.
+
+        Raises:
+            QueueFull if max_queued tasks are waiting or running already.
+        """
+        with self._lock:
+            return self._submit(task_id, func, *args)
+
+    def submit_once(
+        self, key: Hashable, task_id: str, func: Callable, *args
+    ) -> Tuple[str, Future]:
+        """Run func(*args) unless a task with the same key is waiting or running.
+
+        Returns:
+            The id and future of the new task or of the one in flight for the key.
+
+        Raises:
+            QueueFull if max_queued tasks are waiting or running already.
+        """
+        with self._lock:
+            in_flight = self._keys.get(key)
+            if in_flight is not None and not self._tasks[in_flight].done():
+                return in_flight, self._tasks[in_flight]
+            future = self._submit(task_id, func, *args)
+            self._keys[key] = task_id
+            future.add_done_callback(lambda _: self._forget_key(key, task_id))
+            return task_id, future
+
+    def _forget_key(self, key: Hashable, task_id: str):
+        with self._lock:
+            if self._keys.get(key) == task_id:
+                del self._keys[key]
+
+    def _submit(self, task_id: str, func: Callable, *args) -> Future:
+        """Submit a task; the lock must be held by the caller."""
+        if sum(not future.done() for future in self._tasks.values()) >= (
+            self.max_queued
+        ):
+            raise QueueFull(f"{self.max_queued} tasks are queued already")
+        try:
+            future = self._get_executor().submit(func, *args)
+        except BrokenProcessPool:
+            # a worker died; start a new pool
+            logger.warning("Restarting the broken worker pool of the job queue")
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            future = self._get_executor().submit(func, *args)
+        self._tasks[task_id] = future
+        self._forget_finished()
+        return future
+
+    def _forget_finished(self):
+        """Drop the oldest finished tasks beyond keep_finished."""
+        finished = [task_id for task_id, future in self._tasks.items() if future.done()]
+        for task_id in finished[: max(len(finished) - self.keep_finished, 0)]:
+            del self._tasks[task_id]
+
+    def status(self, task_id: str) -> Optional[str]:
+        """Status of the task or None if it is unknown."""
+        future = self._tasks.get(task_id)
+        if future is None:
+            return None
+        if not future.done():
+            return RUNNING if future.running() else QUEUED
+        if future.cancelled() or future.exception() is not None:
+            return FAILED
+        return DONE
+
+    def future(self, task_id: str) -> Future:
+        """Future of the task.
+
+        Raises:
+            KeyError if the task is unknown.
+        """
+        return self._tasks[task_id]
+
+    def result(self, task_id: str) -> Any:
+        """Result of a finished task.
+
+        Raises:
+            KeyError if the task is unknown, the exception of the task if it failed and
+            concurrent.futures.TimeoutError if it is not finished yet.
+        """
+        return self._tasks[task_id].result(timeout=0)
+
+    def shutdown(self):
+        """Stop the worker processes; waiting tasks are cancelled."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        # not under the lock, the callbacks of the finishing tasks take it
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+def process_upload(
+    job_id: str, name: str, pdf_path: str, key: str, collapse: bool = False
+) -> Job:
+    """Process an uploaded change law in a worker process.
+
+    The pdf is read from pdf_path; key is its hash, the key of its results. The laws
+    are processed one after another in the worker; their diffs are rendered when they
+    are requested.
+
+    Returns:
+        The Job with the results of all affected laws, without lookup index.
+    """
+    try:
+        FuzzyLawSlugRetriever.reload_if_changed()
+    except (OSError, ValueError, KeyError) as err:
+        # keep using the current index if the new file is broken
+        logger.warning(f"Failed to reload law lookup: {err}")
+    try:
+        return _process_upload(job_id, name, pdf_path, key, collapse)
+    finally:
+        # the stage latencies of the worker, for /metrics of the app
+        registry.flush()
+
+
+def _process_upload(
+    job_id: str, name: str, pdf_path: str, key: str, collapse: bool
+) -> Job:
+    """Read the pdf and process its laws; see process_upload."""
+    law_titles, proposals_list, full_law_title = process_pdf(pdf_path)
+    job = Job(
+        job_id=job_id,
+        name=name,
+        full_title=full_law_title,
+        laws=list(zip(law_titles, proposals_list)),
+        html_titles=[
+            f"{law_idx+1}. {law_title}" for law_idx, law_title in enumerate(law_titles)
+        ],
+        collapse=collapse,
+        pdf_hash=key,
+    )
+    for law_result in iter_process_laws(job.laws, workers=1):
+        job.add_result(law_result)
+    return job
@@ -0,0 +1,198 @@
+"""Jobs of the web app: an uploaded change law and the overview of its affected laws."""
+import dataclasses
+import json
+import os
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+from lawinprogress.pipeline import LawResult
+from lawinprogress.processing.law_cache import SizedTTLCache
+from lawinprogress.processing.source_law_retrieval import LawLookupIndex
+from lawinprogress.storage import atomic_write_json
+
+
+@dataclasses.dataclass
+class Job:
+    """Class for storing an uploaded change law and the results of its laws.
+
+    Only the overview of the results is kept; the diffs of the laws are rendered when
+    they are requested and cached separately.
+    """
+
+    job_id: str
+    name: str
+    full_title: str
+    laws: List[Tuple[str, str]]  # law title and change law text
+    html_titles: List[str]
+    collapse: bool = False
+    pdf_hash: Optional[str] = None  # key of the results in the result store
+    index: Optional[LawLookupIndex] = None
+    results: List[LawResult] = dataclasses.field(default_factory=list)
+
+    def add_result(self, law_result: LawResult):
+        """Keep the overview of the result of the next law, without its texts."""
+        self.results.append(
+            dataclasses.replace(law_result, source_text="", modified_text="", html=[])
+        )
+
+    def size(self) -> int:
+        """Approximate size of the job in bytes, dominated by the change law texts."""
+        return sum(len(law_title) + len(text) for law_title, text in self.laws)
+
+    def todict(self) -> Dict[str, Any]:
+        """The job as json, without the lookup index."""
+        asdict = {
+            field.name: getattr(self, field.name)
+            for field in dataclasses.fields(self)
+            if field.name != "index"
+        }
+        asdict["results"] = [dataclasses.asdict(result) for result in self.results]
+        return asdict
+
+    @classmethod
+    def fromdict(cls, asdict: Dict[str, Any]) -> "Job":
+        """Return a Job from an object dumped with todict()."""
+        return cls(
+            **{
+                **asdict,
+                "laws": [tuple(law) for law in asdict["laws"]],
+                "results": [LawResult(**result) for result in asdict["results"]],
+            }
+        )
+
+    def overview(self) -> Dict[str, Any]:
+        """The job and the results of the laws processed so far as json."""
+        return {
+            "job_id": self.job_id,
+            "name": self.name,
+            "full_title": self.full_title,
+            "n_laws": len(self.laws),
+            "laws": [
+                {
+                    "title": result.law_title,
+                    "source_law_found": result.source_law_found,
+                    "n_changes": result.n_changes,
+                    "n_success": result.n_success,
+                    "error": result.error,
+                }
+                for result in self.results
+            ],
+        }
+
+
+class JobStore:
+    """Jobs by id; the least recently used ones are dropped first.
+
+    With a directory, the jobs and the status of queued jobs are also written there, so
+    all worker processes of the web app serving the same directory know them.
+
+    Args:
+        max_bytes: Upper bound of the summed size of all jobs in memory (see Job.size).
+        ttl: Seconds after which a job is dropped.
+        directory: Folder to share the jobs in; None keeps them in memory only.
+        expire_interval: Seconds between removals of the expired files of the folder.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int,
+        ttl: float,
+        directory: Optional[str] = None,
+        expire_interval: float = 60,
+    ):
+        self._cache = SizedTTLCache(max_bytes=max_bytes, ttl=ttl)
+        self.ttl = ttl
+        self.directory = directory
+        self.expire_interval = expire_interval
+        self._expired_at = None
+
+    @staticmethod
+    def new_job_id() -> str:
+        """A new, unguessable job id."""
+        return uuid.uuid4().hex
+
+    def _path(self, job_id: str, kind: str) -> Optional[str]:
+        """Path of the file of a job; None for ids that are no file names."""
+        if self.directory is None or not job_id.isalnum():
+            return None
+        return os.path.join(self.directory, f"{job_id}.{kind}.json")
+
+    def _read(self, job_id: str, kind: str) -> Optional[Any]:
+        """Json of the file of a job or None if it is missing or expired."""
+        path = self._path(job_id, kind)
+        if path is None:
+            return None
+        try:
+            if os.path.getmtime(path) + self.ttl <= time.time():
+                os.remove(path)
+                return None
+            with open(path, "r", encoding="utf8") as job_file:
+                return json.load(job_file)
+        except (OSError, ValueError):
+            return None
+
+    def _remove_expired(self):
+        """Remove the files of the jobs older than the time to live.
+
+        Scans the folder at most every expire_interval seconds; expired files found
+        meanwhile are removed when they are read.
+        """
+        now = time.monotonic()
+        if (
+            self._expired_at is not None
+            and now - self._expired_at < self.expire_interval
+        ):
+            return
+        self._expired_at = now
+        expired = time.time() - self.ttl
+        if not os.path.isdir(self.directory):
+            # nothing stored yet
+            return
+        with os.scandir(self.directory) as dir_entries:
+            for dir_entry in dir_entries:
+                try:
+                    if dir_entry.stat().st_mtime <= expired:
+                        os.remove(dir_entry.path)
+                except FileNotFoundError:
+                    pass
+
+    def add(self, job: Job) -> bool:
+        """Store a job; returns False if it is too big to be stored in memory."""
+        path = self._path(job.job_id, "job")
+        if path is not None:
+            self._remove_expired()
+            atomic_write_json(path, job.todict())
+        return self._cache.put(job.job_id, job, size=job.size())
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """The job with the id or None if it is unknown or was dropped."""
+        _, job = self._cache.get(job_id)
+        if job is None:
+            asdict = self._read(job_id, "job")
+            if asdict is not None:
+                job = Job.fromdict(asdict)
+                self._cache.put(job_id, job, size=job.size())
+        return job
+
+    def set_status(self, job_id: str, status: Optional[Dict[str, Any]]):
+        """Share the status of a queued job with the other processes; None removes it."""
+        path = self._path(job_id, "status")
+        if path is None:
+            return
+        if status is not None:
+            atomic_write_json(path, status)
+            return
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            # removed by another process meanwhile
+            pass
+
+    def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """The status of a queued job set by any process or None if it is unknown."""
+        return self._read(job_id, "status")
+
+    def clear(self):
+        """Drop all jobs."""
+        self._cache.clear()
@@ -0,0 +1,195 @@
+"""Serve the web app from warm worker processes forked from one master process.
+
+The master loads the read-only structures (spacy model, law lookup, the app and its
+templates) once and forks the uvicorn workers, which share these pages copy-on-write
+instead of loading a copy each. The loaded objects are moved out of reach of the
+garbage collector with gc.freeze(), as collecting them would write to their pages and
+copy them into every worker.
+
+The master restarts workers that die and logs the memory of every worker; the unique
+set size (USS) is the memory a worker does not share with the others.
+"""
+import gc
+import logging
+import os
+import signal
+import socket
+import time
+from typing import Dict, List, Optional
+
+from lawinprogress.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# pid of the master process, once it forks the workers
+_master_pid = None
+
+PROC_DIR = "/proc"
+# fields of /proc/<pid>/smaps_rollup, in kB
+_SMAPS_FIELDS = {
+    "Rss": "rss",
+    "Pss": "pss",
+    "Shared_Clean": "shared",
+    "Shared_Dirty": "shared",
+    "Private_Clean": "uss",
+    "Private_Dirty": "uss",
+}
+
+
+def memory_usage(pid: int) -> Optional[Dict[str, int]]:
+    """Resident, proportional, shared and unique memory of a process in bytes.
+
+    Returns:
+        Dict with rss, pss, shared and uss or None if the memory maps of the process
+        cannot be read (not linux or the process ended).
+    """
+    usage = {"rss": 0, "pss": 0, "shared": 0, "uss": 0}
+    try:
+        smaps_path = os.path.join(PROC_DIR, str(pid), "smaps_rollup")
+        with open(smaps_path, encoding="utf8") as smaps_file:
+            for line in smaps_file:
+                field, _, value = line.partition(":")
+                if field in _SMAPS_FIELDS:
+                    usage[_SMAPS_FIELDS[field]] += int(value.split()[0]) * 1024
+    except (OSError, ValueError, IndexError):
+        return None
+    return usage
+
+
+def is_worker() -> bool:
+    """Whether this process is a worker forked by a PreforkServer."""
+    return _master_pid is not None and os.getpid() != _master_pid
+
+
+def pipeline_workers_per_worker(workers: int) -> int:
+    """Size of the pipeline pool of every worker, so the pools use every cpu once."""
+    return max((os.cpu_count() or 1) // workers, 1)
+
+
+def _format_usage(usage: Optional[Dict[str, int]]) -> str:
+    if usage is None:
+        return "memory unknown"
+    return " ".join(f"{key}={value / 2**20:.1f}MB" for key, value in usage.items())
+
+
+def load_app():
+    """Load the app and everything it reads only, then freeze it for the workers."""
+    # pylint: disable=import-outside-toplevel
+    from lawinprogress import warm_up
+    from lawinprogress.app.html import app
+
+    warm_up()
+    gc.collect()
+    gc.freeze()
+    return app
+
+
+def _run_worker(app, listen_socket: socket.socket, log_level: str):
+    """Serve the app on the inherited socket until the worker is stopped."""
+    # pylint: disable=import-outside-toplevel
+    import uvicorn
+
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, signal.SIG_DFL)
+    config = uvicorn.Config(app, log_level=log_level)
+    uvicorn.Server(config).run(sockets=[listen_socket])
+
+
+class PreforkServer:
+    """Master process forking and supervising the workers.
+
+    Args:
+        app: The loaded app to serve.
+        host: Address to listen on.
+        port: Port to listen on.
+        workers: Number of worker processes.
+        report_interval: Seconds between reports of the memory of the workers; 0
+                         only reports once after the workers started.
+        log_level: Log level of uvicorn in the workers.
+    """
+
+    def __init__(
+        self,
+        app,
+        host: str,
+        port: int,
+        workers: int,
+        report_interval: float = 600,
+        log_level: str = "info",
+    ):
+        self.app = app
+        self.workers = workers
+        self.report_interval = report_interval
+        self.log_level = log_level
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.socket.bind((host, port))
+        self.socket.listen(2048)
+        self.socket.set_inheritable(True)
+        self.pids: List[int] = []
+        self._stopping = False
+
+    def _spawn(self) -> int:
+        pid = os.fork()
+        if pid == 0:
+            exit_code = 0
+            try:
+                _run_worker(self.app, self.socket, self.log_level)
+            except BaseException:  # pylint: disable=broad-except
+                logger.exception("Worker failed")
+                exit_code = 1
+            finally:
+                os._exit(exit_code)  # pylint: disable=protected-access
+        logger.info(f"Started worker pid={pid}")
+        return pid
+
+    def _stop(self, signum, frame):  # pylint: disable=unused-argument
+        self._stopping = True
+
+    def report_memory(self):
+        """Log the memory of the master and of every worker."""
+        logger.info(
+            f"master pid={os.getpid()} {_format_usage(memory_usage(os.getpid()))}"
+        )
+        for pid in self.pids:
+            logger.info(f"worker pid={pid} {_format_usage(memory_usage(pid))}")
+
+    def run(self):
+        """Fork the workers, restart dead ones and stop them on SIGTERM or SIGINT."""
+        global _master_pid  # pylint: disable=global-statement
+        _master_pid = os.getpid()
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+        # the metrics of an earlier run; the workers keep the ones of restarted workers
+        registry.clear()
+        self.pids = [self._spawn() for _ in range(self.workers)]
+        # let the workers start before the first report
+        next_report = time.monotonic() + 10
+        while not self._stopping:
+            time.sleep(0.5)
+            pid, status = 0, 0
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                pass
+            if pid in self.pids and not self._stopping:
+                logger.warning(f"Worker pid={pid} exited with {status}; restarting it")
+                self.pids[self.pids.index(pid)] = self._spawn()
+            if next_report is not None and time.monotonic() >= next_report:
+                self.report_memory()
+                next_report = (
+                    time.monotonic() + self.report_interval
+                    if self.report_interval > 0
+                    else None
+                )
+        for pid in self.pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        for pid in self.pids:
+            try:
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                pass
+        self.socket.close()
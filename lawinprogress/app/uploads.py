@@ -0,0 +1,165 @@
+"""Uploaded pdfs, spooled to disk and checked before they are processed.
+
+An upload is copied to a temporary file chunk by chunk while it is hashed, so it is
+never held in memory as a whole. Uploads that are too big, are no pdf or have too many
+pages are rejected before any text is extracted from them, which bounds the memory and
+time a request can take.
+"""
+import dataclasses
+import hashlib
+import os
+import tempfile
+from typing import BinaryIO, Optional
+
+# largest upload in bytes and most pages of an uploaded pdf; 0 disables the limit
+MAX_UPLOAD_BYTES = int(os.environ.get("LIP_MAX_UPLOAD_BYTES", 32 * 2**20))
+MAX_UPLOAD_PAGES = int(os.environ.get("LIP_MAX_UPLOAD_PAGES", 1000))
+# folder of the spooled uploads; the temporary folder of the system if empty
+UPLOAD_DIR = os.environ.get("LIP_UPLOAD_DIR") or None
+# bytes of a request besides the pdf: boundaries, headers and the other form fields
+FORM_OVERHEAD = 64 * 2**10
+CHUNK_SIZE = 64 * 2**10
+
+
+class UploadRejected(Exception):
+    """Raised if an upload is not processed; the message is shown to the user.
+
+    Args:
+        message: Why the upload is rejected.
+        status_code: Http status of the response.
+    """
+
+    def __init__(self, message: str, status_code: int = 422):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+@dataclasses.dataclass
+class SpooledUpload:
+    """An upload in a temporary file; remove it when it is not needed anymore."""
+
+    path: str
+    sha256: str
+    size: int
+    n_pages: Optional[int] = None
+
+    def remove(self):
+        """Delete the temporary file."""
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def _too_large(max_bytes: int) -> UploadRejected:
+    return UploadRejected(
+        f"Die Datei ist zu groß, erlaubt sind höchstens {max_bytes / 2**20:.1f} MB.",
+        status_code=413,
+    )
+
+
+def check_content_length(content_length: Optional[str], max_bytes: int = None):
+    """Reject a request by its Content-Length header before its body is read.
+
+    Raises:
+        UploadRejected if the body is bigger than an upload of max_bytes
+        (default: MAX_UPLOAD_BYTES).
+    """
+    max_bytes = MAX_UPLOAD_BYTES if max_bytes is None else max_bytes
+    if max_bytes and content_length and content_length.isdigit():
+        if int(content_length) > max_bytes + FORM_OVERHEAD:
+            raise _too_large(max_bytes)
+
+
+def spool_upload(
+    upload: BinaryIO, max_bytes: int = None, directory: Optional[str] = None
+) -> SpooledUpload:
+    """Copy an upload to a temporary file chunk by chunk while hashing it.
+
+    Args:
+        upload: File object of the upload.
+        max_bytes: Largest accepted upload; default: MAX_UPLOAD_BYTES.
+        directory: Folder of the temporary file; default: UPLOAD_DIR.
+
+    Raises:
+        UploadRejected if the upload is bigger than max_bytes; nothing is kept then.
+    """
+    max_bytes = MAX_UPLOAD_BYTES if max_bytes is None else max_bytes
+    directory = directory or UPLOAD_DIR
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    file_descriptor, path = tempfile.mkstemp(
+        dir=directory, prefix="upload-", suffix=".pdf"
+    )
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with os.fdopen(file_descriptor, "wb") as spool_file:
+            for chunk in iter(lambda: upload.read(CHUNK_SIZE), b""):
+                size += len(chunk)
+                if max_bytes and size > max_bytes:
+                    raise _too_large(max_bytes)
+                digest.update(chunk)
+                spool_file.write(chunk)
+    except BaseException:
+        os.unlink(path)
+        raise
+    return SpooledUpload(path=path, sha256=digest.hexdigest(), size=size)
+
+
+def count_pages(path: str, max_pages: int = None) -> int:
+    """Check if a file is a pdf with at most max_pages pages, without extracting text.
+
+    Args:
+        path: Path of the file.
+        max_pages: Most accepted pages; default: MAX_UPLOAD_PAGES.
+
+    Returns:
+        The number of pages.
+
+    Raises:
+        UploadRejected if the file is no readable pdf or has too many pages.
+    """
+    max_pages = MAX_UPLOAD_PAGES if max_pages is None else max_pages
+    with open(path, "rb") as pdf_file:
+        if b"%PDF-" not in pdf_file.read(1024):
+            raise UploadRejected("Die Datei ist kein PDF.")
+    # pdfplumber is slow to import, only load it when needed
+    import pdfplumber  # pylint: disable=import-outside-toplevel
+
+    try:
+        with pdfplumber.open(path) as pdf:
+            n_pages = len(pdf.pages)
+    except Exception as err:  # pylint: disable=broad-except
+        raise UploadRejected("Die PDF-Datei kann nicht gelesen werden.") from err
+    if n_pages == 0:
+        raise UploadRejected("Die PDF-Datei hat keine Seiten.")
+    if max_pages and n_pages > max_pages:
+        raise UploadRejected(
+            f"Die PDF-Datei hat {n_pages} Seiten, erlaubt sind höchstens {max_pages}.",
+            status_code=413,
+        )
+    return n_pages
+
+
+def accept_upload(
+    upload: BinaryIO,
+    max_bytes: int = None,
+    max_pages: int = None,
+    directory: Optional[str] = None,
+) -> SpooledUpload:
+    """Spool an upload to disk and check that it is a pdf within the limits.
+
+    See spool_upload and count_pages for the arguments.
+
+    Raises:
+        UploadRejected if the upload is too big, no pdf or has too many pages;
+        nothing is kept then.
+    """
+    spooled = spool_upload(upload, max_bytes=max_bytes, directory=directory)
+    try:
+        spooled.n_pages = count_pages(spooled.path, max_pages=max_pages)
+    except BaseException:
+        spooled.remove()
+        raise
+    return spooled
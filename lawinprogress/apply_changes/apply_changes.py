@@ -1,12 +1,23 @@
-"""Main functiosn to apply changes to parsed source laws."""
+"""Main functiosn to apply changes to parsed source laws.
+
+Changes are applied plan-then-execute: a planning pass resolves the locations of the
+changes against an index of the tree built in one traversal and groups them by target
+node. Text edits to one node are applied to a scratch copy of its text and written back
+once. Structural edits (new or removed nodes) may shift bulletpoints, so they end a plan;
+the changes after them are planned against the updated tree.
+"""
+import bisect
 import copy
+import dataclasses
 import logging
-from typing import List, Tuple
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional, Tuple
 
 import click
-from anytree import findall
+from anytree import PreOrderIter
 
 from lawinprogress.apply_changes.edit_functions import (
+    SENTENCE_CHANGE_TYPES,
     ChangeResult,
     _append,
     _cancelled,
@@ -14,12 +25,100 @@ from lawinprogress.apply_changes.edit_functions import (
     _insert_after,
     _rephrase,
     _replace,
+    is_structural,
+    unsupported_reason,
 )
+from lawinprogress.deadline import Deadline, check_deadline
 from lawinprogress.parsing.parse_change_law import Change
 from lawinprogress.parsing.parse_source_law import LawTextNode
+from lawinprogress.parsing.sentence_segmentation import SEGMENTER
 
 logger = logging.getLogger(__name__)
 
+# change types that are expected to leave the tree untouched
+NO_EDIT_CHANGE_TYPES = ["RENUMBERING", "MULTIPLE_CHANGES", "UNKNOWN"]
+
+
+def _renumbering(node: LawTextNode, change: Change) -> ChangeResult:
+    """Skip renumbering; the insertion code in LawTextNode handles all of this."""
+    return ChangeResult(change, node, status=1, message="RENUMBERING")
+
+
+EDIT_FUNCTIONS: Dict[str, Callable[[LawTextNode, Change], ChangeResult]] = {
+    "replace": _replace,
+    "insert_after": _insert_after,
+    "rephrase": _rephrase,
+    "append": _append,
+    "delete_after": _delete_after,
+    "cancelled": _cancelled,
+    "RENUMBERING": _renumbering,
+}
+
+
+class LocationIndex:
+    """Index of a tree to find nodes by location without searching the tree again.
+
+    Every node gets its position in pre-order and the position of its last descendant,
+    so the nodes with a bulletpoint below a node are a range of the sorted positions of
+    that bulletpoint.
+    """
+
+    def __init__(self, parse_tree: LawTextNode):
+        self.nodes = list(PreOrderIter(parse_tree))
+        self.position = {id(node): pos for pos, node in enumerate(self.nodes)}
+        # position of the last node in the subtree of every node
+        self.subtree_end = list(range(len(self.nodes)))
+        for pos in range(len(self.nodes) - 1, 0, -1):
+            parent_pos = self.position[id(self.nodes[pos].parent)]
+            self.subtree_end[parent_pos] = max(
+                self.subtree_end[parent_pos], self.subtree_end[pos]
+            )
+        self.bulletpoint_positions = defaultdict(list)
+        for pos, node in enumerate(self.nodes):
+            self.bulletpoint_positions[node.bulletpoint].append(pos)
+
+    def find_all(self, node: LawTextNode, bulletpoint: str) -> List[LawTextNode]:
+        """All nodes in the subtree of node (including itself) with the bulletpoint."""
+        positions = self.bulletpoint_positions.get(bulletpoint, [])
+        start = self.position[id(node)]
+        low = bisect.bisect_left(positions, start)
+        high = bisect.bisect_right(positions, self.subtree_end[start])
+        return [self.nodes[pos] for pos in positions[low:high]]
+
+    def candidates(self, location_list: List[str]) -> List[LawTextNode]:
+        """The nodes the location could refer to.
+
+        Returns:
+            An empty list if no node is found, the node if it is unique or all nodes
+            found at the first ambiguous step of the location path.
+        """
+        current_node = self.nodes[0]
+        for location in location_list:
+            # if we have a special location like Überschrift, just return the current_node
+            if location in ["Überschrift"]:
+                return [current_node]
+
+            # find the node in question in the tree
+            search_result = self.find_all(current_node, location)
+            if len(search_result) == 0:
+                # no path found
+                if current_node.bulletpoint.startswith("Kapitel"):
+                    return [current_node]
+                return []
+            if len(search_result) == 1:
+                # exactly one path found; as it should be
+                current_node = search_result[0]
+            else:
+                # more than one path found; should not happen - Stop here
+                return search_result
+
+        return [current_node]
+
+    def find(self, location_list: List[str]) -> Optional[LawTextNode]:
+        """The node by location if it is unique; see _find_node."""
+        search_result = self.candidates(location_list)
+        return search_result[0] if len(search_result) == 1 else None
+
 
 def _find_node(location_list: List[str], parse_tree: LawTextNode) -> List[LawTextNode]:
     """The node by location in the provided tree.
@@ -31,34 +130,176 @@ def _find_node(location_list: List[str], parse_tree: LawTextNode) -> List[LawTex
     Returns:
         The LawTextNode found at the end of the path to the location.
     """
-    current_node = parse_tree
-    for location in location_list:
-        # if we have a special location like Überschrift, just return the current_node
-        if location in ["Überschrift"]:
-            return current_node
-
-        # find the node in question in the tree
-        search_result = findall(
-            current_node, filter_=lambda node: location == node.bulletpoint
-        )
-        if len(search_result) == 0:
-            # no path found
-            if current_node.bulletpoint.startswith("Kapitel"):
-                return current_node
-            return None
-        if len(search_result) == 1:
-            # exactly one path found; as it should be
-            current_node = search_result[0]
+    return LocationIndex(parse_tree).find(location_list)
+
+
+def _target_location(change: Change) -> List[str]:
+    """The location of the node the change is applied to."""
+    if (
+        change.text
+        and change.text[0].startswith(change.location[-1])
+        and change.change_type == "append"
+    ):
+        # if the node is appended but doesnt exist jet
+        # dont use the last part of the location
+        return change.location[:-1]
+    return change.location
+
+
+@dataclasses.dataclass
+class PlannedChange:
+    """A change with its position in the change list and its resolved target node."""
+
+    index: int
+    change: Change
+    node: Optional[LawTextNode]
+
+
+@dataclasses.dataclass
+class ChangePlan:
+    """Changes resolved against one state of the tree.
+
+    Holds the text edits grouped by target node (in order of first appearance, keeping
+    the order of the changes per node), the changes without a unique target node and
+    the structural change that ends the plan, if any.
+    """
+
+    node_edits: Dict[LawTextNode, List[PlannedChange]]
+    unresolved: List[PlannedChange]
+    structural: Optional[PlannedChange]
+    stop: int
+
+
+def plan_changes(
+    law_tree: LawTextNode, changes: List[Change], start: int = 0
+) -> ChangePlan:
+    """Resolve the changes from start on against the tree, up to the first structural change.
+
+    Args:
+        law_tree: A tree of LawTextNodes.
+        changes: All changes to apply.
+        start: Index of the first change to plan.
+
+    Returns:
+        ChangePlan for changes[start:plan.stop].
+    """
+    index = LocationIndex(law_tree)
+    plan = ChangePlan(node_edits={}, unresolved=[], structural=None, stop=len(changes))
+    for change_index in range(start, len(changes)):
+        change = changes[change_index]
+        try:
+            planned = PlannedChange(
+                change_index, change, index.find(_target_location(change))
+            )
+        except IndexError as err:
+            logger.warning(f"\nERROR: {err}")
+            logger.warning(change)
+            continue
+        if not planned.node:
+            plan.unresolved.append(planned)
+        elif is_structural(change):
+            plan.structural = planned
+            plan.stop = change_index + 1
+            break
         else:
-            # more than one path found; should not happen - Stop here
-            return None
+            plan.node_edits.setdefault(planned.node, []).append(planned)
+    return plan
+
+
+def _prefetch_sentence_segmentation(plan: ChangePlan):
+    """Segment the texts of all nodes targeted by sentence-based changes in one batch."""
+    texts = []
+    for node, planned_changes in plan.node_edits.items():
+        if any(
+            planned.change.sentences
+            and planned.change.change_type in SENTENCE_CHANGE_TYPES
+            for planned in planned_changes
+        ):
+            texts.append(node.text)
+    SEGMENTER.prefetch(texts)
+
+
+def _apply_edit(node: LawTextNode, change: Change) -> ChangeResult:
+    """Apply a single change to the node with the edit function for its change type."""
+    logger.info(change)
+    edit_function = EDIT_FUNCTIONS.get(change.change_type)
+    if edit_function is None:
+        return ChangeResult(change, node, status=0, message="SKIPPED")
+    return edit_function(node, change)
+
 
-    return current_node
+def _result_without_change(
+    change: Change, node: LawTextNode, change_result: ChangeResult
+) -> ChangeResult:
+    """If nothing changed, we should be informed."""
+    if change.change_type in NO_EDIT_CHANGE_TYPES:
+        return change_result
+    return ChangeResult(change, node, status=1, message="APPLIED WITHOUT CHANGE")
+
+
+def _execute_node_edits(
+    node: LawTextNode, planned_changes: List[PlannedChange]
+) -> Tuple[List[Tuple[int, ChangeResult]], int]:
+    """Apply all text edits to a node on a scratch copy and write the text back once."""
+    scratch = LawTextNode(text=node.text, bulletpoint=node.bulletpoint)
+    results = []
+    n_succesfull_applied_changes = 0
+    for planned in planned_changes:
+        change = planned.change
+        try:
+            text_before = scratch.text
+            change_result = _apply_edit(scratch, change)
+            change_result.affected_node = node
+            if scratch.text != text_before:
+                # the old text is not needed anymore
+                SEGMENTER.invalidate(text_before)
+                # if something changed, then we successfully applied something
+                n_succesfull_applied_changes += change_result.status
+            else:
+                change_result = _result_without_change(change, node, change_result)
+            if change.change_type == "RENUMBERING":
+                n_succesfull_applied_changes += 1
+            node.changes.append(change_result)
+            results.append((planned.index, change_result))
+            logger.info(change_result)
+        except IndexError as err:
+            logger.warning(f"\nERROR: {err}")
+            logger.warning(change)
+    if scratch.text != node.text:
+        node.text = scratch.text
+    return results, n_succesfull_applied_changes
+
+
+def _execute_structural(
+    law_tree: LawTextNode, planned: PlannedChange
+) -> Tuple[List[Tuple[int, ChangeResult]], int]:
+    """Apply a change that adds or removes nodes."""
+    change, node = planned.change, planned.node
+    try:
+        # store the representation of the tree to compare it with the tree after the change
+        tree_text_before = law_tree.to_text()
+        node_text_before = node.text
+        change_result = _apply_edit(node, change)
+        if node.text != node_text_before:
+            SEGMENTER.invalidate(node_text_before)
+        if law_tree.to_text() != tree_text_before:
+            n_succesfull_applied_changes = change_result.status
+        else:
+            n_succesfull_applied_changes = 0
+            change_result = _result_without_change(change, node, change_result)
+        node.changes.append(change_result)
+        logger.info(change_result)
+        return [(planned.index, change_result)], n_succesfull_applied_changes
+    except IndexError as err:
+        logger.warning(f"\nERROR: {err}")
+        logger.warning(change)
+        return [], 0
 
 
 def apply_changes(
     law_tree: LawTextNode,
     changes: List[Change],
+    deadline: Optional[Deadline] = None,
 ) -> Tuple[LawTextNode, List[ChangeResult], int]:
     """Apply the provided changes to the provided tree.
 
@@ -66,78 +307,143 @@ def apply_changes(
         law_tree: A tree of LawTextNodes
         changes: A dict with changes, containing "location", "how" and "text"
                  to specify the changes.
+        deadline: Time budget of applying the changes, checked between the batches.
 
     Returns:
         Tree of LawTextNodes with the requested changes if we where able to apply them.
         List of change results and the number of successfully applied changes.
     """
     res_law_tree = copy.deepcopy(law_tree)
-    change_results = []
+    indexed_results = []
     n_succesfull_applied_changes = 0
-    for change in changes:
-        logger.info(change)
-        try:
-            # find the node that needs to be changed
-            if (
-                change.text
-                and change.text[0].startswith(change.location[-1])
-                and change.change_type == "append"
-            ):
-                # if the node is appended but doesnt exist jet
-                # dont use the last part of the location
-                node = _find_node(
-                    location_list=change.location[:-1], parse_tree=res_law_tree
-                )
-            else:
-                # just find the node
-                node = _find_node(
-                    location_list=change.location, parse_tree=res_law_tree
-                )
-
-            # store the representation of the tree to compare it with the tree after the change
-            tree_text_before = res_law_tree.to_text()
+    start = 0
+    while start < len(changes):
+        check_deadline(deadline, "applying the changes")
+        plan = plan_changes(res_law_tree, changes, start)
+        _prefetch_sentence_segmentation(plan)
+        for planned in plan.unresolved:
             # if we found no path, we skip
-            if not node:
-                change_result = ChangeResult(
-                    change, None, status=0, message="SKIPPING. No unique path found for"
-                )
-                logger.info(change_result)
-                change_results.append(change_result)
-                continue
-            change_type = change.change_type
-            if change_type == "replace":
-                change_result = _replace(node, change)
-            elif change_type == "insert_after":
-                change_result = _insert_after(node, change)
-            elif change_type == "rephrase":
-                change_result = _rephrase(node, change)
-            elif change_type == "append":
-                change_result = _append(node, change)
-            elif change_type == "delete_after":
-                change_result = _delete_after(node, change)
-            elif change_type == "cancelled":
-                change_result = _cancelled(node, change)
-            elif change_type == "RENUMBERING":
-                # we skip it because the insertion code in Treelawnode should handle all of this
-                change_result = ChangeResult(
-                    change, node, status=1, message="RENUMBERING"
-                )
-                n_succesfull_applied_changes += 1
-            else:
-                change_result = ChangeResult(change, node, status=0, message="SKIPPED")
-            if res_law_tree.to_text() != tree_text_before:
-                # if something changed, then we successfully applied something
-                n_succesfull_applied_changes += change_result.status
-            else:
-                # if nothign changed, we should be informed
-                if change_type not in ["RENUMBERING", "MULTIPLE_CHANGES", "UNKNOWN"]:
-                    change_result = ChangeResult(
-                        change, node, status=1, message="APPLIED WITHOUT CHANGE"
-                    )
-            node.changes.append(change_result)
-            change_results.append(change_result)
+            change_result = ChangeResult(
+                planned.change,
+                None,
+                status=0,
+                message="SKIPPING. No unique path found for",
+            )
             logger.info(change_result)
-        except IndexError as err:
-            logger.warning(f"\nERROR: {err}")
-            logger.warning(change)
+            indexed_results.append((planned.index, change_result))
+        for node, planned_changes in plan.node_edits.items():
+            results, n_applied = _execute_node_edits(node, planned_changes)
+            indexed_results.extend(results)
+            n_succesfull_applied_changes += n_applied
+        if plan.structural:
+            results, n_applied = _execute_structural(res_law_tree, plan.structural)
+            indexed_results.extend(results)
+            n_succesfull_applied_changes += n_applied
+        start = plan.stop
+    # report the results in the order of the changes
+    change_results = [
+        result for _, result in sorted(indexed_results, key=lambda r: r[0])
+    ]
     return res_law_tree, change_results, n_succesfull_applied_changes
+
+
+# classes of the preflight check
+PREFLIGHT_RESOLVABLE = "resolvable"
+PREFLIGHT_AMBIGUOUS = "ambiguous"
+PREFLIGHT_NOT_FOUND = "not_found"
+PREFLIGHT_UNSUPPORTED = "unsupported"
+PREFLIGHT_STATUSES = [
+    PREFLIGHT_RESOLVABLE,
+    PREFLIGHT_AMBIGUOUS,
+    PREFLIGHT_NOT_FOUND,
+    PREFLIGHT_UNSUPPORTED,
+]
+
+
+@dataclasses.dataclass
+class PreflightResult:
+    """Class for storing the expected outcome of a change without applying it."""
+
+    change: Change
+    status: str
+    n_candidates: int
+    message: str = ""
+
+    def todict(self):
+        """The result as json, with the change reduced to its location and type."""
+        return {
+            "location": self.change.location,
+            "sentences": self.change.sentences,
+            "change_type": self.change.change_type,
+            "status": self.status,
+            "n_candidates": self.n_candidates,
+            "message": self.message,
+        }
+
+
+def preflight_changes(
+    law_tree: LawTextNode, changes: List[Change]
+) -> List[PreflightResult]:
+    """Check which changes would resolve and apply, without touching the tree.
+
+    Every change is classified as
+    - unsupported: the edit functions cannot handle the form of the change,
+    - not_found: no node exists at the location,
+    - ambiguous: the location fits more than one node,
+    - resolvable: the location points to exactly one node.
+
+    The tree is neither copied nor changed and no text is rendered, so all locations
+    are resolved against the original tree. Locations behind a structural change (a
+    node added or removed before them) may resolve differently when applying.
+
+    Args:
+        law_tree: A tree of LawTextNodes
+        changes: The changes to check.
+
+    Returns:
+        One PreflightResult per change, in the order of the changes.
+    """
+    index = LocationIndex(law_tree)
+    results = []
+    for change in changes:
+        if change.change_type not in EDIT_FUNCTIONS:
+            results.append(
+                PreflightResult(
+                    change,
+                    PREFLIGHT_UNSUPPORTED,
+                    0,
+                    f"Unsupported change type {change.change_type}.",
+                )
+            )
+            continue
+        message = unsupported_reason(change)
+        if message:
+            results.append(PreflightResult(change, PREFLIGHT_UNSUPPORTED, 0, message))
+            continue
+        try:
+            candidates = index.candidates(_target_location(change))
+        except IndexError:
+            candidates = []
+        if len(candidates) == 1:
+            result = PreflightResult(change, PREFLIGHT_RESOLVABLE, 1)
+        elif candidates:
+            result = PreflightResult(
+                change,
+                PREFLIGHT_AMBIGUOUS,
+                len(candidates),
+                f"{len(candidates)} nodes match the location.",
+            )
+        else:
+            result = PreflightResult(
+                change, PREFLIGHT_NOT_FOUND, 0, "No node found at the location."
+            )
+        results.append(result)
+    return results
+
+
+def summarize_preflight(results: List[PreflightResult]) -> Dict[str, int]:
+    """Count the preflight results per status."""
+    counts = dict.fromkeys(PREFLIGHT_STATUSES, 0)
+    for result in results:
+        counts[result.status] += 1
+    return counts
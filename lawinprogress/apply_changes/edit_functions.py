@@ -1,12 +1,15 @@
 """Functions to apply the different edits requested in the change laws."""
-from typing import List
+from typing import List, Optional
 
 import regex as re
 
-from lawinprogress import NLP
 from lawinprogress.parsing.lawtree import LawTextNode
 from lawinprogress.parsing.parse_change_law import Change
 from lawinprogress.parsing.parse_source_law import parse_source_law_tree
+from lawinprogress.parsing.sentence_segmentation import SEGMENTER
+
+# change types that may address single sentences of a node ("Satz 2")
+SENTENCE_CHANGE_TYPES = ["replace", "insert_after", "rephrase", "cancelled"]
 
 BULLETPOINT_PATTERNS = [
     r"^Kapitel\s*\d{1,3}",
@@ -17,6 +20,77 @@ BULLETPOINT_PATTERNS = [
 ]
 
 
+def _bulletpoint_match(text: str):
+    """Return the first match of a bulletpoint pattern at the start of the text or None."""
+    for pattern in BULLETPOINT_PATTERNS:
+        match = re.match(pattern, text)
+        if match:
+            return match
+    return None
+
+
+def is_structural(change: Change) -> bool:
+    """Check if applying the change adds or removes nodes instead of editing a node text.
+
+    Structural changes can shift the bulletpoints of other nodes, so locations resolved
+    before them are not valid after them. Mirrors the branches of the edit functions.
+    """
+    if change.change_type == "cancelled":
+        return len(change.text) == 0 and len(change.sentences) == 0
+    if change.change_type in ["append", "insert_after"]:
+        # a single text starting with a bulletpoint becomes a new node
+        return len(change.text) == 1 and _bulletpoint_match(change.text[0]) is not None
+    return False
+
+
+def unsupported_reason(change: Change) -> Optional[str]:
+    """Check if the edit functions can handle the form of the change, without applying it.
+
+    Mirrors the branches of the edit functions that fail regardless of the node text.
+
+    Returns:
+        The message the edit function would fail with or None if the change is supported.
+    """
+    n_texts, n_sentences = len(change.text), len(change.sentences)
+    sentences = change.sentences[0] if change.sentences else ""
+    if change.change_type == "replace":
+        if n_texts == 1 and n_sentences > 0 and "und" in sentences:
+            return "Replace with multiple sentences 'und' and one text is currently not supported."
+        if n_texts not in [1, 2] or (n_texts == 1 and n_sentences == 0):
+            return "Not enougth text to replace."
+    elif change.change_type == "insert_after":
+        if n_texts == 0:
+            return "Failed to insert after! Not enougth text found."
+        if n_texts % 2 == 0 or (n_texts == 1 and _bulletpoint_match(change.text[0])):
+            return None
+        if n_texts == 1 and n_sentences == 1:
+            if "bis" in sentences:
+                return "Insert with sentence range 'bis' is currently not supported."
+            if "und" in sentences:
+                return (
+                    "Insert with multiple sentences 'und' is currently not supported."
+                )
+            return None
+        return "Failed to insert after! Unknown reason!"
+    elif change.change_type == "rephrase":
+        if n_texts != 1 or n_sentences > 1:
+            return "Failed to rephrase! Too much or too little texts."
+        if "bis" in sentences:
+            return "Rephrase with sentence range 'bis' is currently not supported."
+        if "und" in sentences:
+            return "Rephrase with multiple sentences 'und' is currently not supported."
+    elif change.change_type == "append":
+        if n_texts != 1:
+            return "Failed to append! To much texts."
+    elif change.change_type == "delete_after":
+        if n_texts == 0:
+            return "Failed to delete! Not enought text."
+    elif change.change_type == "cancelled":
+        if n_texts != 0 or n_sentences > 1:
+            return "Failed to cancel! Text present."
+    return None
+
+
 class ChangeResult:
     """Store the result of a change application."""
 
@@ -32,6 +106,14 @@ class ChangeResult:
         self.status = status
         self.message = message
 
+    def todict(self) -> dict:
+        """Return the change, status and message as json serializable dict."""
+        return {
+            "change": self.change.todict(),
+            "status": self.status,
+            "message": self.message,
+        }
+
     def __repr__(self) -> str:
         return "{}:\n\tlocation={}\n\tsentences={}\n\ttext={}\n\tstatus={}\n".format(
             self.message,
@@ -45,17 +127,9 @@ class ChangeResult:
 def __split_text_to_sentences(text: str) -> List[str]:
     """Split a text into sentences.
 
-    Uses spacy and improves upon.
+    Uses spacy and improves upon; segmentations are cached by text (see SEGMENTER).
     """
-    sentences = []
-    sent_text = ""
-    for sent in NLP(text).sents:
-        # join sentences is split by BGBl.
-        sent_text += sent.text
-        if not sent.text.endswith("BGBl."):
-            sentences.append(sent_text)
-            sent_text = ""
-    return [sent for sent in sentences if sent.strip()]
+    return SEGMENTER.split(text)
 
 
 def __clean_text(text: str) -> str:
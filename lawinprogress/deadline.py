@@ -0,0 +1,57 @@
+"""Time budget of a request, checked by every stage of processing a change law.
+
+A request gets a Deadline when it starts and passes it through reading the pdf,
+retrieving the source laws, parsing and applying the changes and rendering the diffs.
+Each stage checks it in its loops and stops with DeadlineExceeded once the time is up,
+so the laws finished by then can be returned instead of letting the request run on.
+"""
+import time
+from typing import Optional
+
+
+class DeadlineExceeded(Exception):
+    """Raised if the time budget of a request is used up."""
+
+
+class Deadline:
+    """Point in time by which a request has to be done.
+
+    The deadline is wall clock time, so it holds in the worker processes as well.
+
+    Args:
+        seconds: Time budget from now on; None or 0 for no limit.
+    """
+
+    def __init__(self, seconds: Optional[float]):
+        self.seconds = seconds
+        self.expires_at = time.time() + seconds if seconds else None
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left, at least 0; None if there is no limit."""
+        if self.expires_at is None:
+            return None
+        return max(self.expires_at - time.time(), 0.0)
+
+    def expired(self) -> bool:
+        """Whether the time is up."""
+        return self.expires_at is not None and time.time() >= self.expires_at
+
+    def check(self, stage: str):
+        """Stop the current stage if the time is up.
+
+        Args:
+            stage: What is being done, for the error message.
+
+        Raises:
+            DeadlineExceeded if the time is up.
+        """
+        if self.expired():
+            raise DeadlineExceeded(
+                f"The time limit of {self.seconds:g}s ran out while {stage}."
+            )
+
+
+def check_deadline(deadline: Optional[Deadline], stage: str):
+    """Check the deadline if there is one (see Deadline.check)."""
+    if deadline is not None:
+        deadline.check(stage)
@@ -0,0 +1,28 @@
+"""Measure the import cost of modules in a fresh interpreter."""
+import subprocess
+import sys
+from typing import List, Tuple
+
+# dependencies that must not be loaded at import time
+LAZY_DEPENDENCIES = ["spacy", "pdfplumber", "rapidfuzz"]
+
+
+def measure_imports(modules: List[str]) -> List[Tuple[str, int, int]]:
+    """Import modules in a fresh interpreter and collect the import times.
+
+    Returns:
+        List of (module, self time in us, cumulative time in us) for every import.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {', '.join(modules)}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        imports.append((name.strip(), int(self_us), int(cumulative_us)))
+    return imports
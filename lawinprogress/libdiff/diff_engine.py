@@ -0,0 +1,247 @@
+"""Diff engines producing difflib compatible opcodes.
+
+difflib's SequenceMatcher (with autojunk=False, as needed for laws) gets slow on long
+laws with many repeated lines like "(weggefallen)". The patience engine interns the
+elements to integer ids, strips the common prefix and suffix, anchors the diff on
+elements that occur exactly once in both sequences (patience diff) and aligns the
+regions between the anchors with Myers' algorithm.
+"""
+import difflib
+import os
+from typing import Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+# difflib style opcode (tag, start a, end a, start b, end b)
+Opcode = Tuple[str, int, int, int, int]
+
+# engine used if none is given; "difflib" or "patience"
+DIFF_ENGINE = os.environ.get("LIP_DIFF_ENGINE", "difflib")
+# regions with more differences than this are not aligned by Myers' algorithm, but
+# replaced as a whole, to bound the time and memory it needs
+MYERS_MAX_EDITS = 2000
+
+
+def intern(seq_a: Sequence[Hashable], seq_b: Sequence[Hashable]):
+    """Map the elements of both sequences to integer ids; equal elements get equal ids."""
+    ids: Dict[Hashable, int] = {}
+    ids_a = [ids.setdefault(element, len(ids)) for element in seq_a]
+    ids_b = [ids.setdefault(element, len(ids)) for element in seq_b]
+    return ids_a, ids_b
+
+
+def _longest_increasing_subsequence(
+    pairs: List[Tuple[int, int]]
+) -> List[Tuple[int, int]]:
+    """Longest subsequence of (i, j) pairs, sorted by i, with increasing j."""
+    tails: List[int] = []  # index into pairs of the smallest tail per length
+    tail_values: List[int] = []
+    previous = [-1] * len(pairs)
+    for idx, (_, j) in enumerate(pairs):
+        # binary search for the first tail with a value >= j
+        low, high = 0, len(tail_values)
+        while low < high:
+            mid = (low + high) // 2
+            if tail_values[mid] < j:
+                low = mid + 1
+            else:
+                high = mid
+        if low > 0:
+            previous[idx] = tails[low - 1]
+        if low == len(tails):
+            tails.append(idx)
+            tail_values.append(j)
+        else:
+            tails[low] = idx
+            tail_values[low] = j
+    result = []
+    idx = tails[-1] if tails else -1
+    while idx >= 0:
+        result.append(pairs[idx])
+        idx = previous[idx]
+    return result[::-1]
+
+
+def _unique_anchors(a, b, alo, ahi, blo, bhi) -> List[Tuple[int, int]]:
+    """Pairs of positions of elements that occur exactly once in both regions."""
+    counts_a: Dict[int, int] = {}
+    for idx in range(alo, ahi):
+        counts_a[a[idx]] = counts_a.get(a[idx], 0) + 1
+    counts_b: Dict[int, int] = {}
+    position_b: Dict[int, int] = {}
+    for idx in range(blo, bhi):
+        counts_b[b[idx]] = counts_b.get(b[idx], 0) + 1
+        position_b[b[idx]] = idx
+    pairs = [
+        (idx, position_b[a[idx]])
+        for idx in range(alo, ahi)
+        if counts_a[a[idx]] == 1 and counts_b.get(a[idx]) == 1
+    ]
+    return _longest_increasing_subsequence(pairs)
+
+
+def _myers(a, b, alo, ahi, blo, bhi) -> List[Tuple[int, int]]:
+    """Matching positions of a shortest edit script of two regions (Myers 1986)."""
+    n, m = ahi - alo, bhi - blo
+    max_edits = min(n + m, MYERS_MAX_EDITS)
+    offset = max_edits + 1
+    furthest = [0] * (2 * max_edits + 3)
+    # per step, the furthest x on the diagonals -edits to edits before the step; the
+    # step only reads the diagonals its predecessor reached
+    trace = []
+    for edits in range(max_edits + 1):
+        trace.append(furthest[offset - edits : offset + edits + 1])
+        for diagonal in range(-edits, edits + 1, 2):
+            if diagonal == -edits or (
+                diagonal != edits
+                and furthest[offset + diagonal - 1] < furthest[offset + diagonal + 1]
+            ):
+                x = furthest[offset + diagonal + 1]
+            else:
+                x = furthest[offset + diagonal - 1] + 1
+            y = x - diagonal
+            while x < n and y < m and a[alo + x] == b[blo + y]:
+                x += 1
+                y += 1
+            furthest[offset + diagonal] = x
+            if x >= n and y >= m:
+                return _myers_backtrack(alo, blo, trace, n, m)
+    # too many differences; no matches
+    return []
+
+
+def _myers_backtrack(alo, blo, trace, x, y):
+    """Follow the furthest reaching paths back and collect the diagonal moves."""
+    matches = []
+    for step in range(len(trace) - 1, 0, -1):
+        # the window of the step is centered on diagonal 0
+        furthest = trace[step]
+        diagonal = x - y
+        if diagonal == -step or (
+            diagonal != step
+            and furthest[step + diagonal - 1] < furthest[step + diagonal + 1]
+        ):
+            previous_diagonal = diagonal + 1
+        else:
+            previous_diagonal = diagonal - 1
+        previous_x = furthest[step + previous_diagonal]
+        previous_y = previous_x - previous_diagonal
+        while x > previous_x and y > previous_y:
+            x -= 1
+            y -= 1
+            matches.append((alo + x, blo + y))
+        x, y = previous_x, previous_y
+    # the snake from the start
+    while x > 0 and y > 0:
+        x -= 1
+        y -= 1
+        matches.append((alo + x, blo + y))
+    return matches[::-1]
+
+
+def _patience_matches(a: List[int], b: List[int]) -> List[Tuple[int, int]]:
+    """Matching positions of a and b, sorted."""
+    matches = []
+    regions = [(0, len(a), 0, len(b))]
+    while regions:
+        alo, ahi, blo, bhi = regions.pop()
+        # strip the common prefix and suffix
+        while alo < ahi and blo < bhi and a[alo] == b[blo]:
+            matches.append((alo, blo))
+            alo += 1
+            blo += 1
+        while alo < ahi and blo < bhi and a[ahi - 1] == b[bhi - 1]:
+            ahi -= 1
+            bhi -= 1
+            matches.append((ahi, bhi))
+        if alo == ahi or blo == bhi:
+            continue
+        anchors = _unique_anchors(a, b, alo, ahi, blo, bhi)
+        if not anchors:
+            matches.extend(_myers(a, b, alo, ahi, blo, bhi))
+            continue
+        # diff the regions between the anchors
+        for anchor_a, anchor_b in anchors:
+            matches.append((anchor_a, anchor_b))
+            regions.append((alo, anchor_a, blo, anchor_b))
+            alo, blo = anchor_a + 1, anchor_b + 1
+        regions.append((alo, ahi, blo, bhi))
+    matches.sort()
+    return matches
+
+
+def _opcodes_from_matches(
+    matches: List[Tuple[int, int]], len_a: int, len_b: int
+) -> List[Opcode]:
+    """Turn sorted matching positions into opcodes like SequenceMatcher.get_opcodes."""
+    opcodes = []
+    idx_a = idx_b = 0
+    position = 0
+    while position <= len(matches):
+        if position < len(matches):
+            match_a, match_b = matches[position]
+        else:
+            match_a, match_b = len_a, len_b
+        if idx_a < match_a and idx_b < match_b:
+            opcodes.append(("replace", idx_a, match_a, idx_b, match_b))
+        elif idx_a < match_a:
+            opcodes.append(("delete", idx_a, match_a, idx_b, match_b))
+        elif idx_b < match_b:
+            opcodes.append(("insert", idx_a, match_a, idx_b, match_b))
+        if position == len(matches):
+            break
+        # extend the run of consecutive matches
+        size = 1
+        while position + size < len(matches) and matches[position + size] == (
+            match_a + size,
+            match_b + size,
+        ):
+            size += 1
+        opcodes.append(("equal", match_a, match_a + size, match_b, match_b + size))
+        idx_a, idx_b = match_a + size, match_b + size
+        position += size
+    return opcodes
+
+
+def patience_opcodes(
+    seq_a: Sequence[Hashable], seq_b: Sequence[Hashable]
+) -> List[Opcode]:
+    """Opcodes to turn seq_a into seq_b, found by patience diff."""
+    ids_a, ids_b = intern(seq_a, seq_b)
+    return _opcodes_from_matches(
+        _patience_matches(ids_a, ids_b), len(ids_a), len(ids_b)
+    )
+
+
+def difflib_opcodes(
+    seq_a: Sequence[Hashable], seq_b: Sequence[Hashable]
+) -> List[Opcode]:
+    """Opcodes to turn seq_a into seq_b, found by difflib."""
+    return difflib.SequenceMatcher(a=seq_a, b=seq_b, autojunk=False).get_opcodes()
+
+
+DIFF_ENGINES: Dict[str, Callable[[Sequence, Sequence], List[Opcode]]] = {
+    "difflib": difflib_opcodes,
+    "patience": patience_opcodes,
+}
+
+
+def get_opcodes(
+    seq_a: Sequence[Hashable], seq_b: Sequence[Hashable], engine: Optional[str] = None
+) -> List[Opcode]:
+    """Opcodes to turn seq_a into seq_b with the given diff engine.
+
+    Args:
+        seq_a: The old sequence.
+        seq_b: The new sequence.
+        engine: Name of the diff engine (see DIFF_ENGINES); defaults to DIFF_ENGINE.
+
+    Raises:
+        ValueError if the engine is unknown.
+    """
+    engine = engine or DIFF_ENGINE
+    try:
+        diff = DIFF_ENGINES[engine]
+    except KeyError:
+        raise ValueError(
+            f"Unknown diff engine {engine}; use one of {list(DIFF_ENGINES)}"
+        ) from None
+    return diff(seq_a, seq_b)
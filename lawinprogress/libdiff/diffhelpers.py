@@ -1,6 +1,7 @@
 """Contains helper functions for diffing."""
-import difflib
-from typing import List, Tuple
+from typing import List, Optional, Tuple
+
+from .diff_engine import get_opcodes
 
 
 def tokenize(string: str) -> List[str]:
@@ -20,12 +21,14 @@ def sentencize(string: str) -> List[str]:
 
 
 def align_seqs(
-    seq_a: List[str], seq_b: List[str], fill: str = ""
+    seq_a: List[str],
+    seq_b: List[str],
+    fill: Optional[str] = "",
+    engine: Optional[str] = None,
 ) -> Tuple[List[str], List[str]]:
-    """Align two sequences with a filler."""
+    """Align two sequences with a filler, using the given diff engine (see diff_engine)."""
     out_a, out_b = [], []
-    seqmatcher = difflib.SequenceMatcher(a=seq_a, b=seq_b, autojunk=False)
-    for _, idx_a0, idx_a1, idx_b0, idx_b1 in seqmatcher.get_opcodes():
+    for _, idx_a0, idx_a1, idx_b0, idx_b1 in get_opcodes(seq_a, seq_b, engine):
         delta = (idx_a1 - idx_a0) - (idx_b1 - idx_b0)
         out_a += seq_a[idx_a0:idx_a1] + [fill] * max(-delta, 0)
         out_b += seq_b[idx_b0:idx_b1] + [fill] * max(delta, 0)
@@ -0,0 +1,156 @@
+"""Machine-readable exports of the diff of a law: json lines and unified diff.
+
+Both are generated line by line from the aligned lines of the trees (see
+tree_diff.align_trees), without rendering html first, so they can be streamed.
+"""
+import json
+from typing import Iterator, List, Optional, Tuple
+
+from lawinprogress.apply_changes.edit_functions import ChangeResult
+from lawinprogress.parsing.lawtree import LawTextNode
+
+from .diffhelpers import tokenize
+from .tree_diff import AlignedLine, align_trees
+
+# export formats and their media types
+EXPORT_FORMATS = {
+    "jsonl": "application/x-ndjson",
+    "diff": "text/x-diff",
+}
+# unchanged lines around the changes in a unified diff
+UNIFIED_CONTEXT_LINES = 3
+
+
+def jsonl_rows(
+    aligned: List[AlignedLine],
+    change_results: List[List[ChangeResult]],
+    law_title: str,
+) -> Iterator[str]:
+    """One json object per row of the synopsis, as shown by html_diffs.
+
+    Every object holds the law title, the index of the row, the old and new line (null
+    where the line has no counterpart), whether it is changed and, for changed rows,
+    the successful changes assigned to the row like in the html synopsis.
+    """
+    success_changes = [
+        [result for result in results if result.status != 0]
+        for results in change_results
+        if results
+    ]
+    change_idx = 0
+    for row_idx, (line_a, line_b, equal) in enumerate(aligned):
+        # whitespace changes are not shown as changes, like in the html synopsis
+        changed = not equal and tokenize(line_a or "") != tokenize(line_b or "")
+        changes = []
+        if changed:
+            if change_idx < len(success_changes):
+                changes = [result.todict() for result in success_changes[change_idx]]
+            change_idx += 1
+        row = {
+            "law": law_title,
+            "row": row_idx,
+            "old": line_a,
+            "new": line_b,
+            "changed": changed,
+            "changes": changes,
+        }
+        yield json.dumps(row, ensure_ascii=False) + "\n"
+
+
+def _unified_range(start: int, stop: int) -> str:
+    """Line range of a hunk like difflib.unified_diff."""
+    beginning, length = start + 1, stop - start
+    if length == 1:
+        return str(beginning)
+    if not length:
+        beginning -= 1
+    return f"{beginning},{length}"
+
+
+def _hunks(aligned: List[AlignedLine], context: int) -> Iterator[Tuple[int, int]]:
+    """Ranges of rows of the hunks: the changed rows with context around them."""
+    changed = [idx for idx, (_, _, equal) in enumerate(aligned) if not equal]
+    if not changed:
+        return
+    start, stop = max(changed[0] - context, 0), changed[0] + 1
+    for idx in changed[1:]:
+        if idx - stop > 2 * context:
+            yield start, min(stop + context, len(aligned))
+            start = idx - context
+        stop = idx + 1
+    yield start, min(stop + context, len(aligned))
+
+
+def unified_diff(
+    aligned: List[AlignedLine],
+    fromfile: str = "",
+    tofile: str = "",
+    context: int = UNIFIED_CONTEXT_LINES,
+) -> Iterator[str]:
+    """Unified diff of the aligned lines, like difflib.unified_diff of the texts.
+
+    Lines without counterpart must be aligned with None (see align_trees).
+    """
+    # number of lines of both texts before every row
+    lines_before_a, lines_before_b = [0], [0]
+    for line_a, line_b, _ in aligned:
+        lines_before_a.append(lines_before_a[-1] + (line_a is not None))
+        lines_before_b.append(lines_before_b[-1] + (line_b is not None))
+
+    header = False
+    for start, stop in _hunks(aligned, context):
+        if not header:
+            yield f"--- {fromfile}\n"
+            yield f"+++ {tofile}\n"
+            header = True
+        range_a = _unified_range(lines_before_a[start], lines_before_a[stop])
+        range_b = _unified_range(lines_before_b[start], lines_before_b[stop])
+        yield f"@@ -{range_a} +{range_b} @@\n"
+        removed, added = [], []
+        for line_a, line_b, equal in aligned[start:stop]:
+            if equal:
+                yield from removed
+                yield from added
+                removed, added = [], []
+                yield f" {line_a}\n"
+                continue
+            if line_a is not None:
+                removed.append(f"-{line_a}\n")
+            if line_b is not None:
+                added.append(f"+{line_b}\n")
+        yield from removed
+        yield from added
+
+
+def export_diff(
+    tree_a: LawTextNode,
+    tree_b: LawTextNode,
+    change_results: List[List[ChangeResult]],
+    law_title: str,
+    export_format: str,
+    engine: Optional[str] = None,
+) -> Iterator[str]:
+    """Export the diff of two trees of a law line by line.
+
+    Args:
+        tree_a: The old tree.
+        tree_b: The new tree.
+        change_results: The results of the changes per changed node of the new tree.
+        law_title: Title of the law.
+        export_format: One of EXPORT_FORMATS.
+        engine: Name of the diff engine (see diff_engine.DIFF_ENGINES).
+
+    Raises:
+        ValueError if the export format is unknown.
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(
+            f"Unknown export format {export_format}; use one of {list(EXPORT_FORMATS)}"
+        )
+    aligned = align_trees(tree_a, tree_b, engine=engine, fill=None)
+    if export_format == "jsonl":
+        return jsonl_rows(aligned, change_results, law_title)
+    # the texts end with a newline, which is not a line of its own
+    return unified_diff(
+        aligned[:-1], fromfile=f"a/{law_title}", tofile=f"b/{law_title}"
+    )
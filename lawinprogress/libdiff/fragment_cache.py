@@ -0,0 +1,188 @@
+"""On-disk cache of rendered diffs, keyed by the source law and the requested changes.
+
+The same pair of source law version and changes recurs across uploads of the same
+draft and across revisions of it that leave some Artikel untouched. Their diffs are
+stored compressed, one file per entry, so all worker processes share them. Reading an
+entry touches its file and the least recently used files are removed when the cache
+grows beyond its size.
+"""
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from lawinprogress.libdiff import diff_engine
+from lawinprogress.parsing import sentence_segmentation
+from lawinprogress.parsing.parse_change_law import Change
+from lawinprogress.storage import atomic_write
+
+logger = logging.getLogger(__name__)
+
+FRAGMENT_CACHE_DIR = os.environ.get("LIP_FRAGMENT_CACHE_DIR", "./data/fragment_cache/")
+# upper bound of the summed size of the compressed entries; 0 disables the cache
+FRAGMENT_CACHE_BYTES = int(os.environ.get("LIP_FRAGMENT_CACHE_BYTES", 512 * 2**20))
+# bump if parsing, applying the changes or rendering the diff changes, so old entries
+# are not used anymore
+FRAGMENT_CACHE_VERSION = 1
+# the diffs are stored with this title, which is replaced when they are used
+TITLE_PLACEHOLDER = "\x00title\x00"
+# number of retrieved source laws whose hash is kept
+SOURCE_LAW_HASHES = 128
+
+_source_law_hashes = OrderedDict()  # id(source law) -> (source law, hash)
+_source_law_hashes_lock = threading.Lock()
+
+
+def source_law_hash(source_law: Any) -> bytes:
+    """Hash of a source law as retrieved.
+
+    The source law cache returns the same object for every request of a law, so the
+    hash is only computed once per retrieved law, not per upload.
+    """
+    with _source_law_hashes_lock:
+        cached = _source_law_hashes.get(id(source_law))
+        if cached is not None and cached[0] is source_law:
+            _source_law_hashes.move_to_end(id(source_law))
+            return cached[1]
+    # the retrieved laws may be frozen (see law_cache.freeze)
+    law_hash = hashlib.blake2b(
+        json.dumps(source_law, sort_keys=True, default=dict).encode("utf8"),
+        digest_size=16,
+    ).digest()
+    with _source_law_hashes_lock:
+        # keep the law, so its id is not reused while its hash is kept
+        _source_law_hashes[id(source_law)] = (source_law, law_hash)
+        while len(_source_law_hashes) > SOURCE_LAW_HASHES:
+            _source_law_hashes.popitem(last=False)
+    return law_hash
+
+
+def fragment_key(source_law: Any, changes: List[Change], renderer: str = "") -> str:
+    """Hash of the source law as retrieved, the serialized changes and the settings.
+
+    The settings are the diff engine, the sentence splitter and the renderer, so
+    switching one of them does not serve diffs rendered with the old one.
+
+    Args:
+        source_law: The retrieved source law.
+        changes: The changes to the law.
+        renderer: Name and version of the routine rendering the diff.
+    """
+    settings = [
+        f"v{FRAGMENT_CACHE_VERSION}",
+        diff_engine.DIFF_ENGINE,
+        sentence_segmentation.SENTENCE_SPLITTER,
+        renderer,
+    ]
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(json.dumps(settings).encode("utf8"))
+    digest.update(b"\0")
+    digest.update(source_law_hash(source_law))
+    digest.update(b"\0")
+    digest.update(json.dumps([change.todict() for change in changes]).encode("utf8"))
+    return digest.hexdigest()
+
+
+def with_title(rows: List[List[str]], title: str) -> List[tuple]:
+    """Rows of a cached diff with the placeholder replaced by the title."""
+    return [
+        tuple(cell.replace(TITLE_PLACEHOLDER, title) for cell in row) for row in rows
+    ]
+
+
+class DiffFragmentCache:
+    """Store json-like entries gzip compressed on disk with LRU eviction.
+
+    The size of the cache is tracked as entries are stored; the folder is only listed
+    once the size exceeds max_bytes or every scan_every stores, to count the entries
+    stored by the other processes.
+
+    Args:
+        directory: Folder to store the entries in.
+        max_bytes: Upper bound of the summed size of the stored files.
+        scan_every: Number of stores after which the folder is listed anyway.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, scan_every: int = 100):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.scan_every = scan_every
+        self._size = None  # estimated size of the stored files; None until listed
+        self._puts = 0
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json.gz")
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """The entry stored under the key or None."""
+        path = self._path(key)
+        try:
+            with open(path, "rb") as entry_file:
+                entry = json.loads(gzip.decompress(entry_file.read()).decode("utf8"))
+            # mark it as recently used
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        except (OSError, EOFError, ValueError) as err:
+            logger.warning(f"Removing broken diff fragment {path}: {err}")
+            self._remove(path)
+            return None
+        return entry
+
+    def put(self, key: str, entry: Dict[str, Any]):
+        """Store an entry and remove the least recently used ones if needed."""
+        data = gzip.compress(json.dumps(entry, ensure_ascii=False).encode("utf8"))
+        if len(data) > self.max_bytes:
+            return
+        atomic_write(self._path(key), data)
+        self._puts += 1
+        if self._size is not None:
+            self._size += len(data)
+        if (
+            self._size is None
+            or self._size > self.max_bytes
+            or self._puts % self.scan_every == 0
+        ):
+            self.evict()
+
+    def evict(self):
+        """Remove the least recently used entries until the cache fits its size."""
+        entries = []
+        with os.scandir(self.directory) as dir_entries:
+            for dir_entry in dir_entries:
+                if dir_entry.name.endswith(".json.gz"):
+                    try:
+                        stat = dir_entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, dir_entry.path))
+        size = sum(entry_size for _, entry_size, _ in entries)
+        for _, entry_size, path in sorted(entries):
+            if size <= self.max_bytes:
+                break
+            self._remove(path)
+            size -= entry_size
+        self._size = size
+
+    def clear(self):
+        """Remove all entries."""
+        if os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                if name.endswith(".json.gz"):
+                    self._remove(os.path.join(self.directory, name))
+        self._size = None
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            # removed by another process meanwhile
+            pass
+
+
+fragment_cache = DiffFragmentCache(FRAGMENT_CACHE_DIR, FRAGMENT_CACHE_BYTES)
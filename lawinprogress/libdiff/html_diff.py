@@ -2,11 +2,15 @@
 import difflib
 import html
 from itertools import zip_longest
-from typing import Callable, List, Tuple, Union
+from typing import Callable, List, Optional, Tuple, Union
 
 from lawinprogress.apply_changes.edit_functions import ChangeResult
+from lawinprogress.deadline import Deadline, check_deadline
+from lawinprogress.parsing.lawtree import LawTextNode
 
+from .diff_engine import DIFF_ENGINE, get_opcodes
 from .diffhelpers import align_seqs, sentencize, tokenize, untokenize
+from .tree_diff import align_trees
 
 
 def mark_text(tokens: List[str], kind: str) -> List[str]:
@@ -27,17 +31,23 @@ def markup_diff(
     seq_b: List[str],
     mark: Callable[List[str], List[str]],
     isjunk: Union[None, Callable[[str], bool]] = None,
+    engine: Optional[str] = None,
 ) -> Tuple[List[str], List[str]]:
     """Returns a and b with any differences processed by mark
 
-    Junk is ignored by the differ
+    Junk is ignored by the differ; only the difflib engine supports junk.
     """
     default_mark = lambda x: x
-    seqmatcher = difflib.SequenceMatcher(
-        isjunk=isjunk, a=seq_a, b=seq_b, autojunk=False
-    )
+    if isjunk is not None:
+        if (engine or DIFF_ENGINE) != "difflib":
+            raise ValueError("Only the difflib diff engine supports isjunk")
+        opcodes = difflib.SequenceMatcher(
+            isjunk=isjunk, a=seq_a, b=seq_b, autojunk=False
+        ).get_opcodes()
+    else:
+        opcodes = get_opcodes(seq_a, seq_b, engine)
     out_a, out_b = [], []
-    for tag, idx_a0, idx_a1, idx_b0, idx_b1 in seqmatcher.get_opcodes():
+    for tag, idx_a0, idx_a1, idx_b0, idx_b1 in opcodes:
         out_a += (
             default_mark(seq_a[idx_a0:idx_a1])
             if tag == "equal"
@@ -58,7 +68,7 @@ def html_sidebyside(
     right_text: List[str],
     change_results: List[List[ChangeResult]],
     title: str,
-) -> str:
+) -> List[Tuple[str, str, str]]:
     """Create a side-by-side div-table for the diff/synopsis."""
     # prepare successfull changes
     success_changes = [
@@ -121,16 +131,131 @@ def html_sidebyside(
 
 
 def html_diffs(
-    text_a: str, text_b: str, change_results: List[List[ChangeResult]], title: str
-) -> str:
-    """Main function to get the side-by-side diff of two strings in html."""
+    text_a: str,
+    text_b: str,
+    change_results: List[List[ChangeResult]],
+    title: str,
+    engine: Optional[str] = None,
+    deadline: Optional[Deadline] = None,
+) -> List[Tuple[str, str, str]]:
+    """Main function to get the side-by-side diff of two strings in html.
+
+    The engine selects the diff algorithm (see diff_engine.DIFF_ENGINES); by default
+    DIFF_ENGINE, set by the env variable LIP_DIFF_ENGINE. The deadline is checked
+    sentence by sentence.
+    """
     text_a = html.escape(text_a)
     text_b = html.escape(text_b)
 
     out_a, out_b = [], []
-    for sent_a, sent_b in zip(*align_seqs(sentencize(text_a), sentencize(text_b))):
-        mark_a, mark_b = markup_diff(tokenize(sent_a), tokenize(sent_b), mark=mark_text)
+    for sent_a, sent_b in zip(
+        *align_seqs(sentencize(text_a), sentencize(text_b), engine=engine)
+    ):
+        check_deadline(deadline, "rendering the diff")
+        mark_a, mark_b = markup_diff(
+            tokenize(sent_a), tokenize(sent_b), mark=mark_text, engine=engine
+        )
         out_a.append(untokenize(mark_a))
         out_b.append(untokenize(mark_b))
 
     return html_sidebyside(out_a, out_b, change_results, title)
+
+
+def html_tree_diffs(
+    tree_a: LawTextNode,
+    tree_b: LawTextNode,
+    change_results: List[List[ChangeResult]],
+    title: str,
+    engine: Optional[str] = None,
+    deadline: Optional[Deadline] = None,
+) -> List[Tuple[str, str, str]]:
+    """Side-by-side diff of two trees in html, like html_diffs of their texts.
+
+    Identical subtrees are skipped when aligning (see tree_diff.align_trees) and only the
+    lines that differ are diffed word by word.
+    """
+    out_a, out_b = [], []
+    for line_a, line_b, equal in align_trees(tree_a, tree_b, engine=engine):
+        check_deadline(deadline, "rendering the diff")
+        line_a, line_b = html.escape(line_a), html.escape(line_b)
+        if equal:
+            line = untokenize(tokenize(line_a))
+            out_a.append(line)
+            out_b.append(line)
+        else:
+            mark_a, mark_b = markup_diff(
+                tokenize(line_a), tokenize(line_b), mark=mark_text, engine=engine
+            )
+            out_a.append(untokenize(mark_a))
+            out_b.append(untokenize(mark_b))
+
+    return html_sidebyside(out_a, out_b, change_results, title)
+
+
+def is_changed_row(row: Tuple[str, str, str]) -> bool:
+    """Whether a row of html_sidebyside shows a change."""
+    return row[0].startswith('<div class="remove-bg old"')
+
+
+def collapsed_ranges(
+    rows: List[Tuple[str, str, str]], context: int
+) -> List[Tuple[int, int]]:
+    """Ranges of rows that are more than context rows away from any changed row.
+
+    Ranges of a single row are not collapsed; a placeholder would not be shorter.
+
+    Returns:
+        Sorted (start, end) pairs of row indices, end exclusive.
+    """
+    shown = [False] * len(rows)
+    for idx, row in enumerate(rows):
+        if is_changed_row(row):
+            for shown_idx in range(
+                max(idx - context, 0), min(idx + context + 1, len(rows))
+            ):
+                shown[shown_idx] = True
+    ranges, start = [], None
+    for idx, is_shown in enumerate(shown + [True]):
+        if not is_shown and start is None:
+            start = idx
+        elif is_shown and start is not None:
+            if idx - start > 1:
+                ranges.append((start, idx))
+            start = None
+    return ranges
+
+
+def html_collapsed(n_rows: int, url: str) -> Tuple[str, str, str]:
+    """Placeholder row for collapsed rows, which loads them from url when clicked."""
+    return (
+        f'<div class="collapsed" data-url="{html.escape(url)}" onclick="expandRows(this)">'
+        f"{n_rows} unveränderte Zeilen anzeigen</div>",
+        "",
+        "",
+    )
+
+
+def collapse_rows(
+    rows: List[Tuple[str, str, str]], context: int, url: Callable[[int, int], str]
+) -> List[Tuple[str, str, str]]:
+    """Replace the rows far from any change by placeholders (see collapsed_ranges).
+
+    This runs after the full rows are rendered and only shortens the page: the
+    collapsed rows are unchanged ones, which get no word-level markup anyway, and the
+    full rows are kept to serve the ranges when they are expanded.
+
+    Args:
+        rows: The rows of html_sidebyside.
+        context: Number of unchanged rows to keep before and after a changed row.
+        url: Function giving the url serving the rows of a range (start, end).
+
+    Returns:
+        The rows near changes with a placeholder row for each collapsed range.
+    """
+    collapsed, position = [], 0
+    for start, end in collapsed_ranges(rows, context):
+        collapsed.extend(rows[position:start])
+        collapsed.append(html_collapsed(end - start, url(start, end)))
+        position = end
+    collapsed.extend(rows[position:])
+    return collapsed
@@ -0,0 +1,128 @@
+"""Align the lines of two law trees, skipping identical subtrees.
+
+Diffing the rendered texts of two trees compares every line of the law, although
+usually only a few paragraphs changed. Here the trees are compared top-down by the
+content hashes of their subtrees: identical subtrees are emitted as equal lines right
+away and the children of changed nodes are matched by their hashes. A single changed
+child is compared the same way; where nodes were added, removed or renumbered, the
+lines of the differing children are aligned line by line, as diffing the full texts
+would.
+"""
+from typing import Dict, List, Optional, Tuple
+
+from lawinprogress.parsing.lawtree import LawTextNode
+
+from .diff_engine import get_opcodes
+from .diffhelpers import align_seqs
+
+# aligned pair of lines of the old and new tree and whether they are the same
+AlignedLine = Tuple[Optional[str], Optional[str], bool]
+
+
+def _node_lines(node: LawTextNode, depth: int) -> List[str]:
+    """The lines of the node as rendered by LawTextNode.to_text."""
+    return "{}{} {}".format(" " * 4 * depth, node.bulletpoint, node.text).split("\n")
+
+
+def _subtree_lines(node: LawTextNode, depth: int) -> List[str]:
+    """All lines of the subtree as rendered by LawTextNode.to_text."""
+    lines = _node_lines(node, depth)
+    for child in node.children:
+        lines.extend(_subtree_lines(child, depth + 1))
+    return lines
+
+
+class _TreeAligner:
+    """Align two trees given the subtree hashes of both."""
+
+    def __init__(
+        self,
+        hashes_a: Dict[int, bytes],
+        hashes_b: Dict[int, bytes],
+        engine: Optional[str] = None,
+        fill: Optional[str] = "",
+    ):
+        self.hashes_a = hashes_a
+        self.hashes_b = hashes_b
+        self.engine = engine
+        self.fill = fill
+        self.aligned: List[AlignedLine] = []
+
+    def equal_lines(self, lines: List[str]):
+        self.aligned.extend((line, line, True) for line in lines)
+
+    def align_lines(self, lines_a: List[str], lines_b: List[str]):
+        """Align lines like diffing the texts of the trees would."""
+        if lines_a == lines_b:
+            self.equal_lines(lines_a)
+            return
+        for line_a, line_b in zip(
+            *align_seqs(lines_a, lines_b, fill=self.fill, engine=self.engine)
+        ):
+            self.aligned.append((line_a, line_b, line_a == line_b))
+
+    def align_nodes(self, node_a: LawTextNode, node_b: LawTextNode, depth: int):
+        """Align two nodes at the same position in both trees."""
+        if self.hashes_a[id(node_a)] == self.hashes_b[id(node_b)]:
+            self.equal_lines(_subtree_lines(node_a, depth))
+            return
+        self.align_lines(_node_lines(node_a, depth), _node_lines(node_b, depth))
+        self.align_children(node_a.children, node_b.children, depth + 1)
+
+    def align_children(
+        self, children_a: Tuple[LawTextNode], children_b: Tuple[LawTextNode], depth: int
+    ):
+        """Match the children by their hashes and align the ones that differ."""
+        opcodes = get_opcodes(
+            [self.hashes_a[id(child)] for child in children_a],
+            [self.hashes_b[id(child)] for child in children_b],
+            self.engine,
+        )
+        for tag, idx_a0, idx_a1, idx_b0, idx_b1 in opcodes:
+            if tag == "equal":
+                for child in children_a[idx_a0:idx_a1]:
+                    self.equal_lines(_subtree_lines(child, depth))
+            elif (
+                tag == "replace"
+                and idx_a1 - idx_a0 == idx_b1 - idx_b0 == 1
+                and children_a[idx_a0].bulletpoint == children_b[idx_b0].bulletpoint
+            ):
+                # a single node with changed content; compare inside of it
+                self.align_nodes(children_a[idx_a0], children_b[idx_b0], depth)
+            else:
+                # nodes were added, removed, renumbered or several changed in a row;
+                # align their lines
+                lines_a, lines_b = [], []
+                for child in children_a[idx_a0:idx_a1]:
+                    lines_a.extend(_subtree_lines(child, depth))
+                for child in children_b[idx_b0:idx_b1]:
+                    lines_b.extend(_subtree_lines(child, depth))
+                self.align_lines(lines_a, lines_b)
+
+
+def align_trees(
+    tree_a: LawTextNode,
+    tree_b: LawTextNode,
+    engine: Optional[str] = None,
+    fill: Optional[str] = "",
+) -> List[AlignedLine]:
+    """Align the lines of the texts of two trees (see LawTextNode.to_text).
+
+    Args:
+        tree_a: The old tree.
+        tree_b: The new tree.
+        engine: Name of the diff engine (see diff_engine.DIFF_ENGINES).
+        fill: Filler where one side has no counterpart; None tells them apart from
+              empty lines.
+
+    Returns:
+        Aligned pairs of lines, with the filler where one side has no counterpart,
+        and whether both lines are the same.
+    """
+    aligner = _TreeAligner(
+        tree_a.subtree_hashes(), tree_b.subtree_hashes(), engine=engine, fill=fill
+    )
+    aligner.align_nodes(tree_a, tree_b, depth=0)
+    # the texts end with a newline
+    aligner.equal_lines([""])
+    return aligner.aligned
@@ -0,0 +1,317 @@
+"""In-process metrics of the pipeline and the web app, in the Prometheus text format.
+
+Every stage of processing a change law records its latency in a histogram, and the
+pages, laws, changes and cache lookups are counted. The stages run in several
+processes (the workers of the app, the worker pool of the pipeline and of the upload
+queue), so every process keeps its own metrics and writes them to METRICS_DIR after
+its work is done; /metrics adds up the metrics of all processes. The files of processes
+that ended are kept until the app is started again, so the counters do not go down
+when a worker is restarted.
+"""
+import contextlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from lawinprogress.storage import atomic_write_json
+
+logger = logging.getLogger(__name__)
+
+# folder the processes share their metrics in; "" keeps them in the process
+METRICS_DIR = os.environ.get("LIP_METRICS_DIR", "./data/metrics/")
+# upper bounds of the buckets of the latency histograms in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class MetricsRegistry:
+    """Values of the metrics of this process, by metric and label values.
+
+    Args:
+        directory: Folder the processes share their metrics in; None for no sharing.
+    """
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory
+        self.metrics: Dict[str, "Metric"] = {}
+        self._values: Dict[str, Dict[Tuple[str, ...], Any]] = {}
+        self._lock = threading.Lock()
+        self._flushed_at = 0.0
+        self._file_name = _new_file_name()
+
+    def register(self, metric: "Metric"):
+        """Add a metric; its name must be unique."""
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric {metric.name} is registered already")
+        self.metrics[metric.name] = metric
+
+    def add(self, name: str, key: Tuple[str, ...], values: Sequence[float]):
+        """Add values to the value of a metric, elementwise for histograms."""
+        with self._lock:
+            samples = self._values.setdefault(name, {})
+            current = samples.get(key)
+            if current is None:
+                samples[key] = list(values)
+            else:
+                for idx, value in enumerate(values):
+                    current[idx] += value
+
+    def snapshot(self) -> Dict[str, List[Tuple[List[str], List[float]]]]:
+        """The values of the metrics of this process as json."""
+        with self._lock:
+            return {
+                name: [(list(key), list(values)) for key, values in samples.items()]
+                for name, samples in self._values.items()
+            }
+
+    def reset(self):
+        """Drop all values, e.g. in a forked child that inherited the ones of its parent."""
+        self._lock = threading.Lock()
+        self._values = {}
+        self._flushed_at = 0.0
+        self._file_name = _new_file_name()
+
+    def _path(self) -> str:
+        return os.path.join(self.directory, self._file_name)
+
+    def clear(self):
+        """Remove the metrics of all processes, e.g. of an earlier run of the app."""
+        if not self.directory or not os.path.isdir(self.directory):
+            return
+        for file_name in os.listdir(self.directory):
+            if file_name.endswith(".json"):
+                try:
+                    os.remove(os.path.join(self.directory, file_name))
+                except FileNotFoundError:
+                    pass
+
+    def flush(self, interval: float = 0):
+        """Share the metrics of this process with the others.
+
+        Args:
+            interval: Skip it if the last flush is less than interval seconds ago.
+        """
+        if not self.directory:
+            return
+        now = time.monotonic()
+        if interval and now - self._flushed_at < interval:
+            return
+        self._flushed_at = now
+        try:
+            atomic_write_json(self._path(), self.snapshot())
+        except OSError as err:
+            logger.warning(f"Failed to write the metrics: {err}")
+
+    def collect(self) -> Dict[str, Dict[Tuple[str, ...], List[float]]]:
+        """The metrics of all processes, added up.
+
+        The metrics of processes that ended are kept, so the counters do not go down.
+        """
+        snapshots = [self.snapshot()]
+        if self.directory and os.path.isdir(self.directory):
+            for file_name in sorted(os.listdir(self.directory)):
+                if not file_name.endswith(".json") or file_name == self._file_name:
+                    continue
+                try:
+                    with open(
+                        os.path.join(self.directory, file_name), "r", encoding="utf8"
+                    ) as metrics_file:
+                        snapshots.append(json.load(metrics_file))
+                except (OSError, ValueError):
+                    continue
+        collected = {}
+        for snapshot in snapshots:
+            for name, samples in snapshot.items():
+                for key, values in samples:
+                    key = tuple(key)
+                    current = collected.setdefault(name, {}).get(key)
+                    if current is None:
+                        collected[name][key] = list(values)
+                    elif len(current) == len(values):
+                        for idx, value in enumerate(values):
+                            current[idx] += value
+        return collected
+
+    def render(self) -> str:
+        """The metrics of all processes in the Prometheus text format."""
+        collected = self.collect()
+        lines = []
+        for name, metric in self.metrics.items():
+            lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            for key, values in sorted(collected.get(name, {}).items()):
+                lines.extend(metric.sample_lines(key, values))
+        return "\n".join(lines) + "\n"
+
+
+def _new_file_name() -> str:
+    """Name of the metrics file of this process; unique even if its pid is reused."""
+    return f"{os.getpid()}-{uuid.uuid4().hex[:12]}.json"
+
+
+registry = MetricsRegistry(METRICS_DIR or None)
+if hasattr(os, "register_at_fork"):
+    # count the work of a forked process only once, in the process doing it
+    os.register_at_fork(after_in_child=registry.reset)
+
+
+def _labels(names: Sequence[str], values: Sequence[str], **extra: str) -> str:
+    pairs = list(zip(names, values)) + list(extra.items())
+    if not pairs:
+        return ""
+    escaped = [
+        (name, value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in pairs
+    ]
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Metric:
+    """A metric with a name, a description and the names of its labels."""
+
+    kind = "untyped"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        metrics_registry: MetricsRegistry = registry,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.registry = metrics_registry
+        metrics_registry.register(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} has the labels {self.labelnames}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def sample_lines(self, key: Tuple[str, ...], values: List[float]) -> List[str]:
+        """The lines of the text format of the value with the label values key."""
+        return [f"{self.name}{_labels(self.labelnames, key)} {_number(values[0])}"]
+
+
+class Counter(Metric):
+    """A count that only goes up."""
+
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels: str):
+        """Increase the count of the labels by amount."""
+        self.registry.add(self.name, self._key(labels), [amount])
+
+
+class Histogram(Metric):
+    """Distribution of observed values, e.g. latencies, in buckets.
+
+    Args:
+        buckets: Upper bounds of the buckets, ascending.
+    """
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+        metrics_registry: MetricsRegistry = registry,
+    ):
+        super().__init__(name, documentation, labelnames, metrics_registry)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels: str):
+        """Record a value: the count of its bucket, the sum and the count."""
+        values = [0.0] * (len(self.buckets) + 3)
+        for idx, bound in enumerate(self.buckets):
+            if value <= bound:
+                values[idx] = 1
+                break
+        else:
+            values[len(self.buckets)] = 1  # +Inf
+        values[-2] = value
+        values[-1] = 1
+        self.registry.add(self.name, self._key(labels), values)
+
+    @contextlib.contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        """Observe the seconds the block takes, also if it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def sample_lines(self, key: Tuple[str, ...], values: List[float]) -> List[str]:
+        lines = []
+        cumulative = 0.0
+        bounds = [_number(bound) for bound in self.buckets] + ["+Inf"]
+        for bound, count in zip(bounds, values):
+            cumulative += count
+            labels = _labels(self.labelnames, key, le=bound)
+            lines.append(f"{self.name}_bucket{labels} {_number(cumulative)}")
+        labels = _labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {_number(values[-2])}")
+        lines.append(f"{self.name}_count{labels} {_number(values[-1])}")
+        return lines
+
+
+# stages of processing a change law, in order
+STAGES = [
+    "pdf_read",
+    "article_split",
+    "slug_match",
+    "source_fetch",
+    "source_parse",
+    "change_parse",
+    "apply",
+    "diff",
+    "render",
+]
+STAGE_SECONDS = Histogram(
+    "lip_stage_seconds",
+    "Seconds spent in a stage of processing a change law.",
+    ["stage"],
+)
+REQUEST_SECONDS = Histogram(
+    "lip_request_seconds",
+    "Seconds to respond to a request, by route.",
+    ["route"],
+)
+REQUESTS = Counter(
+    "lip_requests_total", "Requests by route and status code.", ["route", "status"]
+)
+PDF_PAGES = Counter("lip_pdf_pages_total", "Pages of the change law pdfs read.")
+LAWS = Counter(
+    "lip_laws_total",
+    "Laws processed, by outcome (done, source_law_not_found, failed, unfinished).",
+    ["outcome"],
+)
+CHANGES = Counter("lip_changes_total", "Changes parsed from the change laws.")
+CHANGES_APPLIED = Counter(
+    "lip_changes_applied_total", "Changes applied to the source laws."
+)
+CHANGES_FAILED = Counter(
+    "lip_changes_failed_total", "Changes that could not be applied."
+)
+CACHE_REQUESTS = Counter(
+    "lip_cache_requests_total",
+    "Lookups in the caches, by hit or miss.",
+    ["cache", "result"],
+)
+
+
+def count_cache(cache: str, hit: bool):
+    """Count a lookup in a cache."""
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
@@ -1,6 +1,9 @@
 """Implementation of the specific tree to parse laws to."""
+import hashlib
+from typing import Dict
+
 import regex as re
-from anytree import NodeMixin, RenderTree
+from anytree import NodeMixin, PostOrderIter, RenderTree
 from anytree.exporter import JsonExporter
 from anytree.importer import DictImporter, JsonImporter
 from natsort import natsorted
@@ -98,6 +101,27 @@ class LawTextNode(NodeMixin):
             treestr += "{}{} {}\n".format(" " * len(pre), node.bulletpoint, node.text)
         return treestr
 
+    def subtree_hashes(self) -> Dict[int, bytes]:
+        """Content hashes of the subtrees of all nodes, in one pass over the tree.
+
+        The hash of a node covers its bulletpoint, its text and the hashes of its
+        children, so two subtrees have the same hash if they render to the same text.
+        Computed fresh on every call, as nodes can change.
+
+        Returns:
+            Dict from id(node) to the hash of the subtree rooted at the node.
+        """
+        hashes = {}
+        for node in PostOrderIter(self):
+            digest = hashlib.blake2b(digest_size=16)
+            for part in [node.bulletpoint, node.text]:
+                digest.update(str(part).encode("utf8"))
+                digest.update(b"\0")
+            for child in node.children:
+                digest.update(hashes[id(child)])
+            hashes[id(node)] = digest.digest()
+        return hashes
+
     def _print(self):
         "Print out the tree in a nice format" ""
         for pre, _, node in RenderTree(self):
@@ -1,9 +1,10 @@
 """Functions to parse the change law from a line-by-line representation."""
 import dataclasses
-from typing import List
+from typing import List, Optional
 
 import regex as re
 
+from lawinprogress.deadline import Deadline, check_deadline
 from lawinprogress.parsing.change_law_utils import preprocess_raw_law
 from lawinprogress.parsing.lawtree import LawTextNode
 
@@ -30,12 +31,14 @@ class Change:
 def parse_changes(
     change_law_text: str,
     law_title: str,
+    deadline: Optional[Deadline] = None,
 ) -> List[Change]:
     """Wrapper function to parse and changes from the change law text.
 
     Args:
       change_law_text: Text of the change law.
       law_title: Title of the affected law.
+      deadline: Time budget of parsing, checked change by change.
 
     Returns:
       List of requested Changes.
@@ -62,6 +65,7 @@ def parse_changes(
     # parse the change request lines to changes
     change_requests = []
     for change_request_line in all_change_lines:
+        check_deadline(deadline, "parsing the changes")
         res = parse_change_request_line(change_request_line)
         if res:
             change_requests.extend(res)
@@ -0,0 +1,156 @@
+"""Rule-based sentence splitter for German statute texts.
+
+A pure python alternative to the spacy pipeline. Sentence boundaries are a full stop,
+question or exclamation mark, followed by whitespace and the start of a new sentence.
+A full stop does not end a sentence if it belongs to an abbreviation common in statutes
+(Abs., Nr., S., BGBl., i. V. m., ...) or to an ordinal number or date (1. Januar 2022,
+1. 1. 2022).
+"""
+from typing import List, Tuple
+
+import regex as re
+
+# abbreviations that are followed by a full stop but don't end a sentence
+ABBREVIATIONS = frozenset(
+    [
+        "Abs",
+        "Abschn",
+        "Anh",
+        "Anl",
+        "Art",
+        "Aufl",
+        "BAnz",
+        "BGBl",
+        "Bd",
+        "Bst",
+        "Buchst",
+        "Dr",
+        "GVBl",
+        "Hs",
+        "Kap",
+        "Nr",
+        "Nrn",
+        "RGBl",
+        "Rn",
+        "S",
+        "Tz",
+        "UAbs",
+        "Ziff",
+        "bzw",
+        "ca",
+        "evtl",
+        "ff",
+        "gem",
+        "ggf",
+        "lit",
+        "vgl",
+        "zit",
+    ]
+)
+
+# words introducing an ordinal number, e.g. "vom 1. Januar", "der 2. Abschnitt"
+ORDINAL_PREFIXES = frozenset(
+    [
+        "ab",
+        "am",
+        "bis",
+        "das",
+        "dem",
+        "den",
+        "der",
+        "des",
+        "die",
+        "im",
+        "seit",
+        "vom",
+        "zum",
+        "zur",
+    ]
+)
+
+MONTHS = (
+    "Januar|Februar|März|April|Mai|Juni|Juli|August|September|Oktober|November|Dezember"
+)
+
+# a candidate boundary: sentence final punctuation, optional closing quotes or brackets,
+# whitespace and something a sentence can start with
+CANDIDATE_PATTERN = re.compile(r"[.!?][“”\"')\]]*(?=\s+[\p{Lu}\d„\"(§])")
+# the word (or number) directly before the punctuation
+PRECEDING_WORD_PATTERN = re.compile(r"(\S+?)\s*$")
+# the word before that one
+PREVIOUS_WORD_PATTERN = re.compile(r"(\S+)\s+\S+\s*$")
+NEXT_WORD_PATTERN = re.compile(r"\s+(\S+)")
+MONTH_PATTERN = re.compile(rf"^(?:{MONTHS})\b")
+NUMBER_PATTERN = re.compile(r"^\(?\d+[a-z]?$")
+# an uppercase initial, e.g. the V. of i. V. m.; a lowercase letter is only one next
+# to another initial, otherwise it is a letter of an enumeration (Buchstabe a.)
+INITIAL_PATTERN = re.compile(r"^\p{Lu}$")
+LETTER_PATTERN = re.compile(r"^\p{L}$")
+DOTTED_LETTER_PATTERN = re.compile(r"^\p{L}\.$")
+# the rest of a numeric date after its day or month, e.g. 1. 1. 2022
+DATE_AFTER_DAY_PATTERN = re.compile(r"\s*\d{1,2}\.\s*\d{4}\b")
+DATE_AFTER_MONTH_PATTERN = re.compile(r"\s*\d{4}\b")
+DAY_PATTERN = re.compile(r"\b\d{1,2}\.\s*\d{1,2}$")
+
+
+def _is_boundary(text: str, match) -> bool:
+    """Decide if a candidate full stop ends a sentence."""
+    if text[match.start()] != ".":
+        return True
+    before = text[: match.start()]
+    preceding = PRECEDING_WORD_PATTERN.search(before)
+    if not preceding:
+        return True
+    word = preceding.group(1).lstrip('(„"')
+    next_word = NEXT_WORD_PATTERN.match(text, match.end())
+    if word in ABBREVIATIONS or INITIAL_PATTERN.match(word):
+        # Abs., BGBl., i. V. m., z. B.
+        return False
+    if LETTER_PATTERN.match(word):
+        previous = PREVIOUS_WORD_PATTERN.search(before)
+        # the i of i. V. m. or the m after it, but not Buchstabe a.
+        return not (
+            (next_word and DOTTED_LETTER_PATTERN.match(next_word.group(1)))
+            or (previous and DOTTED_LETTER_PATTERN.match(previous.group(1)))
+        )
+    if NUMBER_PATTERN.match(word):
+        if next_word and MONTH_PATTERN.match(next_word.group(1)):
+            # date, e.g. 1. Januar 2022
+            return False
+        if (len(word) <= 2 and DATE_AFTER_DAY_PATTERN.match(text, match.end())) or (
+            DAY_PATTERN.search(before)
+            and DATE_AFTER_MONTH_PATTERN.match(text, match.end())
+        ):
+            # numeric date, e.g. 1. 1. 2022
+            return False
+        previous = PREVIOUS_WORD_PATTERN.search(before)
+        if previous and previous.group(1).lower() in ORDINAL_PREFIXES:
+            # ordinal number, e.g. der 2. Abschnitt
+            return False
+    return True
+
+
+def sentence_spans(text: str) -> List[Tuple[int, int]]:
+    """Find the sentences of a text.
+
+    Args:
+        text: Text to split.
+
+    Returns:
+        List of (start, end) character offsets, without surrounding whitespace.
+    """
+    spans = []
+    start = len(text) - len(text.lstrip())
+    for match in CANDIDATE_PATTERN.finditer(text):
+        if _is_boundary(text, match):
+            spans.append((start, match.end()))
+            start = match.end()
+            while start < len(text) and text[start].isspace():
+                start += 1
+    spans.append((start, len(text.rstrip())))
+    return [(start, end) for start, end in spans if text[start:end].strip()]
+
+
+def split_sentences(text: str) -> List[str]:
+    """Split a text into a list of sentences."""
+    return [text[start:end] for start, end in sentence_spans(text)]
@@ -0,0 +1,141 @@
+"""Sentence segmentation of law texts with batching and a per-text cache."""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Iterable, List, Tuple
+
+from lawinprogress.parsing.sentence_rules import split_sentences
+
+# which sentence splitter to use: "spacy" or "rules" (see sentence_rules.py)
+SENTENCE_SPLITTER = os.environ.get("LIP_SENTENCE_SPLITTER", "spacy")
+
+
+class SentenceSegmenter:
+    """Split texts into sentences with spacy or the rule-based splitter.
+
+    Segmented texts are cached by the hash of their content. A node whose text was
+    changed by an edit therefore gets a fresh segmentation, while repeated edits of an
+    unchanged text reuse the cached one. Texts known in advance can be segmented together
+    with prefetch, which runs them through spacy in batches (NLP.pipe).
+
+    Args:
+        maxsize: Maximum number of cached texts.
+        batch_size: Number of texts per batch when prefetching.
+        nlp: Spacy pipeline with sentence boundaries; defaults to lawinprogress.NLP.
+        backend: "spacy" or "rules".
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 2048,
+        batch_size: int = 64,
+        nlp=None,
+        backend: str = SENTENCE_SPLITTER,
+    ):
+        if backend not in ["spacy", "rules"]:
+            raise ValueError(f"Unknown sentence splitter {backend}")
+        self.backend = backend
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self._nlp = nlp
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def nlp(self):
+        """The spacy pipeline used to find sentence boundaries."""
+        if self._nlp is None:
+            # pylint: disable=import-outside-toplevel
+            from lawinprogress import get_nlp
+
+            self._nlp = get_nlp()
+        return self._nlp
+
+    @staticmethod
+    def _key(text: str) -> bytes:
+        return hashlib.blake2b(text.encode("utf8"), digest_size=16).digest()
+
+    @staticmethod
+    def _sentences_from_doc(doc) -> Tuple[str, ...]:
+        """Collect the sentences of a spacy doc and improve upon them."""
+        sentences = []
+        sent_text = ""
+        for sent in doc.sents:
+            # join sentences is split by BGBl.
+            sent_text += sent.text
+            if not sent.text.endswith("BGBl."):
+                sentences.append(sent_text)
+                sent_text = ""
+        return tuple(sent for sent in sentences if sent.strip())
+
+    def _store(self, key: bytes, sentences: Tuple[str, ...]):
+        with self._lock:
+            self._cache[key] = sentences
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+
+    def split(self, text: str) -> List[str]:
+        """Split a text into sentences.
+
+        Returns:
+            A new list of sentences, the caller may modify it.
+        """
+        key = self._key(text)
+        with self._lock:
+            sentences = self._cache.get(key)
+            if sentences is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return list(sentences)
+            self.misses += 1
+        if self.backend == "rules":
+            sentences = tuple(split_sentences(text))
+        else:
+            sentences = self._sentences_from_doc(self.nlp(text))
+        self._store(key, sentences)
+        return list(sentences)
+
+    def prefetch(self, texts: Iterable[str]):
+        """Segment all not yet cached texts together in batches."""
+        keys = {}
+        with self._lock:
+            for text in texts:
+                key = self._key(text)
+                if key not in self._cache:
+                    keys[key] = text
+        # don't prefetch more than fits into the cache
+        missing = list(keys.items())[: self.maxsize]
+        if not missing:
+            # nothing to do; don't load the spacy model for it
+            return
+        if self.backend == "rules":
+            for key, text in missing:
+                self._store(key, tuple(split_sentences(text)))
+            return
+        docs = self.nlp.pipe((text for _, text in missing), batch_size=self.batch_size)
+        for (key, _), doc in zip(missing, docs):
+            self._store(key, self._sentences_from_doc(doc))
+
+    def invalidate(self, text: str):
+        """Drop the cached segmentation of a text, e.g. after a node's text was replaced.
+
+        The cache is keyed by the text, not by the node: other nodes (or laws) with the
+        same text lose the entry as well. That is never wrong, the segmentation only
+        depends on the text, but they segment it again; so only call this once a text
+        was replaced, not for texts that are still in use.
+        """
+        with self._lock:
+            self._cache.pop(self._key(text), None)
+
+    def clear(self):
+        """Drop all cached segmentations."""
+        with self._lock:
+            self._cache.clear()
+            self.hits = self.misses = 0
+
+
+SEGMENTER = SentenceSegmenter()
@@ -0,0 +1,520 @@
+"""Process all laws affected by a change law, in parallel worker processes.
+
+Parsing the source law, applying the changes and rendering the diff is pure CPU work
+for every affected law, so the laws are distributed over a pool of worker processes.
+The workers are warmed up (spacy model, law lookup) when they start and are reused for
+all following uploads. With a deadline, the laws not done in time are returned as
+unfinished instead of waiting for them.
+"""
+import dataclasses
+import logging
+import os
+import threading
+from concurrent.futures import CancelledError, ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from anytree import PreOrderIter
+
+from lawinprogress import warm_up
+from lawinprogress.apply_changes.apply_changes import apply_changes
+from lawinprogress.apply_changes.edit_functions import ChangeResult
+from lawinprogress.deadline import Deadline, DeadlineExceeded, check_deadline
+from lawinprogress.libdiff.export import export_diff
+from lawinprogress.libdiff.fragment_cache import (
+    TITLE_PLACEHOLDER,
+    fragment_cache,
+    fragment_key,
+    with_title,
+)
+from lawinprogress.libdiff.html_diff import html_tree_diffs
+from lawinprogress.metrics import (
+    CHANGES,
+    CHANGES_APPLIED,
+    CHANGES_FAILED,
+    LAWS,
+    STAGE_SECONDS,
+    count_cache,
+    registry,
+)
+from lawinprogress.parsing.lawtree import LawTextNode
+from lawinprogress.parsing.parse_change_law import Change, parse_changes
+from lawinprogress.parsing.parse_source_law import parse_source_law
+from lawinprogress.processing.source_law_retrieval import (
+    FuzzyLawSlugRetriever,
+    LawLookupIndex,
+    retrieve_source_law,
+)
+
+logger = logging.getLogger(__name__)
+
+# number of worker processes; 0 or 1 processes the laws one after another in-process
+PIPELINE_WORKERS = int(os.environ.get("LIP_PIPELINE_WORKERS", os.cpu_count() or 1))
+
+# bump if processing a change law gives other results, so stored results are not used
+PIPELINE_VERSION = 1
+# routine rendering the diffs, part of the keys of the fragment cache
+DIFF_RENDERER = f"{html_tree_diffs.__name__}/{PIPELINE_VERSION}"
+
+# rows of the side-by-side diff (old, change, new) shown instead of a diff
+SOURCE_LAW_NOT_FOUND_HTML = [("<p></p><p>Source law not found.</p><p></p>", "", "")]
+FAILED_HTML = [
+    ("<p></p><p>Failed to apply the changes to this law.</p><p></p>", "", "")
+]
+UNFINISHED_HTML = [
+    (
+        "<p></p><p>Not finished in time; upload the change law again to retry.</p>"
+        "<p></p>",
+        "",
+        "",
+    )
+]
+
+
+@dataclasses.dataclass
+class LawResult:
+    """Class for storing the result of processing the changes to one law.
+
+    Only holds plain strings and numbers, so it is cheap to send between processes.
+    """
+
+    law_title: str
+    source_law_found: bool = False
+    n_changes: int = 0
+    n_success: int = 0
+    source_text: str = ""
+    modified_text: str = ""
+    html: List[Tuple[str, str, str]] = dataclasses.field(default_factory=list)
+    exports: Dict[str, str] = dataclasses.field(default_factory=dict)
+    error: Optional[str] = None
+    unfinished: bool = False  # the deadline ran out before the law was done
+
+
+@dataclasses.dataclass
+class AppliedLaw:
+    """Class for storing the trees of a law before and after applying the changes."""
+
+    law_title: str
+    n_changes: int = 0
+    source_tree: Optional[LawTextNode] = None  # None if the source law was not found
+    result_tree: Optional[LawTextNode] = None
+    n_success: int = 0
+    changes: List[Change] = dataclasses.field(default_factory=list)
+    source_law: Optional[List[dict]] = None  # the retrieved source law, unparsed
+
+    def change_results(self) -> List[List[ChangeResult]]:
+        """The results of the changes per changed node of the result tree."""
+        return [node.changes for node in PreOrderIter(self.result_tree) if node.changes]
+
+
+def load_law(
+    law_title: str,
+    change_law_text: str,
+    index: LawLookupIndex = None,
+    deadline: Optional[Deadline] = None,
+) -> AppliedLaw:
+    """Parse the changes of the change law and retrieve the source law, unparsed."""
+    applied = AppliedLaw(law_title=law_title)
+    # parse changes
+    with STAGE_SECONDS.time(stage="change_parse"):
+        applied.changes = parse_changes(change_law_text, law_title, deadline=deadline)
+    applied.n_changes = len(applied.changes)
+
+    # find and load the source law
+    check_deadline(deadline, "retrieving the source law")
+    applied.source_law = retrieve_source_law(law_title, index=index)
+    return applied
+
+
+def _apply_loaded_law(
+    applied: AppliedLaw, deadline: Optional[Deadline] = None
+) -> AppliedLaw:
+    """Parse the source law of a loaded law and apply the requested changes to it."""
+    if not applied.source_law:
+        return applied
+    check_deadline(deadline, "parsing the source law")
+    with STAGE_SECONDS.time(stage="source_parse"):
+        applied.source_tree = parse_source_law(
+            applied.source_law, law_title=applied.law_title
+        )
+    with STAGE_SECONDS.time(stage="apply"):
+        applied.result_tree, _, applied.n_success = apply_changes(
+            applied.source_tree, applied.changes, deadline=deadline
+        )
+    return applied
+
+
+def apply_law(
+    law_title: str,
+    change_law_text: str,
+    index: LawLookupIndex = None,
+    deadline: Optional[Deadline] = None,
+) -> AppliedLaw:
+    """Retrieve the source law and apply the changes of the change law to it.
+
+    Args:
+        law_title: Title of the affected law.
+        change_law_text: Text of the changes to the law.
+        index: Snapshot of the lookup index to use; defaults to the current one.
+        deadline: Time budget, checked by every stage.
+
+    Returns:
+        AppliedLaw of the law, without trees if the source law was not found.
+
+    Raises:
+        DeadlineExceeded if the deadline ran out.
+    """
+    applied = load_law(law_title, change_law_text, index=index, deadline=deadline)
+    return _apply_loaded_law(applied, deadline=deadline)
+
+
+def _cached_result(
+    result: LawResult, entry: dict, html_title: Optional[str]
+) -> Optional[LawResult]:
+    """Fill the result from a cached diff; None if the entry lacks the html diff."""
+    if html_title is not None and entry.get("html") is None:
+        return None
+    result.n_success = entry["n_success"]
+    result.source_text = entry["source_text"]
+    result.modified_text = entry["modified_text"]
+    if html_title is not None:
+        result.html = with_title(entry["html"], html_title)
+    return result
+
+
+def process_law(
+    law_title: str,
+    change_law_text: str,
+    html_title: Optional[str] = None,
+    index: LawLookupIndex = None,
+    exports: Tuple[str, ...] = (),
+    deadline: Optional[Deadline] = None,
+) -> LawResult:
+    """Retrieve the source law, apply the changes of the change law and render the diff.
+
+    Diffs are looked up in the fragment cache before the source law is parsed and the
+    changes are applied, unless exports are requested.
+
+    Args:
+        law_title: Title of the affected law.
+        change_law_text: Text of the changes to the law.
+        html_title: Title of the html diff; no diff is rendered if None.
+        index: Snapshot of the lookup index to use; defaults to the current one.
+        exports: Export formats of the diff to generate (see export.EXPORT_FORMATS).
+        deadline: Time budget, checked by every stage.
+
+    Returns:
+        LawResult of the law.
+
+    Raises:
+        DeadlineExceeded if the deadline ran out.
+    """
+    logger.info(f"Started processing change for {law_title}...")
+    applied = load_law(law_title, change_law_text, index=index, deadline=deadline)
+    result = LawResult(law_title=law_title, n_changes=applied.n_changes)
+    if not applied.source_law:
+        result.html = SOURCE_LAW_NOT_FOUND_HTML
+        return result
+    result.source_law_found = True
+
+    use_cache = fragment_cache.max_bytes > 0 and not exports
+    if use_cache:
+        key = fragment_key(applied.source_law, applied.changes, renderer=DIFF_RENDERER)
+        entry = fragment_cache.get(key)
+        hit = (
+            entry is not None and _cached_result(result, entry, html_title) is not None
+        )
+        count_cache("fragment", hit=hit)
+        if hit:
+            logger.info(f"Using cached diff for {law_title}")
+            return result
+
+    _apply_loaded_law(applied, deadline=deadline)
+    result.n_success = applied.n_success
+    result.source_text = applied.source_tree.to_text()
+    result.modified_text = applied.result_tree.to_text()
+
+    if html_title is not None:
+        # generate the html diff; cached with a placeholder as title
+        with STAGE_SECONDS.time(stage="diff"):
+            html = html_tree_diffs(
+                applied.source_tree,
+                applied.result_tree,
+                applied.change_results(),
+                title=TITLE_PLACEHOLDER if use_cache else html_title,
+                deadline=deadline,
+            )
+        result.html = with_title(html, html_title) if use_cache else html
+    if use_cache:
+        fragment_cache.put(
+            key,
+            {
+                "n_success": result.n_success,
+                "source_text": result.source_text,
+                "modified_text": result.modified_text,
+                "html": html if html_title is not None else None,
+            },
+        )
+    for export_format in exports:
+        result.exports[export_format] = "".join(
+            export_diff(
+                applied.source_tree,
+                applied.result_tree,
+                applied.change_results(),
+                law_title,
+                export_format,
+            )
+        )
+    return result
+
+
+def _worker_index(lookup_version: Optional[tuple]) -> Optional[LawLookupIndex]:
+    """The law lookup of a worker process, of the given version if possible.
+
+    The lookup is only loaded again if the worker has another version. Then the lookup
+    file is that version, unless it was replaced again in the meantime; the worker
+    uses the newest lookup then. None if no lookup could be loaded yet.
+    """
+    index = FuzzyLawSlugRetriever.index
+    if index is None or lookup_version is None or index.version != lookup_version:
+        try:
+            FuzzyLawSlugRetriever.reload_if_changed()
+        except (OSError, ValueError, KeyError) as err:
+            # keep using the current index if the new file is broken
+            logger.warning(f"Failed to reload law lookup: {err}")
+        index = FuzzyLawSlugRetriever.index
+    if index is not None and lookup_version not in [None, index.version]:
+        logger.warning(
+            f"Law lookup version {lookup_version} was replaced, using {index.version}"
+        )
+    return index
+
+
+def _process_law_in_worker(
+    law_title: str,
+    change_law_text: str,
+    html_title: Optional[str],
+    exports: Tuple[str, ...] = (),
+    deadline: Optional[Deadline] = None,
+    lookup_version: Optional[tuple] = None,
+) -> LawResult:
+    """Process a law in a worker process, with the law lookup of the given version."""
+    index = _worker_index(lookup_version)
+    try:
+        return process_law(
+            law_title,
+            change_law_text,
+            html_title=html_title,
+            index=index,
+            exports=exports,
+            deadline=deadline,
+        )
+    finally:
+        # the stage latencies of the worker, for /metrics of the app
+        registry.flush()
+
+
+def _failed(law_title: str, err: BaseException) -> LawResult:
+    """Result of a law that failed to process."""
+    logger.warning(f"Failed to process {law_title}: {err!r}", exc_info=err)
+    return LawResult(
+        law_title=law_title, html=FAILED_HTML, error=f"{type(err).__name__}: {err}"
+    )
+
+
+def _unfinished(law_title: str, deadline: Optional[Deadline]) -> LawResult:
+    """Result of a law that was not done when the deadline ran out."""
+    time_limit = f" of {deadline.seconds:g}s" if deadline is not None else ""
+    logger.warning(f"Deadline{time_limit} ran out before {law_title}")
+    return LawResult(
+        law_title=law_title,
+        html=UNFINISHED_HTML,
+        error=f"Not finished within the time limit{time_limit}.",
+        unfinished=True,
+    )
+
+
+def _count_law(result: LawResult) -> LawResult:
+    """Count the law and its changes in the metrics."""
+    if result.unfinished:
+        outcome = "unfinished"
+    elif result.error is not None:
+        outcome = "failed"
+    elif not result.source_law_found:
+        outcome = "source_law_not_found"
+    else:
+        outcome = "done"
+    LAWS.inc(outcome=outcome)
+    CHANGES.inc(result.n_changes)
+    if result.source_law_found:
+        CHANGES_APPLIED.inc(result.n_success)
+        CHANGES_FAILED.inc(result.n_changes - result.n_success)
+    return result
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor(max_workers: int = None) -> ProcessPoolExecutor:
+    """Return the pool of warm worker processes, starting it on first use.
+
+    Args:
+        max_workers: Number of worker processes, if the pool is not started yet.
+    """
+    global _executor  # pylint: disable=global-statement
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=max_workers or PIPELINE_WORKERS, initializer=warm_up
+            )
+        return _executor
+
+
+def shutdown_executor(executor: ProcessPoolExecutor = None):
+    """Stop the worker processes.
+
+    Args:
+        executor: Only stop the pool if it is still this one.
+    """
+    global _executor  # pylint: disable=global-statement
+    with _executor_lock:
+        if _executor is not None and executor in [None, _executor]:
+            _executor.shutdown(wait=True, cancel_futures=True)
+            _executor = None
+
+
+def _discard_executor(executor: ProcessPoolExecutor):
+    """Drop a broken pool, so the next get_executor starts a new one.
+
+    Doesn't wait for the pool and doesn't cancel the laws of other uploads in it.
+    """
+    global _executor  # pylint: disable=global-statement
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False)
+
+
+def iter_process_laws(
+    laws: List[Tuple[str, str]],
+    html_titles: Optional[List[str]] = None,
+    index: LawLookupIndex = None,
+    workers: int = None,
+    exports: Tuple[str, ...] = (),
+    deadline: Optional[Deadline] = None,
+) -> Iterator[LawResult]:
+    """Process the changes to all affected laws, in parallel if possible.
+
+    Yields the result of every law as soon as it and all laws before it are done, so
+    the caller can pass it on before the slowest law is finished.
+    One failing law does not stop the others; its result holds the error instead.
+    Once the deadline ran out, the laws not done yet are yielded as unfinished.
+
+    Args:
+        laws: Pairs of law title and change law text.
+        html_titles: Title of the html diff per law; no diffs are rendered if None.
+        index: Snapshot of the lookup index to use; defaults to the current one. The
+               workers use their own lookup of the same version, unless the lookup
+               file was replaced again since the snapshot was taken.
+        workers: Number of worker processes, if the pool is not started yet; with 0
+                 or 1 the laws are processed in-process. Defaults to PIPELINE_WORKERS.
+        exports: Export formats of the diffs to generate (see export.EXPORT_FORMATS).
+        deadline: Time budget of processing all laws.
+
+    Yields:
+        LawResults in the order of the laws.
+    """
+    workers = PIPELINE_WORKERS if workers is None else workers
+    html_titles = html_titles if html_titles is not None else [None] * len(laws)
+
+    if workers <= 1 or len(laws) <= 1:
+        for (law_title, change_law_text), html_title in zip(laws, html_titles):
+            try:
+                result = process_law(
+                    law_title,
+                    change_law_text,
+                    html_title,
+                    index=index,
+                    exports=exports,
+                    deadline=deadline,
+                )
+            except DeadlineExceeded:
+                result = _unfinished(law_title, deadline)
+            except Exception as err:  # pylint: disable=broad-except
+                result = _failed(law_title, err)
+            yield _count_law(result)
+        return
+
+    executor = get_executor(workers)
+    lookup_version = index.version if index is not None else None
+    futures = [
+        executor.submit(
+            _process_law_in_worker,
+            law_title,
+            change_law_text,
+            html_title,
+            exports,
+            deadline,
+            lookup_version,
+        )
+        for (law_title, change_law_text), html_title in zip(laws, html_titles)
+    ]
+    try:
+        for idx, (law_title, _) in enumerate(laws):
+            try:
+                result = futures[idx].result(
+                    timeout=deadline.remaining() if deadline is not None else None
+                )
+            except (DeadlineExceeded, FutureTimeoutError):
+                result = _unfinished(law_title, deadline)
+                # the laws not started yet would stop right away
+                for future in futures[idx + 1 :]:
+                    future.cancel()
+            except CancelledError as err:
+                if deadline is not None and deadline.expired():
+                    # cancelled above, once the deadline ran out
+                    result = _unfinished(law_title, deadline)
+                else:
+                    # the pool was shut down, e.g. when the app stops
+                    result = _failed(law_title, err)
+            except BrokenProcessPool as err:
+                # a worker died; start a new pool for the next upload
+                result = _failed(law_title, err)
+                _discard_executor(executor)
+            except Exception as err:  # pylint: disable=broad-except
+                result = _failed(law_title, err)
+            # don't keep the results that were passed on
+            futures[idx] = None
+            yield _count_law(result)
+    finally:
+        # the caller stopped early, e.g. the client went away
+        for future in futures:
+            if future is not None:
+                future.cancel()
+
+
+def process_laws(
+    laws: List[Tuple[str, str]],
+    html_titles: Optional[List[str]] = None,
+    index: LawLookupIndex = None,
+    workers: int = None,
+    exports: Tuple[str, ...] = (),
+    deadline: Optional[Deadline] = None,
+) -> List[LawResult]:
+    """Process the changes to all affected laws; see iter_process_laws.
+
+    Returns:
+        LawResults in the order of the laws.
+    """
+    return list(
+        iter_process_laws(
+            laws,
+            html_titles,
+            index=index,
+            workers=workers,
+            exports=exports,
+            deadline=deadline,
+        )
+    )
@@ -0,0 +1,122 @@
+"""On-disk http cache that revalidates stored responses with conditional requests."""
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+from typing import Optional
+
+import requests
+
+from lawinprogress.metrics import count_cache
+from lawinprogress.storage import atomic_write_json, file_lock
+
+logger = logging.getLogger(__name__)
+
+
+class HttpJsonCache:
+    """Store json responses on disk together with their ETag and Last-Modified headers.
+
+    On every fetch the stored validators are sent along (If-None-Match, If-Modified-Since).
+    If the server answers with 304 Not Modified, the stored body is served from disk,
+    so only resources that actually changed are transferred again.
+    Only one process fetches a resource at a time; processes that waited for it are
+    served the copy it stored, without a request of their own.
+
+    Args:
+        directory: Folder to store the responses and their metadata in.
+        timeout: Timeout for the http requests in seconds.
+    """
+
+    def __init__(self, directory: str, timeout: float = 30):
+        self.directory = directory
+        self.timeout = timeout
+
+    def _paths(self, key: str):
+        safe_key = re.sub(r"[^\w.-]", "_", key)
+        return (
+            os.path.join(self.directory, f"{safe_key}.json"),
+            os.path.join(self.directory, f"{safe_key}.meta.json"),
+        )
+
+    def fetch(self, url: str, key: str) -> Optional[dict]:
+        """Get the json body of url, revalidating a stored copy if there is one.
+
+        Args:
+            url: Url of the resource to fetch.
+            key: Name to store the resource under.
+
+        Returns:
+            Parsed json body or None if the resource could not be retrieved.
+
+        Raises:
+            requests.exceptions.RequestException if the request fails and there
+            is no stored copy to fall back to.
+        """
+        body_path, meta_path = self._paths(key)
+        stored_before = _mtime(meta_path)
+        with file_lock(_lock_path(body_path)) as waited:
+            if waited and _mtime(meta_path) != stored_before:
+                # stored by the fetch we waited for
+                logger.info(f"Fetched meanwhile, serving {key} from disk.")
+                return self._load(body_path)
+            return self._fetch(url, key, body_path, meta_path)
+
+    def _fetch(self, url: str, key: str, body_path: str, meta_path: str):
+        meta = {}
+        if os.path.isfile(body_path) and os.path.isfile(meta_path):
+            with open(meta_path, "r", encoding="utf8") as meta_file:
+                meta = json.load(meta_file)
+
+        headers = {}
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+
+        try:
+            response = requests.get(url, headers=headers, timeout=self.timeout)
+        except requests.exceptions.RequestException as err:
+            if not meta:
+                raise
+            logger.warning(f"Serving stale copy of {key}: {err}")
+            return self._load(body_path)
+
+        if response.status_code == 304 and meta:
+            logger.info(f"Not modified, serving {key} from disk.")
+            count_cache("http", hit=True)
+            return self._load(body_path)
+        if response.status_code != 200:
+            return None
+        count_cache("http", hit=False)
+
+        body = response.json()
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if etag or last_modified:
+            # only store responses we are able to revalidate later
+            atomic_write_json(body_path, body)
+            atomic_write_json(
+                meta_path, {"url": url, "etag": etag, "last_modified": last_modified}
+            )
+        return body
+
+    @staticmethod
+    def _load(body_path: str) -> dict:
+        with open(body_path, "r", encoding="utf8") as body_file:
+            return json.load(body_file)
+
+
+def _lock_path(path: str) -> str:
+    """Lock file for a file, outside of the cache to keep it clean."""
+    digest = hashlib.sha1(os.path.abspath(path).encode("utf8")).hexdigest()
+    return os.path.join(tempfile.gettempdir(), "lawinprogress-locks", f"{digest}.lock")
+
+
+def _mtime(path: str) -> Optional[int]:
+    """Modification time of a file in ns or None if it does not exist."""
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
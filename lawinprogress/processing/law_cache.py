@@ -0,0 +1,163 @@
+"""Size-aware, time-bounded cache for source laws retrieved from the API."""
+import functools
+import json
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from types import MappingProxyType
+from typing import Any, Callable, Hashable, Optional, Tuple
+
+from lawinprogress.metrics import count_cache
+
+CacheInfo = namedtuple(
+    "CacheInfo",
+    ["hits", "misses", "evictions", "expirations", "entries", "currsize", "maxsize"],
+)
+
+
+def freeze(obj: Any) -> Any:
+    """Return a read-only copy of a json-like object.
+
+    Dicts become MappingProxyTypes and lists become tuples, recursively.
+    """
+    if isinstance(obj, dict):
+        return MappingProxyType({key: freeze(value) for key, value in obj.items()})
+    if isinstance(obj, (list, tuple)):
+        return tuple(freeze(value) for value in obj)
+    return obj
+
+
+def json_size(obj: Any) -> int:
+    """Estimate the memory footprint of a json-like object by its utf8 encoded size."""
+    return len(json.dumps(obj, ensure_ascii=False).encode("utf8"))
+
+
+class SizedTTLCache:
+    """LRU cache bounded by the total size of its entries, with entry expiry.
+
+    Args:
+        max_bytes: Upper bound of the summed size of all entries.
+        ttl: Seconds after which an entry is considered stale and dropped.
+        sizeof: Function to compute the size of a value in bytes.
+        name: Name of the cache in the metrics; lookups are not counted if None.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int,
+        ttl: float,
+        sizeof: Callable[[Any], int] = json_size,
+        name: Optional[str] = None,
+    ):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.sizeof = sizeof
+        self.name = name
+        self._entries = OrderedDict()  # key -> (value, size, expires_at)
+        self._currsize = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        """Look up a key.
+
+        Returns:
+            Tuple of a flag if the key was found and the cached value (or None).
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] <= time.monotonic():
+                # stale entry; drop it and treat it as a miss
+                self._remove(key)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+        if self.name is not None:
+            count_cache(self.name, hit=entry is not None)
+        if entry is None:
+            return False, None
+        return True, entry[0]
+
+    def put(self, key: Hashable, value: Any, size: int = None) -> bool:
+        """Store a value, evicting least recently used entries if needed.
+
+        Returns:
+            False if the value alone exceeds the size bound and was not stored.
+        """
+        size = self.sizeof(value) if size is None else size
+        if size > self.max_bytes:
+            return False
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            while self._entries and self._currsize + size > self.max_bytes:
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+                self.evictions += 1
+            self._entries[key] = (value, size, time.monotonic() + self.ttl)
+            self._currsize += size
+        return True
+
+    def clear(self):
+        """Remove all entries and reset the statistics."""
+        with self._lock:
+            self._entries.clear()
+            self._currsize = 0
+            self.hits = self.misses = self.evictions = self.expirations = 0
+
+    def info(self) -> CacheInfo:
+        """Return the current cache statistics."""
+        with self._lock:
+            return CacheInfo(
+                hits=self.hits,
+                misses=self.misses,
+                evictions=self.evictions,
+                expirations=self.expirations,
+                entries=len(self._entries),
+                currsize=self._currsize,
+                maxsize=self.max_bytes,
+            )
+
+    def _remove(self, key: Hashable):
+        """Remove an entry; the lock must be held by the caller."""
+        _, size, _ = self._entries.pop(key)
+        self._currsize -= size
+
+
+def sized_ttl_cache(max_bytes: int, ttl: float, name: Optional[str] = None) -> Callable:
+    """Decorator to cache the json-like results of a function in a SizedTTLCache.
+
+    Results are stored frozen (see `freeze`), so callers can not mutate cached entries.
+    Empty results are not cached, to not remember temporary failures.
+    Like functools.lru_cache, the wrapper exposes cache_info() and cache_clear().
+    """
+
+    def decorator(func: Callable) -> Callable:
+        cache = SizedTTLCache(max_bytes=max_bytes, ttl=ttl, name=name)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = (args, tuple(sorted(kwargs.items())))
+            found, value = cache.get(key)
+            if found:
+                return value
+            result = func(*args, **kwargs)
+            if not result:
+                return result
+            frozen = freeze(result)
+            cache.put(key, frozen, size=json_size(result))
+            return frozen
+
+        wrapper.cache = cache
+        wrapper.cache_info = cache.info
+        wrapper.cache_clear = cache.clear
+        return wrapper
+
+    return decorator
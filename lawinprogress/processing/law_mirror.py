@@ -0,0 +1,149 @@
+"""Functions to mirror the contents of all laws into the local source law store."""
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from itertools import chain
+from typing import Callable, Iterable, List
+
+import requests
+
+from lawinprogress.processing.lookup_update import get_with_retries
+from lawinprogress.storage import atomic_write
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """Limit the rate of calls across threads (token bucket).
+
+    Args:
+        rate: Maximum sustained number of calls per second; 0 disables the limit.
+        burst: Number of calls that may happen at once after being idle.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        """Block until the next call is allowed."""
+        if self.rate <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._last) * self.rate
+            )
+            self._last = now
+            self._tokens -= 1
+            delay = -self._tokens / self.rate if self._tokens < 0 else 0
+        if delay:
+            time.sleep(delay)
+
+
+class MirrorReport:
+    """Counters and throughput of a mirror run."""
+
+    def __init__(self):
+        self.fetched = 0
+        self.skipped = 0
+        self.failed = []
+        self.bytes = 0
+        self.started = time.monotonic()
+        self.finished = None
+
+    @property
+    def seconds(self) -> float:
+        """Runtime of the mirror run."""
+        return (self.finished or time.monotonic()) - self.started
+
+    def __repr__(self) -> str:
+        seconds = max(self.seconds, 1e-9)
+        return (
+            f"fetched={self.fetched} skipped={self.skipped} failed={len(self.failed)} "
+            f"size={self.bytes / 1024 ** 2:.1f}MB time={self.seconds:.1f}s "
+            f"throughput={self.fetched / seconds:.2f}laws/s "
+            f"{self.bytes / 1024 ** 2 / seconds:.2f}MB/s"
+        )
+
+
+def lookup_slugs(lookup_path: str) -> List[str]:
+    """Read all slugs from the source law lookup json."""
+    with open(lookup_path, "r", encoding="utf8") as lookup_json:
+        return [law["slug"] for law in chain(*json.load(lookup_json))]
+
+
+def mirror_laws(
+    slugs: Iterable[str],
+    store_dir: str,
+    api_url: str,
+    max_workers: int = 4,
+    rate: float = 5,
+    retries: int = 3,
+    refresh: Iterable[str] = (),
+    get: Callable[[str], requests.Response] = get_with_retries,
+) -> MirrorReport:
+    """Download the contents of laws into the local store.
+
+    Laws already in the store are skipped, so an interrupted run resumes where it stopped.
+    Every law is written atomically, a store file is always complete.
+
+    Args:
+        slugs: Slugs of the laws to mirror.
+        store_dir: Folder of the local source law store.
+        api_url: Base url of the rechtsinformationsportal API.
+        max_workers: Maximum number of concurrent requests.
+        rate: Maximum number of requests per second.
+        retries: How often to retry a failed request.
+        refresh: Slugs to download again even if they are already in the store.
+        get: Function to request an url with retries and return the response.
+
+    Returns:
+        A MirrorReport with counters and throughput.
+    """
+    report = MirrorReport()
+    limiter = RateLimiter(rate=rate, burst=max_workers)
+    refresh = set(refresh)
+
+    todo = []
+    for slug in dict.fromkeys(slugs):
+        if slug not in refresh and os.path.isfile(
+            os.path.join(store_dir, f"{slug}.json")
+        ):
+            report.skipped += 1
+        else:
+            todo.append(slug)
+    logger.info(f"Mirroring {len(todo)} laws, {report.skipped} already in the store.")
+
+    def mirror(slug: str) -> int:
+        limiter.wait()
+        response = get(f"{api_url}/laws/{slug}?include=contents", retries=retries)
+        content = response.content
+        # don't store anything that is not a complete law
+        if "contents" not in json.loads(content)["data"]:
+            raise KeyError(f"No contents in response for {slug}")
+        atomic_write(os.path.join(store_dir, f"{slug}.json"), content)
+        return len(content)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(mirror, slug): slug for slug in todo}
+        for future in as_completed(futures):
+            slug = futures[future]
+            try:
+                n_bytes = future.result()
+            except (requests.exceptions.RequestException, ValueError, KeyError) as err:
+                logger.warning(f"Failed to mirror {slug}: {err}")
+                report.failed.append(slug)
+                continue
+            report.fetched += 1
+            report.bytes += n_bytes
+            if report.fetched % 100 == 0:
+                logger.info(report)
+    report.finished = time.monotonic()
+    return report
@@ -0,0 +1,214 @@
+"""Functions to rebuild the source law lookup from the rechtsinformationsportal API."""
+import glob
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlencode, urlparse, urlunparse
+
+import requests
+
+from lawinprogress.storage import atomic_write_json
+
+logger = logging.getLogger(__name__)
+
+
+def get_with_retries(
+    url: str, retries: int = 3, backoff: float = 1.0, timeout: float = 30
+) -> requests.Response:
+    """Get an url, retrying failed requests with exponential backoff.
+
+    Args:
+        url: Url to request.
+        retries: How often to retry after the first attempt failed.
+        backoff: Seconds to wait before the first retry, doubled for every further retry.
+        timeout: Timeout of a single request in seconds.
+
+    Returns:
+        The successful response.
+
+    Raises:
+        requests.exceptions.RequestException if the last attempt fails.
+    """
+    for attempt in range(retries + 1):
+        try:
+            response = requests.get(url, timeout=timeout)
+            response.raise_for_status()
+            return response
+        except requests.exceptions.RequestException as err:
+            if attempt == retries:
+                raise
+            logger.warning(f"Request to {url} failed ({err}), retrying...")
+            time.sleep(backoff * 2**attempt)
+    return None
+
+
+def get_json_with_retries(url: str, **kwargs) -> dict:
+    """Get a json document, retrying failed requests (see get_with_retries)."""
+    return get_with_retries(url, **kwargs).json()
+
+
+def _page_number(url: Optional[str]) -> Optional[int]:
+    """Get the page query parameter of a pagination link."""
+    if not url:
+        return None
+    page = parse_qs(urlparse(url).query).get("page")
+    return int(page[0]) if page else None
+
+
+def _page_url(url: str, page: int) -> str:
+    """Set the page query parameter of an url."""
+    parsed = urlparse(url)
+    query = parse_qs(parsed.query)
+    query["page"] = [str(page)]
+    return urlunparse(parsed._replace(query=urlencode(query, doseq=True)))
+
+
+class PageCheckpoint:
+    """Store already fetched pages on disk, so an interrupted run can be resumed.
+
+    Args:
+        directory: Folder to keep the fetched pages in.
+        source_url: Url of the first page; a checkpoint of another url is discarded.
+        resume: If False, discard pages fetched by an earlier run.
+    """
+
+    def __init__(self, directory: str, source_url: str, resume: bool = True):
+        self.directory = directory
+        meta_path = os.path.join(directory, "checkpoint.json")
+        if not resume:
+            self.clear()
+        elif os.path.isfile(meta_path):
+            with open(meta_path, "r", encoding="utf8") as meta_file:
+                if json.load(meta_file).get("source_url") != source_url:
+                    self.clear()
+        atomic_write_json(meta_path, {"source_url": source_url})
+
+    def _path(self, page: int) -> str:
+        return os.path.join(self.directory, f"page-{page:05d}.json")
+
+    def load(self, page: int) -> Optional[dict]:
+        """Return a fetched page or None if it was not fetched yet."""
+        if not os.path.isfile(self._path(page)):
+            return None
+        with open(self._path(page), "r", encoding="utf8") as page_file:
+            return json.load(page_file)
+
+    def save(self, page: int, response: dict):
+        """Store a fetched page."""
+        atomic_write_json(self._path(page), response)
+
+    def pages(self) -> List[int]:
+        """Return the numbers of all fetched pages."""
+        return sorted(
+            int(os.path.basename(path)[5:10])
+            for path in glob.glob(os.path.join(self.directory, "page-*.json"))
+        )
+
+    def clear(self):
+        """Remove the checkpoint."""
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def fetch_lookup_pages(
+    source_url: str,
+    checkpoint: PageCheckpoint,
+    max_workers: int = 8,
+    get_json: Callable[[str], dict] = get_json_with_retries,
+) -> List[List[dict]]:
+    """Fetch all pages of the law listing.
+
+    The first page is used to find the number of pages (links.last); the remaining pages
+    are fetched concurrently with at most max_workers requests in flight. If the API does
+    not report the last page, the links.next chain is followed page by page.
+    Every fetched page is stored in the checkpoint and not fetched again on resume.
+
+    Args:
+        source_url: Url of the first page of the listing.
+        checkpoint: Checkpoint to store and resume fetched pages.
+        max_workers: Maximum number of concurrent requests.
+        get_json: Function to request an url and return the parsed json.
+
+    Returns:
+        List of pages, each a list of law metadata dicts.
+    """
+
+    def fetch(page: int, url: str) -> dict:
+        response = checkpoint.load(page)
+        if response is None:
+            response = get_json(url)
+            checkpoint.save(page, response)
+        return response
+
+    first_page = fetch(1, source_url)
+    last_page = _page_number(first_page.get("links", {}).get("last"))
+
+    if last_page is None:
+        # no random access to pages possible, follow the chain
+        responses = [first_page]
+        next_url = first_page.get("links", {}).get("next")
+        while next_url:
+            responses.append(fetch(len(responses) + 1, next_url))
+            next_url = responses[-1].get("links", {}).get("next")
+        return [response["data"] for response in responses]
+
+    fetched_pages = set(checkpoint.pages())
+    missing_pages = [
+        page for page in range(2, last_page + 1) if page not in fetched_pages
+    ]
+    logger.info(
+        f"Fetching {len(missing_pages)} of {last_page} pages with {max_workers} workers."
+    )
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # consume the iterator to raise errors of failed pages
+        list(
+            executor.map(
+                lambda page: fetch(page, _page_url(source_url, page)), missing_pages
+            )
+        )
+    return [checkpoint.load(page)["data"] for page in range(1, last_page + 1)]
+
+
+def law_fingerprint(law: dict) -> str:
+    """Hash the metadata of a law to detect changes."""
+    return hashlib.sha1(
+        json.dumps(law, sort_keys=True, ensure_ascii=False).encode("utf8")
+    ).hexdigest()
+
+
+def merge_lookup(
+    old_pages: List[List[dict]], new_pages: List[List[dict]]
+) -> Tuple[List[List[dict]], Dict[str, List[str]]]:
+    """Update an existing lookup only for the slugs whose metadata changed.
+
+    Args:
+        old_pages: The current lookup, a list of pages of law metadata dicts.
+        new_pages: The freshly fetched listing in the same format.
+
+    Returns:
+        The merged lookup and a dict with the "added", "changed" and "removed" slugs.
+    """
+    old_laws = {law["slug"]: law for page in old_pages for law in page}
+    new_slugs = {law["slug"] for page in new_pages for law in page}
+    delta = {"added": [], "changed": [], "removed": []}
+
+    merged_pages = []
+    for page in new_pages:
+        merged_page = []
+        for law in page:
+            old_law = old_laws.get(law["slug"])
+            if old_law is None:
+                delta["added"].append(law["slug"])
+            elif law_fingerprint(old_law) != law_fingerprint(law):
+                delta["changed"].append(law["slug"])
+            else:
+                # keep the existing entry for unchanged slugs
+                law = old_law
+            merged_page.append(law)
+        merged_pages.append(merged_page)
+    delta["removed"] = sorted(set(old_laws) - new_slugs)
+    return merged_pages, delta
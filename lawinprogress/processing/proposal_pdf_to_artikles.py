@@ -1,43 +1,57 @@
 """Functions to process a raw pdf and extract clean titles and proposals."""
 import logging
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 
-import pdfplumber
 import regex as re
 
+from lawinprogress.deadline import Deadline, check_deadline
+from lawinprogress.metrics import PDF_PAGES, STAGE_SECONDS
 
-def process_pdf(change_law_path: str) -> Tuple[List[str], List[str]]:
+
+def process_pdf(
+    change_law_path: str, deadline: Optional[Deadline] = None
+) -> Tuple[List[str], List[str]]:
     """Wrapper function to process pdf of change law.
 
     Args:
       change_law_path: Path to the pdf in question.
+      deadline: Time budget of reading the pdf, checked page by page.
 
     Returns:
       List of law titles affected by the change law.
       List of texts of the change requests.
     """
     # read the change law
-    change_law_raw = read_pdf_law(change_law_path)
+    with STAGE_SECONDS.time(stage="pdf_read"):
+        change_law_raw = read_pdf_law(change_law_path, deadline=deadline)
 
     # idenfify the different laws affected
-    change_law_extract, full_law_title = extract_raw_proposal(change_law_raw)
-    proposals_list = extract_separate_change_proposals(change_law_extract)
-    law_titles = extract_law_titles(proposals_list)
-    law_titles, proposals_list = remove_inkrafttreten(law_titles, proposals_list)
+    with STAGE_SECONDS.time(stage="article_split"):
+        change_law_extract, full_law_title = extract_raw_proposal(change_law_raw)
+        proposals_list = extract_separate_change_proposals(change_law_extract)
+        law_titles = extract_law_titles(proposals_list)
+        law_titles, proposals_list = remove_inkrafttreten(law_titles, proposals_list)
     logging.info(law_titles)
     logging.info([proposal[:20] for proposal in proposals_list])
     return law_titles, proposals_list, full_law_title
 
 
-def read_pdf_law(filename: str) -> str:
+def read_pdf_law(filename: str, deadline: Optional[Deadline] = None) -> str:
     """Get the raw text from the pdfs."""
+    # pdfplumber is slow to import, only load it when needed
+    import pdfplumber  # pylint: disable=import-outside-toplevel
+
     # read all pages from provided pdf
     pdf_file_obj = pdfplumber.open(filename)
 
+    page_texts = []
+    for page in pdf_file_obj.pages:
+        check_deadline(deadline, "reading the pdf")
+        page_texts.append(page.extract_text())
+        PDF_PAGES.inc()
+
     # join the pages
-    return "\n".join(
-        [page for page in [page.extract_text() for page in pdf_file_obj.pages] if page]
-    )
+    return "\n".join([page for page in page_texts if page])
 
 
 def extract_raw_proposal(text: str) -> str:
@@ -2,27 +2,64 @@
 import json
 import logging
 import os
+import threading
 from functools import lru_cache
 from itertools import chain
 from typing import List
 
 import requests
-from rapidfuzz import fuzz, process
 
-SOURCE_LAW_LOOKUP_PATH = "./data/source_laws/rechtsinformationsportalAPI.json"
+from lawinprogress.metrics import STAGE_SECONDS
+from lawinprogress.processing.http_cache import HttpJsonCache
+from lawinprogress.processing.law_cache import sized_ttl_cache
+from lawinprogress.singleflight import single_flight
 
+RECHTSINFORMATIONSPORTAL_API_URL = os.environ.get(
+    "LIP_RECHTSINFORMATIONSPORTAL_API_URL", "https://api.rechtsinformationsportal.de/v1"
+)
+SOURCE_LAW_LOOKUP_PATH = "./data/source_laws/rechtsinformationsportalAPI.json"
+# local store of laws, filled by scripts/mirror_source_laws.py
+SOURCE_LAW_STORE_DIR = os.environ.get(
+    "LIP_SOURCE_LAW_STORE_DIR", "./data/source_laws/laws/"
+)
+# laws downloaded with their http validators, to revalidate them with conditional requests
+SOURCE_LAW_HTTP_CACHE = HttpJsonCache(
+    directory=os.environ.get(
+        "LIP_SOURCE_LAW_HTTP_CACHE_DIR", "./data/source_laws/http_cache/"
+    )
+)
+# bound the cache of retrieved source laws by their size, not by their number
+SOURCE_LAW_CACHE_MAX_BYTES = int(
+    os.environ.get("LIP_SOURCE_LAW_CACHE_MAX_BYTES", 256 * 1024 * 1024)
+)
+# drop cached source laws after some time to pick up changes upstream
+SOURCE_LAW_CACHE_TTL = float(os.environ.get("LIP_SOURCE_LAW_CACHE_TTL", 24 * 60 * 60))
+
+
+def retrieve_source_law(
+    search_title: str, index: "LawLookupIndex" = None
+) -> List[dict]:
+    """Retrieve the soruce law from the API.
 
-def retrieve_source_law(search_title: str) -> List[dict]:
-    """Retrieve the soruce law from the API."""
-    slug = FuzzyLawSlugRetriever.fuzzyfind(search_title)
+    Args:
+        search_title: Title of the law to look up.
+        index: Snapshot of the lookup index to use; defaults to the current one.
+    """
+    with STAGE_SECONDS.time(stage="slug_match"):
+        index = index if index is not None else FuzzyLawSlugRetriever.get_index()
+        slug = index.fuzzyfind(search_title)
     logging.info(f"Identified slug: {slug}")
 
     if slug:
-        return get_source_law_rechtsinformationsportal(slug)
+        with STAGE_SECONDS.time(stage="source_fetch"):
+            return get_source_law_rechtsinformationsportal(slug)
     return None
 
 
-@lru_cache(maxsize=16)
+@sized_ttl_cache(
+    max_bytes=SOURCE_LAW_CACHE_MAX_BYTES, ttl=SOURCE_LAW_CACHE_TTL, name="source_law"
+)
+@single_flight
 def get_source_law_rechtsinformationsportal(slug: str) -> List[dict]:
     """Call the rechtsinformationsportal API.
 
@@ -30,6 +67,10 @@ def get_source_law_rechtsinformationsportal(slug: str) -> List[dict]:
     return a list of dictionaries each with the type, date, name, title, parent, body, and footnotes
     this can correspond to our tree structure later on.
 
+    Results are cached and returned read-only (tuple of mappings). Use
+    get_source_law_rechtsinformationsportal.cache_info() to get the cache statistics.
+    Concurrent calls for the same slug share one retrieval.
+
     Args:
         slug: String of the reqested law's shortcode.
 
@@ -37,20 +78,32 @@ def get_source_law_rechtsinformationsportal(slug: str) -> List[dict]:
         List of dicts containing different parts of the requested law.
     """
     try:
-        local_path = f"./data/source_laws/laws/{slug}.json"
+        local_path = os.path.join(SOURCE_LAW_STORE_DIR, f"{slug}.json")
         if os.path.isfile(local_path):
             with open(local_path, "r", encoding="utf8") as local_law:
                 law_json = json.load(local_law)
         else:
-            api_response = requests.get(
-                f"https://api.rechtsinformationsportal.de/v1/laws/{slug}?include=contents"
+            law_json = SOURCE_LAW_HTTP_CACHE.fetch(
+                f"{RECHTSINFORMATIONSPORTAL_API_URL}/laws/{slug}?include=contents",
+                key=slug,
             )
-            if api_response.status_code != 200:
+            if law_json is None:
                 return []
-            law_json = api_response.json()
     except requests.exceptions.RequestException as ex:
         raise SystemExit(ex)
 
+    return source_law_from_json(law_json)
+
+
+def source_law_from_json(law_json: dict) -> List[dict]:
+    """Extract the parts of a law from an API response with ?include=contents.
+
+    Args:
+        law_json: Parsed API response (or a file of the local store).
+
+    Returns:
+        List of dicts containing different parts of the law.
+    """
     contents = law_json["data"]["contents"]
 
     return_keys = {
@@ -65,35 +118,126 @@ def get_source_law_rechtsinformationsportal(slug: str) -> List[dict]:
     return [{key: item[key] for key in return_keys if key in item} for item in contents]
 
 
+class LawLookupIndex:
+    """Immutable snapshot of the lookup from law titles to slugs.
+
+    Fuzzy matching results are memoized per snapshot, so a new snapshot starts
+    with an empty memo.
+
+    Args:
+        lookup: Dict mapping short and long law titles to slugs.
+        version: Identifier of the lookup artifact the index was built from.
+    """
+
+    def __init__(self, lookup: dict, version: tuple = None):
+        self.lookup = lookup
+        self.titles = list(lookup.keys())
+        self.version = version
+        self.fuzzyfind = lru_cache(maxsize=128)(self._fuzzyfind)
+
+    @classmethod
+    def from_file(cls, path: str):
+        """Build the index from the lookup json of the rechtsinformationsportal API."""
+        version = _artifact_version(path)
+        with open(path, "r", encoding="utf8") as lookup_json:
+            source_laws = list(chain(*json.load(lookup_json)))
+        lookup = {
+            law["titleShort"]: law["slug"] for law in source_laws if law["titleShort"]
+        } | {law["titleLong"]: law["slug"] for law in source_laws if law["titleLong"]}
+        return cls(lookup, version=version)
+
+    def _fuzzyfind(self, search_title: str) -> str:
+        """Run fuzzy matching on the title string and return the top result."""
+        # rapidfuzz is slow to import, only load it when needed
+        from rapidfuzz import fuzz, process  # pylint: disable=import-outside-toplevel
+
+        result = process.extractOne(search_title, self.titles, scorer=fuzz.QRatio)
+        return self.lookup.get(result[0], None)
+
+
+def _artifact_version(path: str) -> tuple:
+    """Identify a version of a file; changes if the file is replaced or modified."""
+    stat = os.stat(path)
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
 class FuzzyLawSlugRetriever:
-    """Class to act as a singleton to fuzzy retrieve slugs by law titles."""
+    """Class to act as a singleton to fuzzy retrieve slugs by law titles.
+
+    The lookup index can be refreshed while the app is running: the reloader thread
+    (see start_reloader) watches the lookup file, builds a new index off the request
+    path and swaps it in. Code that needs several consistent lookups should get one
+    snapshot with get_index() and use it throughout.
+    """
 
-    lookup = None
+    index = None
+    _lock = threading.Lock()
+    _stop_reloader = None
+
+    @classmethod
+    def get_index(cls) -> LawLookupIndex:
+        """Get the current lookup index, loading it if it's not already loaded."""
+        index = cls.index
+        if index is None:
+            with cls._lock:
+                if cls.index is None:
+                    cls.index = LawLookupIndex.from_file(SOURCE_LAW_LOOKUP_PATH)
+                index = cls.index
+        return index
 
     @classmethod
     def get_lookup(cls) -> dict:
-        """Get the lookup dict for this instance, loading it if it's not already loaded."""
-        if cls.lookup is None:
-            with open(SOURCE_LAW_LOOKUP_PATH, "r", encoding="utf8") as lookup_json:
-                source_laws_raw = json.load(lookup_json)
-                source_laws = list(chain(*source_laws_raw))
-                cls.lookup = {
-                    law["titleShort"]: law["slug"]
-                    for law in source_laws
-                    if law["titleShort"]
-                } | {
-                    law["titleLong"]: law["slug"]
-                    for law in source_laws
-                    if law["titleLong"]
-                }
-        return cls.lookup
+        """Get the lookup dict of the current index."""
+        return cls.get_index().lookup
 
     @classmethod
-    @lru_cache(maxsize=128)
     def fuzzyfind(cls, search_title: str) -> str:
         """Run fuzzy matching on the title string and return the top result."""
-        lookup_dict = cls.get_lookup()
-        result = process.extractOne(
-            search_title, list(lookup_dict.keys()), scorer=fuzz.QRatio
+        return cls.get_index().fuzzyfind(search_title)
+
+    @classmethod
+    def reload_if_changed(cls) -> bool:
+        """Rebuild and swap the index if the lookup file changed.
+
+        Returns:
+            True if a new index was swapped in.
+        """
+        current = cls.index
+        if current is not None and current.version == _artifact_version(
+            SOURCE_LAW_LOOKUP_PATH
+        ):
+            return False
+        # build the new index before taking the lock, requests keep using the old one
+        new_index = LawLookupIndex.from_file(SOURCE_LAW_LOOKUP_PATH)
+        with cls._lock:
+            cls.index = new_index
+        logging.info(f"Loaded new law lookup version {new_index.version}.")
+        return True
+
+    @classmethod
+    def start_reloader(cls, interval: float = 60) -> threading.Thread:
+        """Start a daemon thread checking for a new lookup file every interval seconds."""
+        cls.stop_reloader()
+        stop = threading.Event()
+
+        def reload_loop():
+            while not stop.wait(interval):
+                try:
+                    cls.reload_if_changed()
+                except (OSError, ValueError, KeyError) as err:
+                    # keep serving the current index if the new file is broken
+                    logging.warning(f"Failed to reload law lookup: {err}")
+
+        thread = threading.Thread(
+            target=reload_loop, name="lookup-reloader", daemon=True
         )
-        return lookup_dict.get(result[0], None)
+        thread.start()
+        cls._stop_reloader = stop
+        return thread
+
+    @classmethod
+    def stop_reloader(cls):
+        """Stop the reloader thread if one is running."""
+        if cls._stop_reloader is not None:
+            cls._stop_reloader.set()
+            cls._stop_reloader = None
@@ -0,0 +1,106 @@
+"""Store of the results of uploaded change law pdfs, keyed by the content of the pdf.
+
+The same Drucksache is uploaded by many users, so the results are kept by the hash of
+the pdf and the version of the pipeline: the overview of the affected laws once all of
+them are processed and the rows of the diff of every law once it is rendered. Later
+uploads of the same pdf are served from the store and the results have a permalink.
+The pdf itself is kept as well, so the results can be processed again after the
+pipeline changed.
+"""
+import gzip
+import hashlib
+import json
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+from lawinprogress.pipeline import PIPELINE_VERSION
+from lawinprogress.storage import atomic_copy, atomic_write
+
+RESULT_STORE_DIR = os.environ.get("LIP_RESULT_STORE_DIR", "./data/results/")
+
+
+def pdf_hash(pdf: bytes) -> str:
+    """Hash of the content of a pdf, used as its key."""
+    return hashlib.sha256(pdf).hexdigest()
+
+
+class ResultStore:
+    """Results of change law pdfs on disk, by the hash of the pdf.
+
+    Args:
+        directory: Folder to store the results in.
+        version: Version of the pipeline; results of other versions are not used.
+    """
+
+    def __init__(self, directory: str, version: int = PIPELINE_VERSION):
+        self.directory = directory
+        self.version = version
+
+    def _path(self, key: str, name: str, versioned: bool = True) -> Optional[str]:
+        """Path of a file of the results of a pdf; None for malformed keys."""
+        if not key.isalnum():
+            return None
+        if versioned:
+            return os.path.join(self.directory, key, f"v{self.version}", name)
+        return os.path.join(self.directory, key, name)
+
+    def _read(self, path: Optional[str]) -> Optional[Any]:
+        if path is None:
+            return None
+        try:
+            with open(path, "rb") as result_file:
+                return json.loads(gzip.decompress(result_file.read()).decode("utf8"))
+        except (OSError, EOFError, ValueError):
+            return None
+
+    @staticmethod
+    def _write(path: str, obj: Any):
+        atomic_write(path, gzip.compress(json.dumps(obj, ensure_ascii=False).encode()))
+
+    def put_pdf(self, key: str, pdf: bytes):
+        """Keep the pdf to process it again later."""
+        path = self._path(key, "change_law.pdf", versioned=False)
+        if not os.path.exists(path):
+            atomic_write(path, pdf)
+
+    def put_pdf_file(self, key: str, pdf_path: str):
+        """Keep the pdf at pdf_path to process it again later."""
+        path = self._path(key, "change_law.pdf", versioned=False)
+        if not os.path.exists(path):
+            atomic_copy(pdf_path, path)
+
+    def pdf_path(self, key: str) -> Optional[str]:
+        """Path of the stored pdf or None."""
+        path = self._path(key, "change_law.pdf", versioned=False)
+        return path if path is not None and os.path.isfile(path) else None
+
+    def get_pdf(self, key: str) -> Optional[bytes]:
+        """The stored pdf or None."""
+        path = self._path(key, "change_law.pdf", versioned=False)
+        if path is None:
+            return None
+        try:
+            with open(path, "rb") as pdf_file:
+                return pdf_file.read()
+        except OSError:
+            return None
+
+    def put_overview(self, key: str, overview: Dict[str, Any]):
+        """Store the overview of all affected laws (see Job.todict)."""
+        self._write(self._path(key, "overview.json.gz"), overview)
+
+    def get_overview(self, key: str) -> Optional[Dict[str, Any]]:
+        """The stored overview of the results or None."""
+        return self._read(self._path(key, "overview.json.gz"))
+
+    def put_rows(self, key: str, law_idx: int, rows: List[Tuple[str, str, str]]):
+        """Store the rows of the diff of a law."""
+        self._write(self._path(key, f"law-{law_idx}.json.gz"), rows)
+
+    def get_rows(self, key: str, law_idx: int) -> Optional[List[Tuple[str, str, str]]]:
+        """The stored rows of the diff of a law or None."""
+        rows = self._read(self._path(key, f"law-{law_idx}.json.gz"))
+        return [tuple(row) for row in rows] if rows is not None else None
+
+
+result_store = ResultStore(RESULT_STORE_DIR)
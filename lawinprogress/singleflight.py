@@ -0,0 +1,189 @@
+"""Coalesce concurrent identical work: callers with the same key share one computation.
+
+When the same draft is uploaded many times at once, only the first upload processes
+it and the others wait for and share its results, instead of multiplying the work.
+"""
+import collections
+import functools
+import itertools
+import threading
+from typing import Any, Callable, Deque, Dict, Hashable, Iterator, Optional
+
+
+class _Call:
+    """A computation in flight and its outcome."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class _SharedIterator:
+    """Items of an iterator, produced once and passed on to every consumer.
+
+    An item is only kept until every consumer got it, so consumers can only join while
+    the first item is kept.
+    """
+
+    def __init__(self, iterator: Iterator):
+        self.iterator = iterator
+        self.items: Deque[Any] = collections.deque()
+        self.start = 0  # index of the first kept item
+        self.positions: Dict[int, int] = {}  # index of the next item, by consumer
+        self.error = None
+        self.finished = False
+        self._consumer_ids = itertools.count()
+        # held while the next item is produced, so the others wait for it
+        self.lock = threading.Lock()
+        # held while the kept items and the positions change; never while producing
+        self._items_lock = threading.Lock()
+
+    def join(self) -> Optional[int]:
+        """Add a consumer starting at the first item; None if it was dropped already."""
+        with self._items_lock:
+            if self.start > 0:
+                return None
+            consumer = next(self._consumer_ids)
+            self.positions[consumer] = 0
+            return consumer
+
+    def leave(self, consumer: int) -> bool:
+        """Remove a consumer; return whether it was the last one."""
+        with self._items_lock:
+            del self.positions[consumer]
+            self._drop()
+            return not self.positions
+
+    def item(self, consumer: int) -> Any:
+        """The next item of the consumer; produced now if no consumer did yet.
+
+        Raises:
+            StopIteration after the last item and the error of the iterator if it failed.
+        """
+        with self.lock:
+            with self._items_lock:
+                idx = self.positions[consumer]
+                produce = idx >= self.start + len(self.items)
+            if produce and not self.finished:
+                try:
+                    produced = next(self.iterator)
+                    with self._items_lock:
+                        self.items.append(produced)
+                except StopIteration:
+                    self.finished = True
+                except Exception as err:  # pylint: disable=broad-except
+                    self.error = err
+                    self.finished = True
+            with self._items_lock:
+                if idx < self.start + len(self.items):
+                    item = self.items[idx - self.start]
+                    self.positions[consumer] = idx + 1
+                    self._drop()
+                    return item
+        if self.error is not None:
+            raise self.error
+        raise StopIteration
+
+    def _drop(self):
+        """Drop the items every consumer got; call it with _items_lock held."""
+        first_needed = min(
+            self.positions.values(), default=self.start + len(self.items)
+        )
+        while self.start < first_needed:
+            self.items.popleft()
+            self.start += 1
+
+
+class SingleFlight:
+    """Run only one computation per key at a time and share it with concurrent callers.
+
+    The outcome is not kept after the computation finished; callers coming later start
+    a new one (use a cache for that).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._iterators: Dict[Hashable, _SharedIterator] = {}
+
+    def do(self, key: Hashable, func: Callable, *args, **kwargs) -> Any:
+        """Return func(*args, **kwargs), or the result of the call in flight for key.
+
+        Raises:
+            The error of the shared call, in every caller.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = func(*args, **kwargs)
+        except BaseException as err:
+            call.error = err
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def iterate(self, key: Hashable, func: Callable, *args, **kwargs) -> Iterator:
+        """Iterate over func(*args, **kwargs), sharing its items with concurrent callers.
+
+        Every caller gets all items from the first one on, while they are produced only
+        once. The items are only kept until every caller got them; a caller coming after
+        the first item was dropped starts a new iteration. If all callers stop early,
+        the iterator is closed.
+        """
+        with self._lock:
+            shared = self._iterators.get(key)
+            consumer = shared.join() if shared is not None else None
+            if consumer is None:
+                shared = self._iterators[key] = _SharedIterator(func(*args, **kwargs))
+                consumer = shared.join()
+        return self._consume(key, shared, consumer)
+
+    def _consume(
+        self, key: Hashable, shared: _SharedIterator, consumer: int
+    ) -> Iterator:
+        try:
+            while True:
+                try:
+                    item = shared.item(consumer)
+                except StopIteration:
+                    return
+                yield item
+        finally:
+            with self._lock:
+                abandoned = shared.leave(consumer) and not shared.finished
+                if (abandoned or shared.finished) and (
+                    self._iterators.get(key) is shared
+                ):
+                    # later callers start over
+                    del self._iterators[key]
+            if abandoned:
+                with shared.lock:
+                    # nobody waits for the remaining items anymore
+                    close = getattr(shared.iterator, "close", None)
+                    if close is not None:
+                        close()
+
+
+def single_flight(func: Callable) -> Callable:
+    """Decorator to coalesce concurrent calls of a function with the same arguments."""
+    flight = SingleFlight()
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        key = (args, tuple(sorted(kwargs.items())))
+        return flight.do(key, func, *args, **kwargs)
+
+    wrapper.flight = flight
+    return wrapper
@@ -0,0 +1,85 @@
+"""Helpers to persist files safely while other processes may read them."""
+import contextlib
+import json
+import os
+import shutil
+import tempfile
+from typing import Any, BinaryIO, Iterator
+
+try:
+    import fcntl
+except ImportError:  # not on posix
+    fcntl = None
+
+
+@contextlib.contextmanager
+def _atomic_file(path: str) -> Iterator[BinaryIO]:
+    """Temporary file in the directory of path which replaces path once it is written."""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    file_descriptor, tmp_path = tempfile.mkstemp(
+        dir=directory, prefix=".tmp-", suffix=os.path.basename(path)
+    )
+    try:
+        with os.fdopen(file_descriptor, "wb") as tmp_file:
+            yield tmp_file
+            tmp_file.flush()
+            os.fsync(tmp_file.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def atomic_write(path: str, data: bytes):
+    """Write bytes to a file atomically.
+
+    The data is written to a temporary file in the same directory which then replaces
+    the target, so readers see either the old or the new file, never a partial one.
+
+    Args:
+        path: Path of the file to write.
+        data: Content of the file.
+    """
+    with _atomic_file(path) as tmp_file:
+        tmp_file.write(data)
+
+
+def atomic_copy(source: str, path: str):
+    """Copy a file atomically (see atomic_write), without reading it into memory."""
+    with open(source, "rb") as source_file, _atomic_file(path) as tmp_file:
+        shutil.copyfileobj(source_file, tmp_file)
+
+
+def atomic_write_json(path: str, obj: Any):
+    """Serialize an object to json and write it atomically to path."""
+    atomic_write(path, json.dumps(obj, ensure_ascii=False).encode("utf8"))
+
+
+@contextlib.contextmanager
+def file_lock(path: str) -> Iterator[bool]:
+    """Hold an exclusive lock on a file, shared by all processes and threads.
+
+    Without fcntl (not on posix) nothing is locked.
+
+    Args:
+        path: Path of the lock file; created if missing.
+
+    Yields:
+        Whether the lock was held by someone else and had to be waited for.
+    """
+    if fcntl is None:
+        yield False
+        return
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "ab") as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            waited = False
+        except BlockingIOError:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            waited = True
+        try:
+            yield waited
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
@@ -0,0 +1,116 @@
+"""Benchmark the diff engines on the html diff of laws of increasing size.
+
+Every law text is changed at a few random lines (modified, removed and inserted lines)
+and diffed with html_diffs by every engine. The laws are read from the local store (see
+scripts/mirror_source_laws.py); without a store, synthetic laws with many repeated
+"(weggefallen)" lines are used.
+
+Example usage:
+    poetry run python ./scripts/benchmark_diff_engine.py -n 5 -c 20
+"""
+import glob
+import json
+import os
+import random
+import time
+from typing import List, Tuple
+
+import click
+
+from lawinprogress.libdiff.diff_engine import DIFF_ENGINES
+from lawinprogress.libdiff.html_diff import html_diffs
+from lawinprogress.parsing.parse_source_law import parse_source_law
+from lawinprogress.processing.source_law_retrieval import (
+    SOURCE_LAW_STORE_DIR,
+    source_law_from_json,
+)
+
+SYNTHETIC_SIZES = [100, 1000, 5000, 20000]
+
+
+def store_texts(store_dir: str) -> List[Tuple[str, str]]:
+    """Titles and texts of all laws in the local store."""
+    texts = []
+    for law_path in sorted(glob.glob(os.path.join(store_dir, "*.json"))):
+        with open(law_path, "r", encoding="utf8") as law_file:
+            source_law = source_law_from_json(json.load(law_file))
+        title = os.path.basename(law_path)
+        texts.append((title, parse_source_law(source_law, law_title=title).to_text()))
+    return texts
+
+
+def synthetic_text(n_lines: int, rng: random.Random) -> str:
+    """A law like text with many repeated lines."""
+    lines = []
+    for idx in range(n_lines):
+        if idx % 20 == 0:
+            lines.append(f"     § {idx // 20 + 1} Paragraph {idx // 20 + 1}")
+        elif rng.random() < 0.3:
+            lines.append("         (weggefallen)")
+        else:
+            words = " ".join(
+                rng.choice(["die", "der", "Behörde", "Absatz"]) for _ in range(8)
+            )
+            lines.append(f"         ({idx % 20}) Satz {idx} {words}.")
+    return "\n".join(lines) + "\n"
+
+
+def change_text(text: str, n_changes: int, rng: random.Random) -> str:
+    """Modify, remove or insert lines of the text at random positions."""
+    lines = text.split("\n")
+    for _ in range(n_changes):
+        idx = rng.randrange(len(lines))
+        kind = rng.choice(["modify", "remove", "insert"])
+        if kind == "modify":
+            lines[idx] = lines[idx] + " geändert"
+        elif kind == "remove":
+            del lines[idx]
+        else:
+            lines.insert(idx, "         (weggefallen)")
+    return "\n".join(lines)
+
+
+@click.command()
+@click.option(
+    "store_dir",
+    "-s",
+    help="Folder of the local source law store.",
+    default=SOURCE_LAW_STORE_DIR,
+)
+@click.option("limit", "-n", help="Number of laws per size.", default=3)
+@click.option("n_changes", "-c", help="Number of changed lines per law.", default=10)
+@click.option("seed", "--seed", help="Seed for the random changes.", default=0)
+def benchmark_diff_engine(store_dir: str, limit: int, n_changes: int, seed: int):
+    """Compare the time of the diff engines on laws of increasing size."""
+    rng = random.Random(seed)
+    texts = store_texts(store_dir)
+    if texts:
+        # pick laws spread over the range of sizes
+        texts.sort(key=lambda title_text: title_text[1].count("\n"))
+        step = max(len(texts) // (4 * limit), 1)
+        texts = texts[::step][-4 * limit :]
+    else:
+        click.echo("No laws in the store; using synthetic laws.")
+        texts = [
+            (f"synthetic {size}", synthetic_text(size, rng))
+            for size in SYNTHETIC_SIZES
+            for _ in range(limit)
+        ]
+
+    click.echo(f"{'lines':>8} " + " ".join(f"{name:>10}" for name in DIFF_ENGINES))
+    for title, text in texts:
+        changed_text = change_text(text, n_changes, rng)
+        seconds = []
+        for engine in DIFF_ENGINES:
+            start = time.perf_counter()
+            html_diffs(text, changed_text, [], title, engine=engine)
+            seconds.append(time.perf_counter() - start)
+        click.echo(
+            f"{text.count(chr(10)):>8} "
+            + " ".join(f"{second:>9.3f}s" for second in seconds)
+        )
+
+
+if __name__ == "__main__":
+    # pylint: disable=no-value-for-parameter
+    benchmark_diff_engine()
@@ -0,0 +1,93 @@
+"""Benchmark the rule-based sentence splitter against spacy on all source law node texts.
+
+Reports the throughput of both splitters and how well the rule-based splitter agrees
+with spacy (share of identically split texts and precision/recall of the boundaries).
+The source laws are read from the local store (see scripts/mirror_source_laws.py).
+
+Example usage:
+    poetry run python ./scripts/benchmark_sentence_splitter.py -n 200
+"""
+import glob
+import json
+import os
+import time
+
+import click
+from anytree import PreOrderIter
+
+from lawinprogress import get_nlp
+from lawinprogress.parsing.parse_source_law import parse_source_law
+from lawinprogress.parsing.sentence_rules import sentence_spans
+from lawinprogress.processing.source_law_retrieval import (
+    SOURCE_LAW_STORE_DIR,
+    source_law_from_json,
+)
+
+
+def spacy_boundaries(texts, batch_size):
+    """Sentence end offsets found by spacy, joined at BGBl. like the edit functions do."""
+    return [
+        {sent.end_char for sent in doc.sents if not sent.text.endswith("BGBl.")}
+        for doc in get_nlp().pipe(texts, batch_size=batch_size)
+    ]
+
+
+def rule_boundaries(texts):
+    """Sentence end offsets found by the rule-based splitter."""
+    return [{end for _, end in sentence_spans(text)} for text in texts]
+
+
+@click.command()
+@click.option(
+    "store_dir",
+    "-s",
+    help="Folder of the local source law store.",
+    default=SOURCE_LAW_STORE_DIR,
+)
+@click.option("limit", "-n", help="Maximum number of laws to use.", default=0)
+@click.option("batch_size", "-b", help="Batch size for spacy.", default=64)
+def benchmark_sentence_splitter(store_dir: str, limit: int, batch_size: int):
+    """Compare throughput and agreement of the sentence splitters."""
+    law_paths = sorted(glob.glob(os.path.join(store_dir, "*.json")))
+    if limit:
+        law_paths = law_paths[:limit]
+    click.echo(f"Collecting node texts of {len(law_paths)} laws...")
+    texts = []
+    for law_path in law_paths:
+        with open(law_path, "r", encoding="utf8") as law_file:
+            source_law = source_law_from_json(json.load(law_file))
+        tree = parse_source_law(source_law, law_title=os.path.basename(law_path))
+        texts.extend(node.text for node in PreOrderIter(tree) if node.text.strip())
+    n_chars = sum(len(text) for text in texts)
+    click.echo(f"{len(texts)} texts with {n_chars / 1e6:.1f}M characters.\n")
+
+    start = time.perf_counter()
+    spacy_result = spacy_boundaries(texts, batch_size)
+    spacy_time = time.perf_counter() - start
+    start = time.perf_counter()
+    rules_result = rule_boundaries(texts)
+    rules_time = time.perf_counter() - start
+
+    for name, seconds in [("spacy", spacy_time), ("rules", rules_time)]:
+        click.echo(
+            f"{name:>6}: {seconds:8.2f}s {len(texts) / seconds:10.0f} texts/s "
+            f"{n_chars / seconds / 1e6:8.2f}M chars/s"
+        )
+    click.echo(f"speedup: {spacy_time / rules_time:.1f}x\n")
+
+    n_identical = sum(
+        spacy == rules for spacy, rules in zip(spacy_result, rules_result)
+    )
+    true_positives = sum(
+        len(spacy & rules) for spacy, rules in zip(spacy_result, rules_result)
+    )
+    n_spacy = sum(len(spacy) for spacy in spacy_result)
+    n_rules = sum(len(rules) for rules in rules_result)
+    click.echo(f"identically split texts: {n_identical / len(texts):.2%}")
+    click.echo(f"boundary precision vs. spacy: {true_positives / n_rules:.2%}")
+    click.echo(f"boundary recall vs. spacy: {true_positives / n_spacy:.2%}")
+
+
+if __name__ == "__main__":
+    # pylint: disable=no-value-for-parameter
+    benchmark_sentence_splitter()
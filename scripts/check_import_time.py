@@ -0,0 +1,63 @@
+"""Script to report the import cost of the package modules and check it against a budget.
+
+Runs `python -X importtime` in a fresh interpreter for the given modules and prints the
+most expensive imports. Fails if the total exceeds the budget or if one of the heavy
+dependencies, which should only be loaded on first use, is imported.
+
+Example usage:
+    poetry run python ./scripts/check_import_time.py
+    poetry run python ./scripts/check_import_time.py -m lawinprogress.app.html -b 3000
+"""
+import sys
+from typing import Tuple
+
+import click
+
+from lawinprogress.import_time import LAZY_DEPENDENCIES, measure_imports
+
+DEFAULT_MODULES = [
+    "lawinprogress.apply_changes.apply_changes",
+    "lawinprogress.libdiff.html_diff",
+    "lawinprogress.parsing.parse_change_law",
+    "lawinprogress.parsing.parse_source_law",
+    "lawinprogress.processing.proposal_pdf_to_artikles",
+    "lawinprogress.processing.source_law_retrieval",
+]
+
+
+@click.command()
+@click.option(
+    "modules", "-m", "--module", multiple=True, help="Module to import (repeatable)."
+)
+@click.option(
+    "budget_ms", "-b", "--budget", help="Budget in milliseconds.", default=1500
+)
+@click.option("top", "-n", help="Number of most expensive imports to show.", default=15)
+def check_import_time(modules: Tuple[str], budget_ms: int, top: int):
+    """Report per module import cost and check the budget."""
+    modules = list(modules) or DEFAULT_MODULES
+    imports = measure_imports(modules)
+    total_ms = sum(self_us for _, self_us, _ in imports) / 1000
+
+    click.echo(f"{'cumulative':>12} {'self':>10}  module")
+    for name, self_us, cumulative_us in sorted(imports, key=lambda imp: -imp[2])[:top]:
+        click.echo(f"{cumulative_us / 1000:10.1f}ms {self_us / 1000:8.1f}ms  {name}")
+    click.echo(f"\ntotal import time: {total_ms:.1f}ms (budget {budget_ms}ms)")
+
+    eager = [
+        dependency
+        for dependency in LAZY_DEPENDENCIES
+        if any(name == dependency for name, _, _ in imports)
+    ]
+    if eager:
+        click.echo(f"FAILED: imported at import time: {', '.join(eager)}")
+        sys.exit(1)
+    if total_ms > budget_ms:
+        click.echo("FAILED: import time over budget")
+        sys.exit(1)
+    click.echo("OK")
+
+
+if __name__ == "__main__":
+    # pylint: disable=no-value-for-parameter
+    check_import_time()
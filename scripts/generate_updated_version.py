@@ -2,20 +2,53 @@
 
 Example usage:
     poetry run python ./scripts/generate_updated_version.py -c data/0483-21.pdf
+    poetry run python ./scripts/generate_updated_version.py -c data/0483-21.pdf --preflight
+    poetry run python ./scripts/generate_updated_version.py -c data/0483-21.pdf -e jsonl -e diff
 """
 import os
+from typing import List, Tuple
 
 import click
 import outputformat as ouf
-from anytree import PreOrderIter
 
-from lawinprogress.apply_changes.apply_changes import apply_changes
+from lawinprogress.apply_changes.apply_changes import (
+    preflight_changes,
+    summarize_preflight,
+)
+from lawinprogress.libdiff.export import EXPORT_FORMATS
 from lawinprogress.parsing.parse_change_law import parse_changes
 from lawinprogress.parsing.parse_source_law import parse_source_law
+from lawinprogress.pipeline import PIPELINE_WORKERS, process_laws, shutdown_executor
 from lawinprogress.processing.proposal_pdf_to_artikles import process_pdf
 from lawinprogress.processing.source_law_retrieval import retrieve_source_law
 
 
+def preflight_laws(law_titles: List[str], proposals_list: List[str]):
+    """Print how many changes would resolve per law, without applying them."""
+    for law_title, change_law_text in zip(law_titles, proposals_list):
+        # find and load the source law
+        source_law = retrieve_source_law(law_title)
+        if source_law:
+            click.echo(f"Check changes to {law_title}")
+        else:
+            click.echo(f"Cannot find source law {law_title}. SKIPPING")
+            continue
+
+        # parse the source and change law and check the requested changes
+        parsed_law_tree = parse_source_law(source_law, law_title=law_title)
+        change_requests = parse_changes(change_law_text, law_title)
+        preflight_results = preflight_changes(parsed_law_tree, change_requests)
+        counts = summarize_preflight(preflight_results)
+        click.echo(", ".join(f"{status}: {count}" for status, count in counts.items()))
+        for result in preflight_results:
+            if result.message:
+                click.echo(
+                    f"  {result.status:<12} {' '.join(result.change.location)}"
+                    f" ({result.change.change_type}): {result.message}"
+                )
+        click.echo("\n" + "#" * 150 + "\n")
+
+
 @click.command()
 @click.option(
     "change_law_path",
@@ -30,7 +63,34 @@ from lawinprogress.processing.source_law_retrieval import retrieve_source_law
     help="Where to write the output (modified laws).",
     default="./output/",
 )
-def generate_updated_version(change_law_path: str, output_path: str):
+@click.option(
+    "preflight",
+    "--preflight",
+    is_flag=True,
+    help="Only check how many changes resolve; don't apply or write anything.",
+)
+@click.option(
+    "workers",
+    "-w",
+    "--workers",
+    help="Number of worker processes to process the laws in parallel.",
+    default=PIPELINE_WORKERS,
+)
+@click.option(
+    "exports",
+    "-e",
+    "--export",
+    help="Also write the diff in this format (json lines or unified diff); repeatable.",
+    type=click.Choice(list(EXPORT_FORMATS)),
+    multiple=True,
+)
+def generate_updated_version(
+    change_law_path: str,
+    output_path: str,
+    preflight: bool,
+    workers: int,
+    exports: Tuple[str, ...],
+):
     """Generate the diff from the change law and the source law."""
     ouf.bigtitle("Welcome")
     ouf.bigtitle("to")
@@ -41,34 +101,31 @@ def generate_updated_version(change_law_path: str, output_path: str):
     # process the pdf
     law_titles, proposals_list, full_law_title = process_pdf(change_law_path)
 
-    # parse and apply changes for every law that should be changed
-    for law_title, change_law_text in zip(law_titles, proposals_list):
-        # find and load the source law
-        source_law = retrieve_source_law(law_title)
-        if source_law:
+    if preflight:
+        preflight_laws(law_titles, proposals_list)
+        click.echo("DONE.")
+        return
+
+    # parse and apply changes for every law that should be changed, in parallel
+    law_results = process_laws(
+        list(zip(law_titles, proposals_list)), workers=workers, exports=exports
+    )
+    for law_result in law_results:
+        law_title = law_result.law_title
+        if law_result.error:
+            click.echo(f"Failed to apply changes to {law_title}: {law_result.error}")
+            continue
+        if law_result.source_law_found:
             click.echo(f"Apply changes to {law_title}")
         else:
             click.echo(f"Cannot find source law {law_title}. SKIPPING")
             continue
         click.echo("\n" + "#" * 150 + "\n")
 
-        # Parse the source and change law and apply the requested changes.
-        # parse source law
-        parsed_law_tree = parse_source_law(source_law, law_title=law_title)
-
-        # parse changes
-        change_requests = parse_changes(change_law_text, law_title)
-
-        # apply changes to the source law
-        res_law_tree, change_results, n_succesfull_applied_changes = apply_changes(
-            parsed_law_tree,
-            change_requests,
-        )
-
         # print a status update
         result_status = ouf.bar(
-            n_succesfull_applied_changes,
-            len(change_requests),
+            law_result.n_success,
+            law_result.n_changes,
             style="block",
             length=15,
             title="Successfully applied changes",
@@ -89,11 +146,20 @@ def generate_updated_version(change_law_path: str, output_path: str):
             os.makedirs(output_path)
 
         with open(write_path, "w", encoding="utf8") as file:
-            file.write(res_law_tree.to_text())
+            file.write(law_result.modified_text)
         with open(source_write_path, "w", encoding="utf8") as file:
-            file.write(parsed_law_tree.to_text())
+            file.write(law_result.source_text)
+        for export_format, export in law_result.exports.items():
+            export_write_path = (
+                f"{output_path}{law_title}_diff_{change_law_path.split('/')[-1]}"
+                f".{export_format}"
+            )
+            click.echo(f">> Write {export_format} diff to {export_write_path}")
+            with open(export_write_path, "w", encoding="utf8") as file:
+                file.write(export)
 
         click.echo("\n" + "#" * 150 + "\n")
+    shutdown_executor()
     click.echo("DONE.")
 
 
@@ -0,0 +1,85 @@
+"""Script to mirror the contents of all laws in the lookup into the local source law store.
+
+With a complete local store the app never has to call the API while handling a request.
+Laws already in the store are skipped, so an interrupted run can simply be restarted.
+
+Example usage:
+    poetry run python ./scripts/mirror_source_laws.py -w 8 -r 10
+    poetry run python ./scripts/mirror_source_laws.py --changes data/source_laws/rechtsinformationsportalAPI.changes.json
+"""
+import json
+import logging
+
+import click
+
+from lawinprogress.processing.law_mirror import lookup_slugs, mirror_laws
+from lawinprogress.processing.source_law_retrieval import (
+    RECHTSINFORMATIONSPORTAL_API_URL,
+    SOURCE_LAW_LOOKUP_PATH,
+    SOURCE_LAW_STORE_DIR,
+)
+
+
+@click.command()
+@click.option(
+    "lookup_path",
+    "-l",
+    help="Path to the source law lookup json.",
+    type=click.Path(exists=True),
+    default=SOURCE_LAW_LOOKUP_PATH,
+)
+@click.option(
+    "store_dir",
+    "-o",
+    help="Folder of the local source law store.",
+    default=SOURCE_LAW_STORE_DIR,
+)
+@click.option(
+    "max_workers", "-w", "--workers", help="Maximum concurrent requests.", default=4
+)
+@click.option("rate", "-r", "--rate", help="Maximum requests per second.", default=5.0)
+@click.option("--retries", help="Retries per law before giving up.", default=3)
+@click.option(
+    "changes_path",
+    "--changes",
+    help="Changes json written by update_source_law_lookup.py --delta; "
+    "added and changed laws are downloaded again.",
+    type=click.Path(exists=True),
+)
+def mirror_source_laws(
+    lookup_path: str,
+    store_dir: str,
+    max_workers: int,
+    rate: float,
+    retries: int,
+    changes_path: str,
+):
+    """Mirror all laws of the lookup into the local store."""
+    logging.basicConfig(level=logging.INFO)
+    slugs = lookup_slugs(lookup_path)
+    refresh = []
+    if changes_path:
+        with open(changes_path, "r", encoding="utf8") as changes_file:
+            changes = json.load(changes_file)
+        refresh = changes.get("added", []) + changes.get("changed", [])
+    click.echo(f"Mirroring {len(slugs)} laws into {store_dir}.")
+
+    report = mirror_laws(
+        slugs,
+        store_dir=store_dir,
+        api_url=RECHTSINFORMATIONSPORTAL_API_URL,
+        max_workers=max_workers,
+        rate=rate,
+        retries=retries,
+        refresh=refresh,
+    )
+
+    click.echo(f"DONE. {report}")
+    if report.failed:
+        click.echo(f"Failed to mirror: {', '.join(sorted(report.failed))}")
+        click.echo("Run the script again to retry the failed laws.")
+
+
+if __name__ == "__main__":
+    # pylint: disable=no-value-for-parameter
+    mirror_source_laws()
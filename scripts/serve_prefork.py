@@ -0,0 +1,55 @@
+"""Script to serve the web app from workers forked from a warm master process.
+
+The spacy model, the law lookup and the app are loaded once in the master; the workers
+share their memory. The memory of every worker is logged, the unique set size (uss) is
+the memory a worker uses on its own.
+
+Example usage:
+    poetry run python ./scripts/serve_prefork.py --workers 4
+    poetry run python ./scripts/serve_prefork.py --port 5000 --report-interval 60
+"""
+import os
+
+import click
+
+from lawinprogress import pipeline
+from lawinprogress.app.prefork import (
+    PreforkServer,
+    load_app,
+    pipeline_workers_per_worker,
+)
+
+
+@click.command()
+@click.option("host", "--host", help="Address to listen on.", default="127.0.0.1")
+@click.option("port", "--port", help="Port to listen on.", default=8000)
+@click.option(
+    "workers",
+    "-w",
+    "--workers",
+    help="Number of worker processes.",
+    default=int(os.environ.get("WEB_CONCURRENCY", 2)),
+)
+@click.option(
+    "report_interval",
+    "--report-interval",
+    help="Seconds between reports of the memory of the workers; 0 reports once.",
+    default=600.0,
+)
+def serve_prefork(host: str, port: int, workers: int, report_interval: float):
+    """Main function."""
+    click.echo(f"Loading the app before starting {workers} workers.")
+    if "LIP_PIPELINE_WORKERS" not in os.environ:
+        # every worker starts its own pool of pipeline workers; share the cpus
+        pipeline.PIPELINE_WORKERS = pipeline_workers_per_worker(workers)
+    app = load_app()
+    server = PreforkServer(
+        app, host=host, port=port, workers=workers, report_interval=report_interval
+    )
+    click.echo(f"Serving on http://{host}:{port}")
+    server.run()
+
+
+if __name__ == "__main__":
+    # pylint: disable=no-value-for-parameter
+    serve_prefork()
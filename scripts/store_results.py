@@ -0,0 +1,111 @@
+"""Script to process change law pdfs ahead of demand and keep their results.
+
+The results are stored in the result store of the web app, so uploads of these pdfs
+and their permalinks are served right away.
+
+Example usage:
+    poetry run python ./scripts/store_results.py -c data/0483-21.pdf
+    poetry run python ./scripts/store_results.py -c data/ --force
+"""
+import glob
+import os
+from typing import List, Tuple
+
+import click
+
+from lawinprogress.app.jobs import Job
+from lawinprogress.pipeline import (
+    PIPELINE_WORKERS,
+    iter_process_laws,
+    shutdown_executor,
+)
+from lawinprogress.processing.proposal_pdf_to_artikles import process_pdf
+from lawinprogress.result_store import pdf_hash, result_store
+
+
+def store_pdf_results(pdf_path: str, workers: int, force: bool) -> str:
+    """Process a pdf and store its results, unless they are stored already."""
+    with open(pdf_path, "rb") as pdf_file:
+        pdf = pdf_file.read()
+    key = pdf_hash(pdf)
+    if not force and result_store.get_overview(key) is not None:
+        click.echo(f"{pdf_path} is stored already as /results/{key}. SKIPPING")
+        return key
+
+    click.echo(f"Processing {pdf_path}")
+    law_titles, proposals_list, full_law_title = process_pdf(pdf_path)
+    job = Job(
+        job_id=key,
+        name=os.path.basename(pdf_path),
+        full_title=full_law_title,
+        laws=list(zip(law_titles, proposals_list)),
+        html_titles=[
+            f"{law_idx+1}. {law_title}" for law_idx, law_title in enumerate(law_titles)
+        ],
+        pdf_hash=key,
+    )
+    law_results = iter_process_laws(
+        job.laws, html_titles=job.html_titles, workers=workers
+    )
+    for law_idx, law_result in enumerate(law_results):
+        job.add_result(law_result)
+        if law_result.error:
+            click.echo(f"Failed to apply changes to {law_result.law_title}")
+            continue
+        result_store.put_rows(key, law_idx, law_result.html)
+    result_store.put_pdf(key, pdf)
+    if any(law_result.error for law_result in job.results):
+        click.echo(f"Not storing the overview of {pdf_path}; try again later.")
+    else:
+        result_store.put_overview(key, job.todict())
+        click.echo(f">> Stored as /results/{key}")
+    return key
+
+
+def find_pdfs(paths: Tuple[str, ...]) -> List[str]:
+    """The pdfs at the paths; the pdfs in them for directories."""
+    pdf_paths = []
+    for path in paths:
+        if os.path.isdir(path):
+            pdf_paths += sorted(glob.glob(os.path.join(path, "*.pdf")))
+        else:
+            pdf_paths.append(path)
+    return pdf_paths
+
+
+@click.command()
+@click.option(
+    "paths",
+    "-c",
+    help="Path to a change law pdf or a folder of them; repeatable.",
+    type=click.Path(exists=True),
+    required=True,
+    multiple=True,
+)
+@click.option(
+    "workers",
+    "-w",
+    "--workers",
+    help="Number of worker processes to process the laws in parallel.",
+    default=PIPELINE_WORKERS,
+)
+@click.option(
+    "force",
+    "--force",
+    is_flag=True,
+    help="Process the pdfs again even if their results are stored already.",
+)
+def store_results(paths: Tuple[str, ...], workers: int, force: bool):
+    """Main function."""
+    for pdf_path in find_pdfs(paths):
+        try:
+            store_pdf_results(pdf_path, workers, force)
+        except Exception as err:  # pylint: disable=broad-except
+            click.echo(f"Failed to process {pdf_path}: {err}")
+    shutdown_executor()
+    click.echo("DONE.")
+
+
+if __name__ == "__main__":
+    # pylint: disable=no-value-for-parameter
+    store_results()
@@ -1,37 +1,91 @@
 """Script to update the lookup json for source law shortcodes.
 
+Pages of the law listing are fetched concurrently and checkpointed, so an interrupted
+run continues where it stopped. The lookup file is replaced atomically, running app
+workers pick up the new version without seeing a partially written file.
+
 Example usage:
     poetry run python ./scripts/update_source_law_lookup.py
+    poetry run python ./scripts/update_source_law_lookup.py --delta -w 16
 """
 import json
+import os
 
 import click
-import requests
+
+from lawinprogress.processing.lookup_update import (
+    PageCheckpoint,
+    fetch_lookup_pages,
+    merge_lookup,
+)
+from lawinprogress.processing.source_law_retrieval import (
+    RECHTSINFORMATIONSPORTAL_API_URL,
+    SOURCE_LAW_LOOKUP_PATH,
+)
+from lawinprogress.storage import atomic_write_json
 
 
 @click.command()
-def update_source_law_lookup():
+@click.option(
+    "save_path",
+    "-o",
+    help="Where to write the lookup json.",
+    default=SOURCE_LAW_LOOKUP_PATH,
+)
+@click.option(
+    "max_workers",
+    "-w",
+    "--workers",
+    help="Maximum number of concurrent requests.",
+    default=8,
+)
+@click.option(
+    "--delta",
+    is_flag=True,
+    help="Only update the slugs whose metadata changed and write a list of them.",
+)
+@click.option(
+    "--resume/--no-resume",
+    default=True,
+    help="Continue from the pages fetched by an interrupted run.",
+)
+def update_source_law_lookup(
+    save_path: str, max_workers: int, delta: bool, resume: bool
+):
     """Main function."""
     click.echo("Started retrieving new version of shortcode lookup.")
-    source_url = "https://api.rechtsinformationsportal.de/v1/laws?include=all_fields"
+    source_url = f"{RECHTSINFORMATIONSPORTAL_API_URL}/laws?include=all_fields"
 
     # retrieve lookup
-    Ri_response = [requests.get(source_url)]
-    next_page = Ri_response[-1].json()["links"]["next"]
-    while next_page != None:
-        Ri_response.append(requests.get(next_page))
-        next_page = Ri_response[-1].json()["links"]["next"]
-        x += 1
+    checkpoint = PageCheckpoint(
+        directory=os.path.join(os.path.dirname(save_path), ".lookup_checkpoint"),
+        source_url=source_url,
+        resume=resume,
+    )
+    rechtsinformationsportal_list = fetch_lookup_pages(
+        source_url, checkpoint=checkpoint, max_workers=max_workers
+    )
 
-    rechtsinformationsportal_list = [
-        (Ri_response[page].json()["data"]) for page in range(0, x + 1)
-    ]
+    if delta and os.path.isfile(save_path):
+        with open(save_path, "r", encoding="utf8") as lookup_file:
+            old_lookup = json.load(lookup_file)
+        rechtsinformationsportal_list, changes = merge_lookup(
+            old_lookup, rechtsinformationsportal_list
+        )
+        click.echo(" ".join(f"{len(slugs)} {kind}" for kind, slugs in changes.items()))
+        changes_path = os.path.splitext(save_path)[0] + ".changes.json"
+        atomic_write_json(changes_path, changes)
+        click.echo(f"Save changed slugs to {changes_path}")
+        if not any(changes.values()):
+            # leave the file untouched so running workers don't reload it
+            checkpoint.clear()
+            click.echo("Lookup is up to date.")
+            return
 
     # save to file
-    save_path = "./data/source_laws/rechtsinformationsportalAPI.json"
-    with open(save_path, "w") as file:
-        json.dump(rechtsinformationsportal_list, file)
-    echo.click(f"Save file to {save_path}")
+    atomic_write_json(save_path, rechtsinformationsportal_list)
+    checkpoint.clear()
+    click.echo(f"Save file to {save_path}")
 
 
 if __name__ == "__main__":
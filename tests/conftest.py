@@ -1,9 +1,18 @@
 """Fixtures and setup for tests."""
 import pytest
 
+from lawinprogress.metrics import registry
 from lawinprogress.parsing.lawtree import LawTextNode
 
 
+@pytest.fixture(autouse=True)
+def metrics_dir(monkeypatch, tmp_path):
+    """Start every test without metrics and keep the ones of the processes in tmp_path."""
+    registry.reset()
+    monkeypatch.setattr(registry, "directory", str(tmp_path / "metrics"))
+    return registry.directory
+
+
 @pytest.fixture(scope="function")
 def simple_lawtext_tree() -> LawTextNode:
     """Return a simple law text tree."""
@@ -0,0 +1,54 @@
+"""Test the admission control of the web app."""
+import asyncio
+import gc
+
+from starlette.responses import StreamingResponse
+
+from lawinprogress.app.admission import AdmissionLimit
+
+
+def test_admission_limit():
+    """Test if requests beyond the limit are turned away until a slot is released."""
+    limiter = AdmissionLimit(2)
+    first, second = limiter.try_admit(), limiter.try_admit()
+    assert first is not None and second is not None
+    assert limiter.try_admit() is None
+    first.release()
+    # releasing twice does not free another slot
+    first.release()
+    assert limiter.active == 1
+    assert limiter.try_admit() is not None
+    assert limiter.try_admit() is None
+
+
+def test_admission_release_with_response():
+    """Test if the slot of a streamed response is released once it is sent."""
+    limiter = AdmissionLimit(1)
+    response = limiter.try_admit().release_with(
+        StreamingResponse(iter(["a", "b"]), media_type="text/html")
+    )
+    assert limiter.try_admit() is None
+    asyncio.run(response.background())
+    assert limiter.active == 0
+    # dropping the sent response does not free another slot
+    admission = limiter.try_admit()
+    del response
+    gc.collect()
+    assert limiter.active == 1
+    admission.release()
+
+
+def test_admission_released_if_response_is_not_sent():
+    """Test if the slot is released if the response is dropped without being sent."""
+    limiter = AdmissionLimit(1)
+    response = limiter.try_admit().release_with(StreamingResponse(iter(["a"])))
+    assert limiter.active == 1
+    del response
+    gc.collect()
+    assert limiter.active == 0
+
+
+def test_admission_without_limit():
+    """Test if all requests are admitted with limit 0."""
+    limiter = AdmissionLimit(0)
+    assert all(limiter.try_admit() is not None for _ in range(100))
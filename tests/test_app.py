@@ -0,0 +1,242 @@
+"""Test the endpoints of the web app."""
+import io
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi.testclient import TestClient
+
+from lawinprogress import pipeline
+from lawinprogress.app import html, job_queue
+from lawinprogress.app.admission import AdmissionLimit
+from lawinprogress.app.job_queue import JobQueue
+from lawinprogress.app.jobs import JobStore
+from lawinprogress.libdiff.fragment_cache import DiffFragmentCache
+from lawinprogress.processing.law_cache import SizedTTLCache
+from lawinprogress.result_store import ResultStore, pdf_hash
+from lawinprogress.singleflight import SingleFlight
+
+from .test_pipeline import CHANGE_LAW_TEXT, fake_retrieve_source_law
+from .test_uploads import make_pdf
+
+PDF = make_pdf(1)
+
+
+def fake_process_pdf(pdf_path, deadline=None, law_titles=("Gesetz", "Unbekannt")):
+    """Return the laws Gesetz and Unbekannt for every pdf."""
+    return list(law_titles), [CHANGE_LAW_TEXT] * len(law_titles), "Testgesetz"
+
+
+@pytest.fixture
+def client(monkeypatch, tmp_path):
+    """The app with empty stores in tmp_path, fake pdfs and source laws.
+
+    The queued uploads are processed in a thread, so they see the fakes as well.
+    """
+    monkeypatch.setattr(html, "process_pdf", fake_process_pdf)
+    monkeypatch.setattr(job_queue, "process_pdf", fake_process_pdf)
+    monkeypatch.setattr(pipeline, "retrieve_source_law", fake_retrieve_source_law)
+    monkeypatch.setattr(
+        pipeline, "fragment_cache", DiffFragmentCache(str(tmp_path / "fragments"), 0)
+    )
+    monkeypatch.setattr(pipeline, "PIPELINE_WORKERS", 1)
+    monkeypatch.setattr(html.FuzzyLawSlugRetriever, "get_index", lambda: None)
+    monkeypatch.setattr(
+        html, "jobs", JobStore(10**6, ttl=60, directory=str(tmp_path / "jobs"))
+    )
+    monkeypatch.setattr(html, "result_store", ResultStore(str(tmp_path / "results")))
+    monkeypatch.setattr(html, "diff_cache", SizedTTLCache(10**6, ttl=60))
+    monkeypatch.setattr(html, "upload_flight", SingleFlight())
+    monkeypatch.setattr(html, "upload_admission", AdmissionLimit(2, retry_after=30))
+    queue = JobQueue(workers=1, max_queued=2)
+    queue._executor = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(html, "upload_queue", queue)
+    # without the startup events, which load the spacy model and the lookup
+    yield TestClient(html.app)
+    queue.shutdown()
+
+
+def upload(client: TestClient, path: str = "/jobs", **data):
+    """Post the pdf to path."""
+    return client.post(
+        path,
+        files={"change_law_pdf": ("entwurf.pdf", io.BytesIO(PDF), "application/pdf")},
+        data=data,
+    )
+
+
+def finish_queued_jobs():
+    """Wait until the queued uploads and their callbacks are done."""
+    html.upload_queue.shutdown()
+
+
+def test_job_lifecycle(client, monkeypatch):
+    """Test if a queued upload is polled, done and its diffs and export are served."""
+    release = threading.Event()
+
+    def slow_process_pdf(pdf_path, deadline=None):
+        release.wait(timeout=30)
+        return fake_process_pdf(pdf_path)
+
+    monkeypatch.setattr(job_queue, "process_pdf", slow_process_pdf)
+    response = upload(client)
+    assert response.status_code == 202
+    urls = response.json()
+    job_id = urls["job_id"]
+    assert urls["permalink"] == f"/results/{pdf_hash(PDF)}"
+    assert client.get(urls["status_url"]).json()["status"] in ["queued", "running"]
+    response = client.get(urls["result_url"])
+    assert response.status_code == 202
+    assert response.json()["status"] in ["queued", "running"]
+
+    release.set()
+    finish_queued_jobs()
+    assert client.get(urls["status_url"]).json() == {
+        "job_id": job_id,
+        "status": "done",
+    }
+    result = client.get(urls["result_url"]).json()
+    assert result["status"] == "done"
+    assert [law["url"] for law in result["laws"]] == [
+        f"/jobs/{job_id}/laws/0",
+        f"/jobs/{job_id}/laws/1",
+    ]
+    assert client.get(f"/jobs/{job_id}").status_code == 200
+
+    diff = client.get(f"/jobs/{job_id}/laws/0")
+    assert diff.status_code == 200
+    assert "Wort" in diff.text
+    assert "Source law not found." in client.get(f"/jobs/{job_id}/laws/1").text
+    assert client.get(f"/jobs/{job_id}/laws/2").status_code == 404
+
+    export = client.get(f"/jobs/{job_id}/export", params={"format": "jsonl"})
+    assert export.status_code == 200
+    lines = [json.loads(line) for line in export.text.splitlines()]
+    assert {"law": "Unbekannt", "error": "Source law not found."} in lines
+    response = client.get(f"/jobs/{job_id}/export", params={"format": "pdf"})
+    assert response.status_code == 422
+    assert client.get("/jobs/unknown/status").status_code == 404
+
+
+def test_failed_job(client, monkeypatch):
+    """Test if the result of a failed upload is a 422 with the error."""
+
+    def broken_process_pdf(pdf_path, deadline=None):
+        raise ValueError("no laws")
+
+    monkeypatch.setattr(job_queue, "process_pdf", broken_process_pdf)
+    urls = upload(client).json()
+    finish_queued_jobs()
+    response = client.get(urls["result_url"])
+    assert response.status_code == 422
+    assert response.json()["error"] == "ValueError: no laws"
+
+
+def test_queue_full(client, monkeypatch):
+    """Test if uploads are turned away with a 503 while the queue is full."""
+    monkeypatch.setattr(html, "upload_queue", JobQueue(workers=1, max_queued=0))
+    response = upload(client)
+    assert response.status_code == 503
+
+
+def test_permalink_served_from_store(client, monkeypatch):
+    """Test if the results of a processed pdf are served from the result store."""
+    upload(client)
+    finish_queued_jobs()
+
+    def unused_process_pdf(pdf_path, deadline=None):
+        raise AssertionError("the stored results are used")
+
+    monkeypatch.setattr(html, "process_pdf", unused_process_pdf)
+    response = client.get(f"/results/{pdf_hash(PDF)}")
+    assert response.status_code == 200
+    assert "Testgesetz" in response.text
+    assert "1. Gesetz" in response.text and "2. Unbekannt" in response.text
+    # the diffs of the new job are rendered on demand
+    job_id = response.text.split("/jobs/")[1].split("/")[0]
+    assert "Wort" in client.get(f"/jobs/{job_id}/laws/0").text
+    assert client.get(f"/results/{'0' * 64}").status_code == 404
+
+
+def test_results_page_loads_the_first_law_right_away(client):
+    """Test if the first law starts loading before the other laws are streamed."""
+    response = upload(client, path="/")
+    assert response.status_code == 200
+    page = response.text
+    assert page.index('loadLaw("1. Gesetz")') < page.index('id="2. Unbekannt"')
+    assert page.index("function openLaw") < page.index('id="1. Gesetz"')
+
+
+def test_results_page_is_completed_if_storing_fails(client, monkeypatch):
+    """Test if the laws after an error get a note instead of ending the page early."""
+
+    def broken_put_rows(key, law_idx, rows):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(html, "LAZY_DIFFS", False)
+    monkeypatch.setattr(html.result_store, "put_rows", broken_put_rows)
+    page = upload(client, path="/").text
+    assert page.count('class="tabcontent"') == 2
+    assert "Failed to apply the changes to this law." in page
+    assert page.rstrip().endswith("</html>")
+
+
+def test_diff_rows(client):
+    """Test if ranges of the rows of a diff are served."""
+    job_id = upload(client, collapse="true").json()["job_id"]
+    finish_queued_jobs()
+    rows = client.get(f"/diff/{job_id}/0/rows", params={"start": 0, "end": 1})
+    assert rows.status_code == 200
+    assert rows.text in client.get(f"/jobs/{job_id}/laws/0").text
+    response = client.get(f"/diff/{job_id}/0/rows", params={"start": 1, "end": 0})
+    assert response.status_code == 422
+    response = client.get("/diff/unknown/0/rows", params={"start": 0, "end": 1})
+    assert response.status_code == 404
+
+
+def test_busy(client):
+    """Test if requests beyond the admission limit get a 503 with Retry-After."""
+    html.upload_admission.limit = 1
+    job_id = upload(client).json()["job_id"]
+    finish_queued_jobs()
+    slot = html.upload_admission.try_admit()
+    for response in [
+        upload(client, path="/preflight"),
+        client.get(f"/jobs/{job_id}/export"),
+        client.get(f"/jobs/{job_id}/laws/0"),
+    ]:
+        assert response.status_code == 503
+        assert response.headers["retry-after"] == "30"
+    slot.release()
+    assert client.get(f"/jobs/{job_id}/export").status_code == 200
+    assert html.upload_admission.active == 0
+
+
+def test_preflight(client, monkeypatch):
+    """Test if the changes are classified and a failing law holds its error."""
+    monkeypatch.setattr(
+        html,
+        "process_pdf",
+        lambda pdf_path, deadline=None: fake_process_pdf(
+            pdf_path, law_titles=("Gesetz", "Kaputt", "Unbekannt")
+        ),
+    )
+    response = upload(client, path="/preflight")
+    assert response.status_code == 200
+    laws = response.json()["laws"]
+    assert [law["title"] for law in laws] == ["Gesetz", "Kaputt", "Unbekannt"]
+    assert laws[0]["counts"]["resolvable"] == 1 and laws[0]["error"] is None
+    assert laws[1]["error"] == "ValueError: broken law"
+    assert not laws[2]["source_law_found"] and laws[2]["error"] is None
+
+
+def test_metrics(client):
+    """Test if the requests are counted by route."""
+    client.get("/jobs/unknown/status")
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert (
+        'lip_requests_total{route="/jobs/{job_id}/status",status="404"} 1'
+        in response.text
+    )
@@ -0,0 +1,132 @@
+"""Test planning and applying changes to a law tree."""
+import pytest
+
+from lawinprogress.apply_changes.apply_changes import (
+    LocationIndex,
+    apply_changes,
+    plan_changes,
+    preflight_changes,
+    summarize_preflight,
+)
+from lawinprogress.parsing.lawtree import LawTextNode
+from lawinprogress.parsing.parse_change_law import Change
+
+
+@pytest.fixture(scope="function")
+def law_tree() -> LawTextNode:
+    """Return a small law tree with repeated bulletpoints."""
+    tree = LawTextNode(text="Gesetz", bulletpoint="Titel:")
+    for paragraph in ["§ 1", "§ 2"]:
+        node = LawTextNode(text=f"Text {paragraph}", bulletpoint=paragraph, parent=tree)
+        for absatz in ["(1)", "(2)"]:
+            LawTextNode(
+                text=f"Text {paragraph} {absatz}", bulletpoint=absatz, parent=node
+            )
+    return tree
+
+
+@pytest.mark.parametrize(
+    "location, expected_text",
+    [
+        (["§ 2"], "Text § 2"),
+        (["§ 2", "(1)"], "Text § 2 (1)"),
+        (["§ 1", "Überschrift"], "Text § 1"),
+        (["(1)"], None),  # not unique
+        (["§ 3"], None),
+    ],
+)
+def test_location_index_find(law_tree, location, expected_text):
+    """Test if the index resolves locations like a search of the tree."""
+    node = LocationIndex(law_tree).find(location)
+
+    assert (node.text if node else None) == expected_text
+
+
+def test_plan_groups_text_edits_and_stops_at_structural_change(law_tree):
+    """Test if text edits are grouped by node and a structural change ends the plan."""
+    changes = [
+        Change(["§ 1", "(1)"], [], ["Text", "Wort"], "replace", ""),
+        Change(["§ 2", "(1)"], [], ["§ 2"], "delete_after", ""),
+        Change(["§ 1", "(1)"], [], ["Wort", "Satz"], "replace", ""),
+        Change(["§ 3"], [], ["Text"], "delete_after", ""),
+        Change(["§ 1", "(2)"], [], [], "cancelled", ""),
+        Change(["§ 1", "(1)"], [], ["(1)"], "delete_after", ""),
+    ]
+
+    plan = plan_changes(law_tree, changes)
+
+    assert [
+        [planned.index for planned in planned_changes]
+        for planned_changes in plan.node_edits.values()
+    ] == [[0, 2], [1]]
+    assert [planned.index for planned in plan.unresolved] == [3]
+    assert plan.structural.index == 4
+    assert plan.stop == 5
+
+
+def test_apply_many_edits_to_one_node(law_tree):
+    """Test if all edits to one node are applied in order and reported in order."""
+    changes = [
+        Change(["§ 1", "(1)"], [], ["Text", "Wort"], "replace", ""),
+        Change(["§ 2"], [], ["§ 2"], "delete_after", ""),
+        Change(["§ 1", "(1)"], [], ["Wort", "Satz"], "replace", ""),
+        Change(["§ 1", "(1)"], [], ["Satz", "neu"], "insert_after", ""),
+    ]
+
+    res_tree, change_results, n_success = apply_changes(law_tree, changes)
+
+    assert res_tree.children[0].children[0].text == "Satz neu § 1 (1)"
+    assert res_tree.children[1].text == "Text "
+    assert [result.change for result in change_results] == changes
+    assert n_success == 4
+    assert len(res_tree.children[0].children[0].changes) == 3
+    # the input tree is not changed
+    assert law_tree.children[0].children[0].text == "Text § 1 (1)"
+
+
+def test_changes_after_structural_change_see_new_bulletpoints(law_tree):
+    """Test if locations after a removed node are resolved against the updated tree."""
+    changes = [
+        Change(["§ 1", "(1)"], [], [], "cancelled", ""),
+        # the former (2) is now (1)
+        Change(["§ 1", "(1)"], [], ["Text", "Wort"], "replace", ""),
+    ]
+
+    res_tree, change_results, n_success = apply_changes(law_tree, changes)
+
+    assert [node.text for node in res_tree.children[0].children] == ["Wort § 1 (2)"]
+    assert n_success == 2
+    assert [result.status for result in change_results] == [1, 1]
+
+
+def test_preflight_classifies_changes_without_changing_the_tree(law_tree):
+    """Test if preflight classifies the changes and leaves the tree as it is."""
+    changes = [
+        Change(["§ 1", "(1)"], [], ["Text", "Wort"], "replace", ""),
+        Change(["(1)"], [], ["Text", "Wort"], "replace", ""),
+        Change(["§ 3"], [], ["Text", "Wort"], "replace", ""),
+        Change(["§ 1"], ["Sätze 1 und 2"], ["Neu."], "replace", ""),
+        Change(["§ 1"], [], [], "UNKNOWN", ""),
+        Change(["§ 1", "(2)"], [], [], "cancelled", ""),
+    ]
+    tree_text = law_tree.to_text()
+
+    results = preflight_changes(law_tree, changes)
+
+    assert [result.status for result in results] == [
+        "resolvable",
+        "ambiguous",
+        "not_found",
+        "unsupported",
+        "unsupported",
+        "resolvable",
+    ]
+    assert results[1].n_candidates == 2
+    assert summarize_preflight(results) == {
+        "resolvable": 2,
+        "ambiguous": 1,
+        "not_found": 1,
+        "unsupported": 2,
+    }
+    assert law_tree.to_text() == tree_text
+    assert all(not node.changes for node in law_tree.descendants)
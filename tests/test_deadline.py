@@ -0,0 +1,47 @@
+"""Test the time budget of requests."""
+import pickle
+import time
+
+import pytest
+
+from lawinprogress.deadline import Deadline, DeadlineExceeded, check_deadline
+from lawinprogress.parsing.parse_change_law import parse_changes
+
+CHANGE_LAW_TEXT = (
+    "1. In § 1 Absatz 1 wird das Wort „Text“ durch das Wort „Wort“ ersetzt."
+)
+
+
+def test_deadline():
+    """Test if a deadline expires after its time budget."""
+    deadline = Deadline(0.1)
+    assert not deadline.expired()
+    assert 0 < deadline.remaining() <= 0.1
+    deadline.check("testing")
+    time.sleep(0.15)
+    assert deadline.expired()
+    assert deadline.remaining() == 0
+    with pytest.raises(DeadlineExceeded, match="0.1s ran out while testing"):
+        deadline.check("testing")
+
+
+def test_no_deadline():
+    """Test if a deadline without time budget never expires."""
+    for deadline in [Deadline(None), Deadline(0)]:
+        assert not deadline.expired()
+        assert deadline.remaining() is None
+        deadline.check("testing")
+    check_deadline(None, "testing")
+
+
+def test_deadline_in_other_process():
+    """Test if a deadline holds after it is sent to a worker process."""
+    deadline = pickle.loads(pickle.dumps(Deadline(-1)))
+    assert deadline.expired()
+
+
+def test_parse_changes_checks_deadline():
+    """Test if parsing the changes stops once the deadline ran out."""
+    assert parse_changes(CHANGE_LAW_TEXT, "Gesetz", deadline=Deadline(60))
+    with pytest.raises(DeadlineExceeded, match="parsing the changes"):
+        parse_changes(CHANGE_LAW_TEXT, "Gesetz", deadline=Deadline(-1))
@@ -0,0 +1,125 @@
+"""Test the diff engines."""
+import random
+
+import pytest
+
+from lawinprogress.libdiff import diff_engine
+from lawinprogress.libdiff.diffhelpers import align_seqs
+from lawinprogress.libdiff.html_diff import html_diffs, mark_text, markup_diff
+
+
+def check_opcodes(seq_a, seq_b, opcodes):
+    """Check that the opcodes cover both sequences and turn seq_a into seq_b."""
+    idx_a = idx_b = 0
+    result = []
+    for tag, idx_a0, idx_a1, idx_b0, idx_b1 in opcodes:
+        assert (idx_a0, idx_b0) == (idx_a, idx_b)
+        if tag == "equal":
+            assert seq_a[idx_a0:idx_a1] == seq_b[idx_b0:idx_b1]
+        elif tag == "delete":
+            assert idx_a1 > idx_a0 and idx_b1 == idx_b0
+        elif tag == "insert":
+            assert idx_a1 == idx_a0 and idx_b1 > idx_b0
+        else:
+            assert tag == "replace" and idx_a1 > idx_a0 and idx_b1 > idx_b0
+        result += seq_b[idx_b0:idx_b1]
+        idx_a, idx_b = idx_a1, idx_b1
+    assert (idx_a, idx_b) == (len(seq_a), len(seq_b))
+    assert result == list(seq_b)
+    # consecutive opcodes are merged like difflib does
+    assert all(
+        not (first[0] == second[0] == "equal")
+        for first, second in zip(opcodes, opcodes[1:])
+    )
+
+
+def longest_common_subsequence(seq_a, seq_b):
+    """Length of the longest common subsequence by dynamic programming."""
+    previous = [0] * (len(seq_b) + 1)
+    for element_a in seq_a:
+        current = [0]
+        for idx, element_b in enumerate(seq_b):
+            current.append(
+                previous[idx] + 1
+                if element_a == element_b
+                else max(previous[idx + 1], current[idx])
+            )
+        previous = current
+    return previous[-1]
+
+
+@pytest.mark.parametrize("engine", list(diff_engine.DIFF_ENGINES))
+def test_opcodes_random(engine):
+    """Test the opcodes of random sequences with many repeated elements."""
+    rng = random.Random(0)
+    for _ in range(500):
+        alphabet = rng.randint(1, 5)
+        seq_a = [rng.randint(0, alphabet) for _ in range(rng.randint(0, 20))]
+        seq_b = [rng.randint(0, alphabet) for _ in range(rng.randint(0, 20))]
+        check_opcodes(seq_a, seq_b, diff_engine.get_opcodes(seq_a, seq_b, engine))
+
+
+def test_myers_shortest_edit_script():
+    """Test if Myers' algorithm finds a longest common subsequence."""
+    rng = random.Random(1)
+    for _ in range(500):
+        seq_a = [rng.randint(0, 3) for _ in range(rng.randint(0, 15))]
+        seq_b = [rng.randint(0, 3) for _ in range(rng.randint(0, 15))]
+        matches = diff_engine._myers(seq_a, seq_b, 0, len(seq_a), 0, len(seq_b))
+        assert len(matches) == longest_common_subsequence(seq_a, seq_b)
+
+
+def test_patience_repeated_lines():
+    """Test if the unique lines anchor the diff between repeated lines."""
+    seq_a = ["§ 1", "(weggefallen)", "§ 2", "(weggefallen)", "§ 3", "Text."]
+    seq_b = ["§ 1", "(weggefallen)", "§ 3", "Neuer Text."]
+    assert diff_engine.patience_opcodes(seq_a, seq_b) == [
+        ("equal", 0, 2, 0, 2),
+        ("delete", 2, 4, 2, 2),
+        ("equal", 4, 5, 2, 3),
+        ("replace", 5, 6, 3, 4),
+    ]
+
+
+def test_unknown_engine():
+    """Test if an unknown engine is refused."""
+    with pytest.raises(ValueError):
+        diff_engine.get_opcodes(["a"], ["b"], engine="unknown")
+    with pytest.raises(ValueError):
+        markup_diff(
+            ["a"], ["b"], mark=mark_text, isjunk=lambda x: x == "a", engine="patience"
+        )
+
+
+def test_html_diffs_engines():
+    """Test if both engines mark the same lines of a law with repeated lines."""
+    lines = ["     § 1 Test"]
+    for idx in range(1, 40):
+        lines.append(
+            "         (weggefallen)" if idx % 3 else f"         ({idx}) Satz {idx}."
+        )
+    text_a = "\n".join(lines) + "\n"
+    lines[10] = "         (10) Neuer Satz."
+    del lines[20]
+    text_b = "\n".join(lines) + "\n"
+
+    difflib_rows = html_diffs(text_a, text_b, [], "Test", engine="difflib")
+    patience_rows = html_diffs(text_a, text_b, [], "Test", engine="patience")
+    assert len(patience_rows) == len(difflib_rows)
+    assert [row[0] for row in patience_rows if "<span" in row[0] + row[2]] == [
+        row[0] for row in difflib_rows if "<span" in row[0] + row[2]
+    ]
+    assert align_seqs(text_a.split("\n"), text_b.split("\n"), engine="patience") == (
+        align_seqs(text_a.split("\n"), text_b.split("\n"), engine="difflib")
+    )
+
+
+def test_engine_key_error(monkeypatch):
+    """Test if a KeyError raised by an engine is not taken for an unknown engine."""
+
+    def failing_engine(seq_a, seq_b):
+        raise KeyError("line")
+
+    monkeypatch.setitem(diff_engine.DIFF_ENGINES, "failing", failing_engine)
+    with pytest.raises(KeyError):
+        diff_engine.get_opcodes(["a"], ["b"], engine="failing")
@@ -0,0 +1,96 @@
+"""Test the machine-readable exports of the diff."""
+import copy
+import difflib
+import json
+
+import pytest
+
+from lawinprogress.apply_changes.edit_functions import ChangeResult
+from lawinprogress.libdiff.export import export_diff
+from lawinprogress.libdiff.html_diff import html_tree_diffs
+from lawinprogress.parsing.lawtree import LawTextNode
+from lawinprogress.parsing.parse_change_law import Change
+
+
+@pytest.fixture(scope="function")
+def law_trees():
+    """Return a law tree, a changed copy of it and the results of the changes."""
+    tree = LawTextNode(text="Gesetz", bulletpoint="Titel:")
+    for paragraph in range(1, 11):
+        node = LawTextNode(
+            text=f"Paragraph {paragraph}.", bulletpoint=f"§ {paragraph}", parent=tree
+        )
+        for absatz in range(1, 3):
+            LawTextNode(
+                text=f"Absatz {absatz} von § {paragraph}.",
+                bulletpoint=f"({absatz})",
+                parent=node,
+            )
+    new_tree = copy.deepcopy(tree)
+    changed_node = new_tree.children[4].children[0]
+    changed_node.text = "Neuer Absatz 1 von § 5."
+    change = Change(
+        location=["§ 5", "(1)"],
+        sentences=[],
+        text=["Absatz", "Neuer Absatz"],
+        change_type="replace",
+        raw_text="In § 5 Absatz 1 wird das Wort „Absatz“ durch „Neuer Absatz“ ersetzt.",
+    )
+    changed_node.changes = [ChangeResult(change, changed_node, status=1)]
+    # a removed node without a change result
+    new_tree.children[8].children[1].parent = None
+    change_results = [node.changes for node in new_tree.descendants if node.changes]
+    return tree, new_tree, change_results
+
+
+def test_jsonl_rows(law_trees):
+    """Test if the rows match the html synopsis and carry the change results."""
+    tree, new_tree, change_results = law_trees
+    rows = [
+        json.loads(line)
+        for line in export_diff(tree, new_tree, change_results, "Gesetz", "jsonl")
+    ]
+    html_rows = html_tree_diffs(tree, new_tree, change_results, "Gesetz")
+
+    assert len(rows) == len(html_rows)
+    assert [row["row"] for row in rows] == list(range(len(rows)))
+    changed = [row for row in rows if row["changed"]]
+    assert [row["row"] for row in changed] == [
+        idx for idx, row in enumerate(html_rows) if "<span" in row[0] + row[2]
+    ]
+    assert changed[0]["old"].strip() == "(1) Absatz 1 von § 5."
+    assert changed[0]["new"].strip() == "(1) Neuer Absatz 1 von § 5."
+    assert changed[0]["changes"] == [
+        {
+            "change": change_results[0][0].change.todict(),
+            "status": 1,
+            "message": "Applied edit",
+        }
+    ]
+    # the removed line has no counterpart and no change assigned
+    assert changed[1]["old"].strip() == "(2) Absatz 2 von § 9."
+    assert changed[1]["new"] is None
+    assert changed[1]["changes"] == []
+
+
+def test_unified_diff(law_trees):
+    """Test if the unified diff is the same as the one of difflib."""
+    tree, new_tree, change_results = law_trees
+    lines = list(export_diff(tree, new_tree, change_results, "Gesetz", "diff"))
+
+    expected = difflib.unified_diff(
+        tree.to_text().splitlines(keepends=True),
+        new_tree.to_text().splitlines(keepends=True),
+        fromfile="a/Gesetz",
+        tofile="b/Gesetz",
+    )
+    assert lines == list(expected)
+    # nothing for unchanged laws
+    assert list(export_diff(tree, copy.deepcopy(tree), [], "Gesetz", "diff")) == []
+
+
+def test_unknown_export_format(law_trees):
+    """Test if an unknown format is refused."""
+    tree, new_tree, change_results = law_trees
+    with pytest.raises(ValueError):
+        export_diff(tree, new_tree, change_results, "Gesetz", "xml")
@@ -0,0 +1,118 @@
+"""Test the on-disk cache of rendered diffs."""
+import os
+import time
+
+from lawinprogress.libdiff import fragment_cache
+from lawinprogress.libdiff.fragment_cache import (
+    TITLE_PLACEHOLDER,
+    DiffFragmentCache,
+    fragment_key,
+    with_title,
+)
+from lawinprogress.parsing.parse_change_law import Change
+
+SOURCE_LAW = [{"id": 1, "parent": None, "name": "§ 1", "body": "<P>Text.</P>"}]
+CHANGE = Change(
+    location=["§ 1"],
+    sentences=[],
+    text=["Text", "Wort"],
+    change_type="replace",
+    raw_text="In § 1 wird das Wort „Text“ durch das Wort „Wort“ ersetzt.",
+)
+
+
+def test_fragment_key():
+    """Test if the key changes with the source law and with the changes."""
+    key = fragment_key(SOURCE_LAW, [CHANGE])
+    assert key == fragment_key([dict(SOURCE_LAW[0])], [CHANGE])
+    assert key != fragment_key(SOURCE_LAW, [])
+    assert key != fragment_key([{**SOURCE_LAW[0], "body": "<P>Satz.</P>"}], [CHANGE])
+
+
+def test_fragment_key_settings(monkeypatch):
+    """Test if the key changes with the diff engine, the splitter and the renderer."""
+    key = fragment_key(SOURCE_LAW, [CHANGE], renderer="html_tree_diffs/1")
+    assert key != fragment_key(SOURCE_LAW, [CHANGE], renderer="html_tree_diffs/2")
+    monkeypatch.setattr(fragment_cache.diff_engine, "DIFF_ENGINE", "patience")
+    patience_key = fragment_key(SOURCE_LAW, [CHANGE], renderer="html_tree_diffs/1")
+    assert patience_key != key
+    monkeypatch.setattr(
+        fragment_cache.sentence_segmentation, "SENTENCE_SPLITTER", "rules"
+    )
+    assert patience_key != fragment_key(
+        SOURCE_LAW, [CHANGE], renderer="html_tree_diffs/1"
+    )
+
+
+def test_source_law_hash_once_per_law(monkeypatch):
+    """Test if a retrieved source law is only serialized for its first key."""
+    dumped = []
+    dumps = fragment_cache.json.dumps
+    monkeypatch.setattr(
+        fragment_cache.json,
+        "dumps",
+        lambda obj, **kwargs: dumped.append(obj) or dumps(obj, **kwargs),
+    )
+    source_law = [dict(SOURCE_LAW[0])]
+    assert fragment_key(source_law, [CHANGE]) != fragment_key(source_law, [])
+    assert dumped.count(source_law) == 1
+
+
+def test_with_title():
+    """Test if the placeholder is replaced in all cells."""
+    rows = [[f'<div id="{TITLE_PLACEHOLDER}old-0">', "", TITLE_PLACEHOLDER]]
+    assert with_title(rows, "1. Gesetz") == [
+        ('<div id="1. Gesetzold-0">', "", "1. Gesetz")
+    ]
+
+
+def test_get_and_put(tmp_path):
+    """Test if entries are stored compressed and broken files are dropped."""
+    cache = DiffFragmentCache(str(tmp_path), max_bytes=10**6)
+    assert cache.get("a") is None
+    cache.put("a", {"html": [["alt", "", "neu"]], "n_success": 1})
+    assert cache.get("a") == {"html": [["alt", "", "neu"]], "n_success": 1}
+    assert os.listdir(tmp_path) == ["a.json.gz"]
+
+    (tmp_path / "b.json.gz").write_bytes(b"no gzip")
+    assert cache.get("b") is None
+    assert not (tmp_path / "b.json.gz").exists()
+    cache.clear()
+    assert cache.get("a") is None
+
+
+def test_lru_eviction(tmp_path):
+    """Test if the least recently used entries are removed first."""
+    entry = {"text": os.urandom(1000).hex()}
+    cache = DiffFragmentCache(str(tmp_path), max_bytes=10**6)
+    cache.put("a", entry)
+    entry_size = os.path.getsize(tmp_path / "a.json.gz")
+    cache.max_bytes = 2 * entry_size
+    cache.put("b", entry)
+    # make the entries older than the next access
+    past = time.time() - 10
+    for name in ("a", "b"):
+        os.utime(tmp_path / f"{name}.json.gz", (past, past))
+    assert cache.get("a") is not None
+    cache.put("c", entry)
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+
+
+def test_eviction_without_listing(tmp_path, monkeypatch):
+    """Test if the folder is only listed when the cache is full or every scan_every."""
+    entry = {"text": os.urandom(1000).hex()}
+    cache = DiffFragmentCache(str(tmp_path), max_bytes=10**6, scan_every=3)
+    evicted = []
+    evict = cache.evict
+    monkeypatch.setattr(cache, "evict", lambda: evicted.append(1) or evict())
+    cache.put("a", entry)
+    assert len(evicted) == 1  # the size is not known yet
+    cache.put("b", entry)
+    assert len(evicted) == 1
+    cache.put("c", entry)
+    assert len(evicted) == 2
+    cache.max_bytes = 3 * os.path.getsize(tmp_path / "a.json.gz")
+    cache.put("d", entry)
+    assert len(evicted) == 3
+    assert len(os.listdir(tmp_path)) == 3
@@ -0,0 +1,46 @@
+"""Test the html side-by-side diff."""
+from lawinprogress.libdiff.html_diff import (
+    collapse_rows,
+    collapsed_ranges,
+    html_diffs,
+    is_changed_row,
+)
+
+
+def law_text(changed_line: int = None) -> str:
+    """Text of a law with 30 lines, one of them changed."""
+    lines = [f"         ({idx}) Text {idx}." for idx in range(30)]
+    if changed_line is not None:
+        lines[changed_line] = f"         ({changed_line}) Neuer Text."
+    return "\n".join(lines) + "\n"
+
+
+def test_collapsed_ranges():
+    """Test if only the rows far from changes are collapsed."""
+    rows = html_diffs(law_text(), law_text(changed_line=10), [], "Test")
+    assert [idx for idx, row in enumerate(rows) if is_changed_row(row)] == [10]
+
+    assert collapsed_ranges(rows, context=2) == [(0, 8), (13, len(rows))]
+    assert collapsed_ranges(rows, context=0) == [(0, 10), (11, len(rows))]
+    assert collapsed_ranges(rows, context=8) == [(0, 2), (19, len(rows))]
+    # a single row is not collapsed
+    assert collapsed_ranges(rows, context=9) == [(20, len(rows))]
+    # without changes everything is collapsed
+    assert collapsed_ranges(rows[:5], context=2) == [(0, 5)]
+    assert collapsed_ranges([], context=2) == []
+
+
+def test_collapse_rows():
+    """Test if the collapsed rows are replaced by placeholders pointing to them."""
+    rows = html_diffs(law_text(), law_text(changed_line=10), [], "Test")
+    collapsed = collapse_rows(
+        rows, context=2, url=lambda start, end: f"/rows/{start}-{end}"
+    )
+
+    assert len(collapsed) == 2 + 5
+    assert 'data-url="/rows/0-8"' in collapsed[0][0]
+    assert "8 unveränderte Zeilen" in collapsed[0][0]
+    assert collapsed[1:6] == rows[8:13]
+    assert f'data-url="/rows/13-{len(rows)}"' in collapsed[6][0]
+    # nothing is collapsed with enough context
+    assert collapse_rows(rows, context=len(rows), url=lambda start, end: "") == rows
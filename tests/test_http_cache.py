@@ -0,0 +1,164 @@
+"""Test the conditional revalidation of source laws against a local stub server."""
+import json
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from lawinprogress.processing import http_cache
+from lawinprogress.processing.http_cache import HttpJsonCache
+
+
+class StubLawServer:
+    """Serve laws with ETag or Last-Modified headers and count the transferred bytes."""
+
+    def __init__(self, use_etag: bool = True):
+        self.laws = {}
+        self.versions = {}
+        self.use_etag = use_etag
+        self.bytes_sent = 0
+        self.n_not_modified = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                slug = self.path.split("/")[-1].split("?")[0]
+                if slug not in stub.laws:
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                version = stub.versions[slug]
+                etag = f'"{slug}-{version}"'
+                last_modified = formatdate(1_600_000_000 + version, usegmt=True)
+                if (stub.use_etag and self.headers.get("If-None-Match") == etag) or (
+                    not stub.use_etag
+                    and self.headers.get("If-Modified-Since") == last_modified
+                ):
+                    stub.n_not_modified += 1
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+                body = json.dumps(stub.laws[slug]).encode("utf8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                if stub.use_etag:
+                    self.send_header("ETag", etag)
+                else:
+                    self.send_header("Last-Modified", last_modified)
+                self.end_headers()
+                self.wfile.write(body)
+                stub.bytes_sent += len(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def publish(self, slug: str, contents: list):
+        """Publish a new version of a law."""
+        self.laws[slug] = {"data": {"contents": contents}}
+        self.versions[slug] = self.versions.get(slug, 0) + 1
+
+
+@pytest.fixture(params=[True, False], ids=["etag", "last-modified"])
+def stub_server(request):
+    server = StubLawServer(use_etag=request.param)
+    server.thread.start()
+    yield server
+    server.server.shutdown()
+
+
+def test_not_modified_law_is_served_from_disk(stub_server, tmp_path):
+    """Test if an unchanged law is revalidated without transferring it again."""
+    stub_server.publish("bgb", [{"id": "1", "body": "Text " * 200}])
+    cache = HttpJsonCache(directory=str(tmp_path))
+    url = f"{stub_server.url}/laws/bgb?include=contents"
+
+    first = cache.fetch(url, key="bgb")
+    bytes_after_first = stub_server.bytes_sent
+    second = cache.fetch(url, key="bgb")
+
+    assert bytes_after_first > 1000
+    assert stub_server.bytes_sent == bytes_after_first
+    assert stub_server.n_not_modified == 1
+    assert second == first
+
+
+def test_changed_law_is_transferred_again(stub_server, tmp_path):
+    """Test if only laws that changed upstream are downloaded again."""
+    stub_server.publish("bgb", [{"id": "1", "body": "Alt"}])
+    stub_server.publish("zpo", [{"id": "1", "body": "Unverändert"}])
+    cache = HttpJsonCache(directory=str(tmp_path))
+    for slug in ["bgb", "zpo"]:
+        cache.fetch(f"{stub_server.url}/laws/{slug}", key=slug)
+    bytes_before = stub_server.bytes_sent
+
+    stub_server.publish("bgb", [{"id": "1", "body": "Neu"}])
+    bgb = cache.fetch(f"{stub_server.url}/laws/bgb", key="bgb")
+    zpo = cache.fetch(f"{stub_server.url}/laws/zpo", key="zpo")
+
+    assert bgb["data"]["contents"][0]["body"] == "Neu"
+    assert zpo["data"]["contents"][0]["body"] == "Unverändert"
+    assert stub_server.bytes_sent - bytes_before == len(
+        json.dumps(stub_server.laws["bgb"]).encode("utf8")
+    )
+
+
+def test_missing_law_returns_none(stub_server, tmp_path):
+    """Test if a failed request is not cached and returns None."""
+    cache = HttpJsonCache(directory=str(tmp_path))
+
+    assert cache.fetch(f"{stub_server.url}/laws/unknown", key="unknown") is None
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_stale_copy_is_served_if_server_is_unreachable(stub_server, tmp_path):
+    """Test if the stored copy is used when revalidation fails."""
+    stub_server.publish("bgb", [{"id": "1", "body": "Text"}])
+    cache = HttpJsonCache(directory=str(tmp_path), timeout=1)
+    url = f"{stub_server.url}/laws/bgb"
+    first = cache.fetch(url, key="bgb")
+    stub_server.server.shutdown()
+    stub_server.server.server_close()
+
+    assert cache.fetch(url, key="bgb") == first
+
+
+def test_concurrent_fetches_share_one_request(stub_server, tmp_path, monkeypatch):
+    """Test if fetches waiting for a fetch of the same law don't request it again."""
+    stub_server.publish("bgb", [{"id": "1", "body": "Text " * 200}])
+    cache = HttpJsonCache(directory=str(tmp_path))
+    url = f"{stub_server.url}/laws/bgb"
+    requested = threading.Event()
+    n_requests = []
+    get = http_cache.requests.get
+
+    def slow_get(*args, **kwargs):
+        n_requests.append(1)
+        requested.set()
+        # let the other fetches wait for this one
+        time.sleep(0.3)
+        return get(*args, **kwargs)
+
+    monkeypatch.setattr(http_cache.requests, "get", slow_get)
+    results = []
+    first = threading.Thread(target=lambda: results.append(cache.fetch(url, "bgb")))
+    first.start()
+    requested.wait(timeout=10)
+    others = [
+        threading.Thread(target=lambda: results.append(cache.fetch(url, "bgb")))
+        for _ in range(3)
+    ]
+    for thread in others:
+        thread.start()
+    for thread in [first] + others:
+        thread.join()
+
+    assert len(n_requests) == 1
+    assert len(results) == 4
+    assert all(result == results[0] for result in results)
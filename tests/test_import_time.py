@@ -0,0 +1,22 @@
+"""Regression check that heavy dependencies are not loaded when importing the package."""
+import pytest
+
+from lawinprogress.import_time import LAZY_DEPENDENCIES, measure_imports
+
+
+@pytest.mark.parametrize(
+    "module",
+    [
+        "lawinprogress",
+        "lawinprogress.apply_changes.apply_changes",
+        "lawinprogress.libdiff.html_diff",
+        "lawinprogress.parsing.parse_change_law",
+        "lawinprogress.processing.proposal_pdf_to_artikles",
+        "lawinprogress.processing.source_law_retrieval",
+    ],
+)
+def test_heavy_dependencies_are_lazy(module):
+    """Test if importing a module does not import spacy, pdfplumber or rapidfuzz."""
+    imports = {name for name, _, _ in measure_imports([module])}
+    assert module in imports
+    assert not [dependency for dependency in LAZY_DEPENDENCIES if dependency in imports]
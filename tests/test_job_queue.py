@@ -0,0 +1,113 @@
+"""Test the queue of uploads processed by worker processes."""
+import time
+
+import pytest
+
+from lawinprogress import pipeline
+from lawinprogress.app import job_queue
+from lawinprogress.app.job_queue import DONE, FAILED, JobQueue, QueueFull
+from lawinprogress.libdiff.fragment_cache import DiffFragmentCache
+
+from .test_pipeline import CHANGE_LAW_TEXT, fake_retrieve_source_law
+
+
+def slow_square(value: int, seconds: float = 0) -> int:
+    """Return the square of the value after some seconds."""
+    time.sleep(seconds)
+    return value**2
+
+
+def fail(message: str):
+    """Raise an error with the message."""
+    raise ValueError(message)
+
+
+@pytest.fixture
+def queue():
+    """Start a queue with one worker process and stop it after the test."""
+    queue = JobQueue(workers=1, max_queued=2)
+    yield queue
+    queue.shutdown()
+
+
+def test_job_queue(queue):
+    """Test if the status and result of the tasks are kept by their id."""
+    assert queue.status("unknown") is None
+    queue.submit("a", slow_square, 3).result(timeout=30)
+    assert queue.status("a") == DONE
+    assert queue.result("a") == 9
+
+    with pytest.raises(ValueError):
+        queue.submit("b", fail, "broken").result(timeout=30)
+    assert queue.status("b") == FAILED
+    with pytest.raises(ValueError, match="broken"):
+        queue.result("b")
+
+
+def test_job_queue_depth(queue):
+    """Test if tasks are refused while max_queued tasks are waiting or running."""
+    first = queue.submit("a", slow_square, 2, 0.5)
+    queue.submit("b", slow_square, 3)
+    assert queue.pending() == 2
+    with pytest.raises(QueueFull):
+        queue.submit("c", slow_square, 4)
+    assert queue.status("c") is None
+    first.result(timeout=30)
+    queue.submit("d", slow_square, 5).result(timeout=30)
+    assert [queue.result(task_id) for task_id in "abd"] == [4, 9, 25]
+    assert queue.pending() == 0
+
+
+def test_job_queue_forgets_old_tasks():
+    """Test if only the newest finished tasks are kept."""
+    queue = JobQueue(workers=1, max_queued=2, keep_finished=1)
+    try:
+        queue.submit("a", slow_square, 2).result(timeout=30)
+        queue.submit("b", slow_square, 3).result(timeout=30)
+        queue.submit("c", slow_square, 4).result(timeout=30)
+        assert queue.status("a") is None
+        assert queue.status("b") == queue.status("c") == DONE
+    finally:
+        queue.shutdown()
+
+
+def test_process_upload(monkeypatch, tmp_path):
+    """Test if an upload is turned into a job with the results of its laws."""
+
+    def fake_process_pdf(pdf_path):
+        assert pdf_path == str(tmp_path / "entwurf.pdf")
+        return ["Gesetz", "Unbekannt"], [CHANGE_LAW_TEXT] * 2, "Änderungsgesetz"
+
+    monkeypatch.setattr(job_queue, "process_pdf", fake_process_pdf)
+    monkeypatch.setattr(pipeline, "retrieve_source_law", fake_retrieve_source_law)
+    monkeypatch.setattr(
+        pipeline, "fragment_cache", DiffFragmentCache(str(tmp_path), 10**6)
+    )
+    job = job_queue.process_upload(
+        "a", "entwurf.pdf", str(tmp_path / "entwurf.pdf"), "abc", collapse=True
+    )
+    assert job.job_id == "a" and job.collapse and job.pdf_hash == "abc"
+    assert job.html_titles == ["1. Gesetz", "2. Unbekannt"]
+    overview = job.overview()
+    assert overview["full_title"] == "Änderungsgesetz"
+    assert [law["n_success"] for law in overview["laws"]] == [1, 0]
+    assert [law["source_law_found"] for law in overview["laws"]] == [True, False]
+
+
+def test_job_queue_submit_once(queue):
+    """Test if a task with the key of a task in flight is not submitted again."""
+    task_id, first = queue.submit_once("pdf", "a", slow_square, 2, 0.3)
+    assert task_id == "a"
+    assert queue.submit_once("pdf", "b", slow_square, 2) == ("a", first)
+    assert queue.status("b") is None
+    assert first.result(timeout=30) == 4
+    # not in flight anymore
+    task_id, second = queue.submit_once("pdf", "c", slow_square, 3)
+    assert task_id == "c" and second.result(timeout=30) == 9
+
+
+def test_job_queue_shutdown_with_task_in_flight(queue):
+    """Test if the queue waits for a running task of submit_once when it stops."""
+    _, future = queue.submit_once("pdf", "a", slow_square, 2, 0.3)
+    queue.shutdown()
+    assert future.result(timeout=0) == 4
@@ -0,0 +1,117 @@
+"""Test the jobs of the web app."""
+import os
+import time
+
+from lawinprogress.app.jobs import Job, JobStore
+from lawinprogress.pipeline import LawResult
+
+
+def make_job(job_id: str, text: str = "Änderung") -> Job:
+    """Return a job with two laws."""
+    return Job(
+        job_id=job_id,
+        name="entwurf.pdf",
+        full_title="Gesetz zur Änderung",
+        laws=[("Gesetz", text), ("Unbekannt", text)],
+        html_titles=["1. Gesetz", "2. Unbekannt"],
+    )
+
+
+def test_job_overview():
+    """Test if the overview holds the results processed so far, without their texts."""
+    job = make_job("a")
+    job.add_result(
+        LawResult(
+            law_title="Gesetz",
+            source_law_found=True,
+            n_changes=3,
+            n_success=2,
+            source_text="alt",
+            modified_text="neu",
+            html=[("alt", "", "neu")],
+        )
+    )
+    assert job.results[0].source_text == job.results[0].modified_text == ""
+    assert job.results[0].html == []
+
+    overview = job.overview()
+    assert overview["n_laws"] == 2
+    assert overview["laws"] == [
+        {
+            "title": "Gesetz",
+            "source_law_found": True,
+            "n_changes": 3,
+            "n_success": 2,
+            "error": None,
+        }
+    ]
+
+
+def test_job_store():
+    """Test if the least recently used jobs are dropped first."""
+    job_size = make_job("a").size()
+    store = JobStore(max_bytes=2 * job_size, ttl=60)
+    assert JobStore.new_job_id() != JobStore.new_job_id()
+
+    store.add(make_job("a"))
+    store.add(make_job("b"))
+    assert store.get("a").job_id == "a"
+    store.add(make_job("c"))
+    assert store.get("b") is None
+    assert store.get("a") is not None and store.get("c") is not None
+    assert store.get("unknown") is None
+    # a job bigger than the store is not kept
+    assert not store.add(make_job("d", text="x" * 3 * job_size))
+    assert store.get("d") is None
+
+
+def test_job_store_ttl():
+    """Test if jobs are dropped after their time to live."""
+    store = JobStore(max_bytes=10**6, ttl=0)
+    store.add(make_job("a"))
+    assert store.get("a") is None
+
+
+def test_job_store_directory(tmp_path):
+    """Test if jobs and their status are shared through the directory."""
+    store = JobStore(max_bytes=10**6, ttl=60, directory=str(tmp_path / "jobs"))
+    other_store = JobStore(max_bytes=10**6, ttl=60, directory=store.directory)
+    job = make_job("a")
+    job.add_result(LawResult(law_title="Gesetz", source_law_found=True, n_changes=3))
+    store.add(job)
+    shared_job = other_store.get("a")
+    assert shared_job == job
+    assert shared_job.overview() == job.overview()
+
+    assert other_store.status("b") is None
+    store.set_status("b", {"status": "queued"})
+    assert other_store.status("b") == {"status": "queued"}
+    store.set_status("b", None)
+    assert other_store.status("b") is None
+    # ids which are no file names are not looked up
+    assert other_store.get("../a") is None
+
+    # expired jobs are not shared
+    expired_store = JobStore(max_bytes=10**6, ttl=0, directory=store.directory)
+    assert expired_store.get("a") is None
+    assert not list((tmp_path / "jobs").iterdir())
+
+
+def test_job_store_removes_expired_files_every_interval(tmp_path):
+    """Test if the folder is scanned for expired jobs at most every expire_interval."""
+    store = JobStore(
+        max_bytes=10**6, ttl=60, directory=str(tmp_path), expire_interval=3600
+    )
+    old_path = tmp_path / "old.job.json"
+    old_path.write_text("{}")
+    os.utime(old_path, (time.time() - 120, time.time() - 120))
+    store.add(make_job("a"))
+    assert not old_path.exists()
+
+    old_path.write_text("{}")
+    os.utime(old_path, (time.time() - 120, time.time() - 120))
+    store.add(make_job("b"))
+    assert old_path.exists()
+    # but it is not served
+    assert store.get("old") is None
+    assert not old_path.exists()
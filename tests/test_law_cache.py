@@ -0,0 +1,83 @@
+"""Test the size and time bounded source law cache."""
+import time
+
+import pytest
+
+from lawinprogress.processing.law_cache import SizedTTLCache, freeze, sized_ttl_cache
+
+
+def test_freeze_makes_nested_structures_read_only():
+    """Test if frozen objects can not be mutated anymore."""
+    frozen = freeze([{"id": 1, "parent": {"id": 0}, "items": [1, 2]}])
+
+    assert frozen[0]["parent"]["id"] == 0
+    assert frozen[0]["items"] == (1, 2)
+    with pytest.raises(TypeError):
+        frozen[0]["id"] = 2
+    with pytest.raises(TypeError):
+        frozen[0]["parent"]["id"] = 2
+    with pytest.raises(AttributeError):
+        frozen.append({})
+
+
+def test_cache_evicts_by_size():
+    """Test if the least recently used entries are evicted when the byte bound is hit."""
+    cache = SizedTTLCache(max_bytes=10, ttl=60, sizeof=len)
+    cache.put("a", "aaaa")
+    cache.put("b", "bbbb")
+    # touch a, so b is the least recently used entry
+    assert cache.get("a") == (True, "aaaa")
+    cache.put("c", "cccc")
+
+    assert cache.get("b") == (False, None)
+    assert cache.get("a") == (True, "aaaa")
+    assert cache.get("c") == (True, "cccc")
+    info = cache.info()
+    assert info.evictions == 1
+    assert info.currsize == 8
+    assert info.entries == 2
+
+
+def test_cache_rejects_oversized_entries():
+    """Test if an entry larger than the whole cache is not stored."""
+    cache = SizedTTLCache(max_bytes=3, ttl=60, sizeof=len)
+
+    assert not cache.put("a", "aaaa")
+    assert cache.info().entries == 0
+
+
+def test_cache_expires_entries():
+    """Test if entries are dropped after their ttl."""
+    cache = SizedTTLCache(max_bytes=100, ttl=0.01, sizeof=len)
+    cache.put("a", "aaaa")
+    time.sleep(0.02)
+
+    assert cache.get("a") == (False, None)
+    info = cache.info()
+    assert info.expirations == 1
+    assert info.currsize == 0
+
+
+def test_sized_ttl_cache_decorator():
+    """Test if the decorator caches frozen results and counts hits and misses."""
+    calls = []
+
+    @sized_ttl_cache(max_bytes=1000, ttl=60)
+    def load(slug):
+        calls.append(slug)
+        return [{"slug": slug}] if slug != "missing" else []
+
+    first = load("bgb")
+    second = load("bgb")
+    load("missing")
+    load("missing")
+
+    assert first is second
+    assert calls == ["bgb", "missing", "missing"]
+    with pytest.raises(TypeError):
+        first[0]["slug"] = "other"
+    info = load.cache_info()
+    assert info.hits == 1
+    assert info.misses == 3
+    load.cache_clear()
+    assert load.cache_info().entries == 0
@@ -0,0 +1,77 @@
+"""Test the bulk mirroring of laws into the local store."""
+import json
+import time
+
+import requests
+
+from lawinprogress.processing.law_mirror import RateLimiter, mirror_laws
+
+
+class FakeResponse:
+    def __init__(self, content: bytes):
+        self.content = content
+
+
+def fake_get(url, retries=3):
+    """Return a small law for every slug except 'broken'."""
+    slug = url.split("/")[-1].split("?")[0]
+    if slug == "broken":
+        raise requests.exceptions.ConnectionError("unreachable")
+    return FakeResponse(
+        json.dumps({"data": {"slug": slug, "contents": [{"id": slug}]}}).encode("utf8")
+    )
+
+
+def test_mirror_laws_writes_store_and_resumes(tmp_path):
+    """Test if laws are written to the store and skipped on the next run."""
+    report = mirror_laws(
+        ["bgb", "zpo", "bgb"], store_dir=str(tmp_path), api_url="", get=fake_get
+    )
+
+    assert report.fetched == 2
+    assert report.bytes > 0
+    assert json.loads((tmp_path / "bgb.json").read_text())["data"]["slug"] == "bgb"
+
+    report = mirror_laws(
+        ["bgb", "zpo", "stpo"], store_dir=str(tmp_path), api_url="", get=fake_get
+    )
+
+    assert report.fetched == 1
+    assert report.skipped == 2
+
+
+def test_mirror_laws_refreshes_changed_laws(tmp_path):
+    """Test if laws marked for refresh are downloaded again."""
+    mirror_laws(["bgb", "zpo"], store_dir=str(tmp_path), api_url="", get=fake_get)
+
+    report = mirror_laws(
+        ["bgb", "zpo"],
+        store_dir=str(tmp_path),
+        api_url="",
+        refresh=["zpo"],
+        get=fake_get,
+    )
+
+    assert report.fetched == 1
+    assert report.skipped == 1
+
+
+def test_mirror_laws_reports_failures(tmp_path):
+    """Test if a failing law does not stop the others and is not written."""
+    report = mirror_laws(
+        ["broken", "bgb"], store_dir=str(tmp_path), api_url="", get=fake_get
+    )
+
+    assert report.failed == ["broken"]
+    assert report.fetched == 1
+    assert not (tmp_path / "broken.json").exists()
+
+
+def test_rate_limiter():
+    """Test if the rate limiter spaces out calls after the burst."""
+    limiter = RateLimiter(rate=100, burst=1)
+    start = time.monotonic()
+    for _ in range(6):
+        limiter.wait()
+
+    assert time.monotonic() - start >= 0.04
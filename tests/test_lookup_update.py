@@ -0,0 +1,104 @@
+"""Test the concurrent, resumable rebuild of the source law lookup."""
+import pytest
+
+from lawinprogress.processing.lookup_update import (
+    PageCheckpoint,
+    fetch_lookup_pages,
+    merge_lookup,
+)
+
+SOURCE_URL = "https://api.example.org/v1/laws?include=all_fields"
+
+
+def make_listing(n_pages: int, with_last: bool = True) -> dict:
+    """Create a fake paginated law listing keyed by url."""
+    listing = {}
+    for page in range(1, n_pages + 1):
+        url = SOURCE_URL if page == 1 else f"{SOURCE_URL}&page={page}"
+        links = {
+            "next": f"{SOURCE_URL}&page={page + 1}" if page < n_pages else None,
+        }
+        if with_last:
+            links["last"] = f"{SOURCE_URL}&page={n_pages}"
+        listing[url] = {
+            "data": [{"slug": f"law-{page}", "titleShort": f"Gesetz {page}"}],
+            "links": links,
+        }
+    return listing
+
+
+@pytest.mark.parametrize("with_last", [True, False])
+def test_fetch_lookup_pages(tmp_path, with_last):
+    """Test if all pages are fetched in order, with or without random page access."""
+    listing = make_listing(5, with_last=with_last)
+    checkpoint = PageCheckpoint(str(tmp_path), SOURCE_URL)
+
+    pages = fetch_lookup_pages(
+        SOURCE_URL, checkpoint=checkpoint, max_workers=3, get_json=listing.__getitem__
+    )
+
+    assert [page[0]["slug"] for page in pages] == [f"law-{idx}" for idx in range(1, 6)]
+
+
+def test_fetch_lookup_pages_resumes(tmp_path):
+    """Test if an interrupted run only fetches the missing pages when resumed."""
+    listing = make_listing(6)
+    requested = []
+
+    def failing_get_json(url):
+        requested.append(url)
+        if url.endswith("page=4"):
+            raise ConnectionError("interrupted")
+        return listing[url]
+
+    with pytest.raises(ConnectionError):
+        fetch_lookup_pages(
+            SOURCE_URL,
+            checkpoint=PageCheckpoint(str(tmp_path), SOURCE_URL),
+            max_workers=1,
+            get_json=failing_get_json,
+        )
+
+    requested.clear()
+    pages = fetch_lookup_pages(
+        SOURCE_URL,
+        checkpoint=PageCheckpoint(str(tmp_path), SOURCE_URL),
+        max_workers=2,
+        get_json=lambda url: requested.append(url) or listing[url],
+    )
+
+    assert len(pages) == 6
+    assert f"{SOURCE_URL}&page=4" in requested
+    assert SOURCE_URL not in requested
+    assert f"{SOURCE_URL}&page=2" not in requested
+
+
+def test_checkpoint_of_other_url_is_discarded(tmp_path):
+    """Test if a checkpoint is not reused for a different listing."""
+    checkpoint = PageCheckpoint(str(tmp_path), SOURCE_URL)
+    checkpoint.save(1, {"data": []})
+
+    assert PageCheckpoint(str(tmp_path), "https://other.org").pages() == []
+
+
+def test_merge_lookup_only_updates_changed_slugs():
+    """Test if the delta merge reports added, changed and removed slugs."""
+    unchanged = {"slug": "bgb", "sourceTimestamp": "1"}
+    old_pages = [
+        [unchanged, {"slug": "zpo", "sourceTimestamp": "1"}],
+        [{"slug": "old"}],
+    ]
+    new_pages = [
+        [
+            {"slug": "bgb", "sourceTimestamp": "1"},
+            {"slug": "zpo", "sourceTimestamp": "2"},
+        ],
+        [{"slug": "new"}],
+    ]
+
+    merged, changes = merge_lookup(old_pages, new_pages)
+
+    assert changes == {"added": ["new"], "changed": ["zpo"], "removed": ["old"]}
+    assert merged[0][0] is unchanged
+    assert merged[0][1]["sourceTimestamp"] == "2"
+    assert merged[1] == [{"slug": "new"}]
@@ -0,0 +1,117 @@
+"""Test the metrics of the pipeline and the web app."""
+import json
+import os
+
+import pytest
+
+from lawinprogress.metrics import Counter, Histogram, MetricsRegistry, registry
+from lawinprogress.processing.law_cache import SizedTTLCache
+
+
+def test_render_counter_and_histogram():
+    """Test if the metrics are rendered in the Prometheus text format."""
+    metrics_registry = MetricsRegistry()
+    counter = Counter(
+        "test_total", "A counter.", ["kind"], metrics_registry=metrics_registry
+    )
+    histogram = Histogram(
+        "test_seconds",
+        "A histogram.",
+        buckets=(0.1, 1),
+        metrics_registry=metrics_registry,
+    )
+    counter.inc(kind='say "hi"')
+    counter.inc(2, kind='say "hi"')
+    histogram.observe(0.05)
+    histogram.observe(0.5)
+    histogram.observe(5)
+
+    assert metrics_registry.render().splitlines() == [
+        "# HELP test_total A counter.",
+        "# TYPE test_total counter",
+        'test_total{kind="say \\"hi\\""} 3',
+        "# HELP test_seconds A histogram.",
+        "# TYPE test_seconds histogram",
+        'test_seconds_bucket{le="0.1"} 1',
+        'test_seconds_bucket{le="1"} 2',
+        'test_seconds_bucket{le="+Inf"} 3',
+        "test_seconds_sum 5.55",
+        "test_seconds_count 3",
+    ]
+
+
+def test_labels_must_match():
+    """Test if a metric rejects labels it does not have."""
+    counter = Counter("test_total", "", ["kind"], metrics_registry=MetricsRegistry())
+    with pytest.raises(ValueError):
+        counter.inc(other="x")
+    with pytest.raises(ValueError):
+        Counter("test_total", "", metrics_registry=counter.registry)
+
+
+def test_histogram_time():
+    """Test if the time of a block is observed, also if it raises."""
+    histogram = Histogram("test_seconds", "", metrics_registry=MetricsRegistry())
+    with histogram.time():
+        pass
+    with pytest.raises(KeyError):
+        with histogram.time():
+            raise KeyError()
+    assert histogram.registry.collect()["test_seconds"][()][-1] == 2
+
+
+def test_collect_metrics_of_other_processes(tmp_path):
+    """Test if the metrics flushed by other processes are added to the own ones."""
+    # another process, even one that had the same pid
+    other = MetricsRegistry(str(tmp_path))
+    Counter("test_total", "", metrics_registry=other).inc(2)
+    other.flush()
+    (tmp_path / "1-broken.json").write_text("not json")
+
+    own = MetricsRegistry(str(tmp_path))
+    counter = Counter("test_total", "", metrics_registry=own)
+    counter.inc()
+    assert "test_total 3" in own.render().splitlines()
+
+    # the own file does not replace the one of the other process nor is counted twice
+    own.flush()
+    assert len(list(tmp_path.glob(f"{os.getpid()}-*.json"))) == 2
+    assert "test_total 3" in own.render().splitlines()
+
+    # a forked process starts without the metrics of its parent and has its own file
+    own.reset()
+    assert "test_total 3" in own.render().splitlines()
+    counter.inc()
+    own.flush()
+    assert "test_total 4" in own.render().splitlines()
+
+    # when the app starts again
+    own.clear()
+    assert not list(tmp_path.glob("*.json"))
+
+
+def test_flush_interval(tmp_path):
+    """Test if flushes closer than the interval are skipped."""
+    metrics_registry = MetricsRegistry(str(tmp_path))
+    counter = Counter("test_total", "", metrics_registry=metrics_registry)
+    counter.inc()
+    metrics_registry.flush(interval=60)
+    counter.inc()
+    metrics_registry.flush(interval=60)
+    (path,) = tmp_path.glob("*.json")
+    assert json.loads(path.read_text()) == {"test_total": [[[], [1]]]}
+    metrics_registry.flush()
+    assert json.loads(path.read_text()) == {"test_total": [[[], [2]]]}
+
+
+def test_cache_counts_lookups():
+    """Test if the lookups in a named cache are counted as hits and misses."""
+    cache = SizedTTLCache(max_bytes=10, ttl=60, sizeof=len, name="test")
+    cache.get("a")
+    cache.put("a", "x")
+    cache.get("a")
+    cache.get("a")
+    assert registry.collect()["lip_cache_requests_total"] == {
+        ("test", "hit"): [2],
+        ("test", "miss"): [1],
+    }
@@ -0,0 +1,291 @@
+"""Test processing the laws affected by a change law."""
+import multiprocessing
+import time
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from lawinprogress import pipeline
+from lawinprogress.deadline import Deadline
+from lawinprogress.libdiff.fragment_cache import DiffFragmentCache
+from lawinprogress.metrics import registry
+from lawinprogress.processing.source_law_retrieval import LawLookupIndex
+
+SOURCE_LAW = [
+    {
+        "id": 1,
+        "parent": None,
+        "name": "§ 1",
+        "title": "Test",
+        "body": "<P>(1) Text eins.</P><P>(2) Text zwei.</P>",
+    }
+]
+CHANGE_LAW_TEXT = (
+    "1. In § 1 Absatz 1 wird das Wort „Text“ durch das Wort „Wort“ ersetzt."
+)
+
+
+def fake_retrieve_source_law(law_title, index=None):
+    """Return a source law for all titles except 'Unbekannt' and fail for 'Kaputt'."""
+    if law_title == "Kaputt":
+        raise ValueError("broken law")
+    if law_title == "Unbekannt":
+        return None
+    return SOURCE_LAW
+
+
+@pytest.fixture
+def fake_retrieval(monkeypatch, tmp_path):
+    """Don't call the api to retrieve source laws; start and stop a fresh pool."""
+    monkeypatch.setattr(pipeline, "retrieve_source_law", fake_retrieve_source_law)
+    monkeypatch.setattr(
+        pipeline, "fragment_cache", DiffFragmentCache(str(tmp_path), 10**6)
+    )
+    pipeline.shutdown_executor()
+    yield
+    pipeline.shutdown_executor()
+
+
+def check_results(results):
+    """Check the results of processing the laws Gesetz, Kaputt, Unbekannt and Gesetz."""
+    assert [result.law_title for result in results] == [
+        "Gesetz",
+        "Kaputt",
+        "Unbekannt",
+        "Gesetz",
+    ]
+    assert results[0].n_success == results[0].n_changes == 1
+    assert "(1) Wort eins." in results[0].modified_text
+    assert "(1) Text eins." in results[0].source_text
+    assert any("1. Gesetz" in cell for row in results[0].html for cell in row)
+    assert results[1].error == "ValueError: broken law"
+    assert results[1].html == pipeline.FAILED_HTML
+    assert not results[2].source_law_found
+    assert results[2].html == pipeline.SOURCE_LAW_NOT_FOUND_HTML
+    assert any("4. Gesetz" in cell for row in results[3].html for cell in row)
+
+
+LAWS = [
+    ("Gesetz", CHANGE_LAW_TEXT),
+    ("Kaputt", CHANGE_LAW_TEXT),
+    ("Unbekannt", CHANGE_LAW_TEXT),
+    ("Gesetz", CHANGE_LAW_TEXT),
+]
+HTML_TITLES = [f"{idx+1}. {title}" for idx, (title, _) in enumerate(LAWS)]
+
+
+def test_process_laws_in_process(fake_retrieval):
+    """Test if laws are processed in order and a failing law does not stop the others."""
+    check_results(pipeline.process_laws(LAWS, html_titles=HTML_TITLES, workers=1))
+
+
+@pytest.mark.skipif(
+    multiprocessing.get_start_method() != "fork",
+    reason="the fake retrieval only reaches the workers of a forked pool",
+)
+def test_process_laws_in_worker_processes(fake_retrieval):
+    """Test if the worker processes return the results in the order of the laws."""
+    check_results(pipeline.process_laws(LAWS, html_titles=HTML_TITLES, workers=2))
+    # the pool is kept for the next upload
+    assert pipeline.get_executor() is pipeline.get_executor()
+
+
+def check_metrics():
+    """Check the metrics of processing the laws Gesetz, Kaputt, Unbekannt and Gesetz."""
+    collected = registry.collect()
+    assert collected["lip_laws_total"] == {
+        ("done",): [2],
+        ("failed",): [1],
+        ("source_law_not_found",): [1],
+    }
+    # the changes of the failed law are not known
+    assert collected["lip_changes_total"] == {(): [3]}
+    assert collected["lip_changes_applied_total"] == {(): [2]}
+    assert collected["lip_changes_failed_total"] == {(): [0]}
+    cache_requests = collected["lip_cache_requests_total"]
+    assert sum(count for count, in cache_requests.values()) == 2
+    stages = collected["lip_stage_seconds"]
+    # the count of observations is the last value of a histogram
+    assert stages[("change_parse",)][-1] == 4
+    assert stages[("diff",)][-1] == stages[("source_parse",)][-1]
+    return collected
+
+
+def test_process_laws_records_metrics(fake_retrieval):
+    """Test if the stages, laws, changes and cache lookups are recorded."""
+    pipeline.process_laws(LAWS, html_titles=HTML_TITLES, workers=1)
+    collected = check_metrics()
+    # the second law is served from the fragment cache
+    assert collected["lip_cache_requests_total"] == {
+        ("fragment", "hit"): [1],
+        ("fragment", "miss"): [1],
+    }
+    assert collected["lip_stage_seconds"][("source_parse",)][-1] == 1
+
+
+@pytest.mark.skipif(
+    multiprocessing.get_start_method() != "fork",
+    reason="the fake retrieval only reaches the workers of a forked pool",
+)
+def test_process_laws_records_metrics_of_worker_processes(fake_retrieval):
+    """Test if the metrics of the worker processes are added to the ones of the app."""
+    pipeline.process_laws(LAWS, html_titles=HTML_TITLES, workers=2)
+    check_metrics()
+
+
+def test_iter_process_laws_yields_each_law_when_done(fake_retrieval, monkeypatch):
+    """Test if a law is passed on before the next law is processed."""
+    processed = []
+
+    def fake_process_law(
+        law_title,
+        change_law_text,
+        html_title=None,
+        index=None,
+        exports=(),
+        deadline=None,
+    ):
+        processed.append(law_title)
+        return pipeline.LawResult(law_title=law_title)
+
+    monkeypatch.setattr(pipeline, "process_law", fake_process_law)
+    results = pipeline.iter_process_laws(LAWS, workers=1)
+    assert next(results).law_title == "Gesetz"
+    assert processed == ["Gesetz"]
+    assert [result.law_title for result in results] == ["Kaputt", "Unbekannt", "Gesetz"]
+
+
+def test_process_law_uses_cached_diff(fake_retrieval, monkeypatch):
+    """Test if a cached diff is used without parsing and applying the changes again."""
+    first = pipeline.process_law("Gesetz", CHANGE_LAW_TEXT, html_title="1. Gesetz")
+
+    def fail_parse_source_law(*args, **kwargs):
+        raise AssertionError("parsed the source law again")
+
+    monkeypatch.setattr(pipeline, "parse_source_law", fail_parse_source_law)
+    second = pipeline.process_law("Gesetz", CHANGE_LAW_TEXT, html_title="2. Gesetz")
+    assert second.n_success == first.n_success == 1
+    assert second.modified_text == first.modified_text
+    assert second.html == [
+        tuple(cell.replace("1. Gesetz", "2. Gesetz") for cell in row)
+        for row in first.html
+    ]
+    # other changes to the same law are not served from the cache
+    with pytest.raises(AssertionError):
+        pipeline.process_law("Gesetz", CHANGE_LAW_TEXT.replace("Wort", "Satz"))
+
+
+def slow_retrieve_source_law(law_title, index=None):
+    """Like fake_retrieve_source_law, but take a second for the law 'Langsam'."""
+    if law_title == "Langsam":
+        time.sleep(1)
+    return fake_retrieve_source_law(law_title, index=index)
+
+
+# other changes than the first law, so the slow law is not in the fragment cache
+SLOW_LAWS = [
+    ("Gesetz", CHANGE_LAW_TEXT),
+    ("Langsam", CHANGE_LAW_TEXT.replace("„Wort“", "„Satz“")),
+    ("Gesetz", CHANGE_LAW_TEXT),
+]
+
+
+def test_iter_process_laws_marks_unfinished_laws(fake_retrieval, monkeypatch):
+    """Test if the laws not done when the deadline runs out are marked unfinished."""
+    monkeypatch.setattr(pipeline, "retrieve_source_law", slow_retrieve_source_law)
+    results = pipeline.process_laws(SLOW_LAWS, workers=1, deadline=Deadline(0.5))
+    assert results[0].n_success == 1 and not results[0].unfinished
+    assert [result.unfinished for result in results] == [False, True, True]
+    assert results[2].html == pipeline.UNFINISHED_HTML
+    assert "0.5s" in results[2].error
+
+
+@pytest.mark.skipif(
+    multiprocessing.get_start_method() != "fork",
+    reason="the fake retrieval only reaches the workers of a forked pool",
+)
+def test_iter_process_laws_does_not_wait_for_unfinished_laws(
+    fake_retrieval, monkeypatch
+):
+    """Test if the results are returned when the deadline runs out in the workers."""
+    monkeypatch.setattr(pipeline, "retrieve_source_law", slow_retrieve_source_law)
+    start = time.time()
+    results = pipeline.process_laws(SLOW_LAWS, workers=2, deadline=Deadline(0.5))
+    assert time.time() - start < 1
+    assert not results[0].unfinished
+    assert results[1].unfinished
+
+
+class CancellingExecutor:
+    """Executor whose futures are cancelled, like a pool shut down meanwhile."""
+
+    def submit(self, *args, **kwargs):
+        future = Future()
+        future.cancel()
+        return future
+
+
+@pytest.mark.parametrize("deadline", [None, Deadline(60)])
+def test_iter_process_laws_fails_cancelled_laws(fake_retrieval, monkeypatch, deadline):
+    """Test if laws cancelled by a shut down pool fail, with or without deadline."""
+    monkeypatch.setattr(pipeline, "get_executor", lambda workers: CancellingExecutor())
+    results = pipeline.process_laws(LAWS, workers=2, deadline=deadline)
+    assert [result.html for result in results] == [pipeline.FAILED_HTML] * len(LAWS)
+    assert not any(result.unfinished for result in results)
+    assert results[0].error.startswith("CancelledError")
+
+
+def test_unfinished_without_deadline():
+    """Test if a law can be marked unfinished without a deadline."""
+    result = pipeline._unfinished("Gesetz", None)
+    assert result.unfinished
+    assert result.error == "Not finished within the time limit."
+
+
+class BrokenExecutor:
+    """Executor whose worker processes died."""
+
+    def __init__(self):
+        self.shutdown_calls = []
+
+    def submit(self, *args, **kwargs):
+        future = Future()
+        future.set_exception(BrokenProcessPool("a worker died"))
+        return future
+
+    def shutdown(self, **kwargs):
+        self.shutdown_calls.append(kwargs)
+
+
+def test_iter_process_laws_discards_broken_pool(fake_retrieval, monkeypatch):
+    """Test if a broken pool is dropped without waiting and cancelling other uploads."""
+    broken = BrokenExecutor()
+    monkeypatch.setattr(pipeline, "_executor", broken)
+    results = pipeline.process_laws(LAWS, workers=2)
+    assert results[0].error.startswith("BrokenProcessPool")
+    assert broken.shutdown_calls[0] == {"wait": False}
+    assert pipeline._executor is None
+
+
+def test_worker_index_keeps_the_lookup_of_the_upload(monkeypatch):
+    """Test if a worker only reloads the lookup if it has another version."""
+    retriever = pipeline.FuzzyLawSlugRetriever
+    current = LawLookupIndex({"Gesetz": "gesetz"}, version=(1,))
+    newer = LawLookupIndex({"Gesetz": "gesetz-2"}, version=(2,))
+    reloads = []
+
+    def fake_reload():
+        reloads.append(1)
+        retriever.index = newer
+        return True
+
+    monkeypatch.setattr(retriever, "index", current)
+    monkeypatch.setattr(retriever, "reload_if_changed", fake_reload)
+    assert pipeline._worker_index((1,)) is current
+    assert not reloads
+    assert pipeline._worker_index((2,)) is newer
+    assert len(reloads) == 1
+    # the version of the upload is gone; the newest is used
+    retriever.index = current
+    assert pipeline._worker_index((3,)) is newer
@@ -0,0 +1,140 @@
+"""Test serving the web app from forked workers."""
+import os
+import signal
+import threading
+import time
+
+import pytest
+
+from lawinprogress.app import prefork
+from lawinprogress.app.prefork import (
+    PreforkServer,
+    memory_usage,
+    pipeline_workers_per_worker,
+)
+
+SMAPS_ROLLUP = """55d0c0a00000-7ffd5a7e4000 ---p 00000000 00:00 0    [rollup]
+Rss:               10240 kB
+Pss:                6144 kB
+Shared_Clean:       4096 kB
+Shared_Dirty:       2048 kB
+Private_Clean:      1024 kB
+Private_Dirty:      3072 kB
+Swap:                  0 kB
+"""
+
+
+def test_memory_usage_from_smaps_rollup(monkeypatch, tmp_path):
+    """Test if the memory is read from the smaps_rollup of the process, in bytes."""
+    (tmp_path / "42").mkdir()
+    (tmp_path / "42" / "smaps_rollup").write_text(SMAPS_ROLLUP)
+    (tmp_path / "43").mkdir()
+    (tmp_path / "43" / "smaps_rollup").write_text("Rss: many kB\n")
+    monkeypatch.setattr(prefork, "PROC_DIR", str(tmp_path))
+
+    assert memory_usage(42) == {
+        "rss": 10240 * 1024,
+        "pss": 6144 * 1024,
+        "shared": 6144 * 1024,
+        "uss": 4096 * 1024,
+    }
+    assert memory_usage(43) is None
+    assert memory_usage(44) is None
+
+
+def test_pipeline_workers_per_worker(monkeypatch):
+    """Test if the pipeline pools of the workers share the cpus."""
+    monkeypatch.setattr(os, "cpu_count", lambda: 8)
+    assert pipeline_workers_per_worker(2) == 4
+    assert pipeline_workers_per_worker(3) == 2
+    assert pipeline_workers_per_worker(16) == 1
+
+
+def fake_run_worker(crashed_path):
+    """Worker that exits right away the first time and serves until stopped after."""
+
+    def run_worker(app, listen_socket, log_level):
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        if not os.path.exists(crashed_path):
+            open(crashed_path, "w", encoding="utf8").close()
+            return
+        time.sleep(60)
+
+    return run_worker
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="workers are forked")
+def test_prefork_server_restarts_and_stops_workers(monkeypatch, tmp_path):
+    """Test if a worker that exits is restarted and all are stopped on SIGTERM."""
+    monkeypatch.setattr(
+        prefork, "_run_worker", fake_run_worker(str(tmp_path / "crashed"))
+    )
+    monkeypatch.setattr(prefork, "_master_pid", None)
+    server = PreforkServer(app=None, host="127.0.0.1", port=0, workers=2)
+    spawned = []
+    spawn = server._spawn
+
+    def record_spawn():
+        spawned.append(spawn())
+        return spawned[-1]
+
+    monkeypatch.setattr(server, "_spawn", record_spawn)
+
+    def stop_when_restarted():
+        deadline = time.monotonic() + 10
+        while len(spawned) < 3 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        os.kill(os.getpid(), signal.SIGTERM)
+
+    handlers = {
+        signum: signal.getsignal(signum) for signum in (signal.SIGTERM, signal.SIGINT)
+    }
+    stopper = threading.Thread(target=stop_when_restarted)
+    stopper.start()
+    try:
+        server.run()
+    finally:
+        stopper.join()
+        for signum, handler in handlers.items():
+            signal.signal(signum, handler)
+
+    # one of the first two workers exited and was replaced by the third
+    assert len(spawned) == 3
+    assert spawned[2] in server.pids and len(set(server.pids)) == 2
+    for pid in spawned:
+        with pytest.raises(ChildProcessError):
+            os.waitpid(pid, os.WNOHANG)
+    assert not prefork.is_worker()
+
+
+@pytest.mark.skipif(
+    not os.path.exists("/proc/self/smaps_rollup"),
+    reason="the memory maps of processes are only read on linux",
+)
+def test_memory_usage():
+    """Test if a forked child shares the pages until it writes to them."""
+    size = 64 * 2**20
+    data = bytearray(b"x" * size)
+    to_child, from_parent = os.pipe()
+    from_child, to_parent = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.read(to_child, 1)
+        # write to every page
+        data[::4096] = b"y" * len(data[::4096])
+        os.write(to_parent, b"1")
+        os.read(to_child, 1)
+        os._exit(0)
+    try:
+        before = memory_usage(pid)
+        os.write(from_parent, b"1")
+        os.read(from_child, 1)
+        after = memory_usage(pid)
+    finally:
+        os.write(from_parent, b"1")
+        os.waitpid(pid, 0)
+
+    assert before["uss"] + before["shared"] == before["rss"]
+    assert before["uss"] < size / 2 <= before["shared"]
+    assert after["uss"] - before["uss"] >= size * 0.9
+    assert memory_usage(pid) is None
@@ -0,0 +1,55 @@
+"""Test the store of the results of change law pdfs."""
+from lawinprogress.result_store import ResultStore, pdf_hash
+
+
+def test_result_store(tmp_path):
+    """Test if the results are stored by the hash of the pdf."""
+    store = ResultStore(str(tmp_path))
+    key = pdf_hash(b"%PDF-1.4 Drucksache")
+    assert key == pdf_hash(b"%PDF-1.4 Drucksache") != pdf_hash(b"%PDF-1.4 Entwurf")
+    assert store.get_overview(key) is None
+    assert store.get_rows(key, 0) is None
+    assert store.get_pdf(key) is None
+
+    store.put_pdf(key, b"%PDF-1.4 Drucksache")
+    store.put_overview(key, {"name": "drucksache.pdf", "laws": [["Gesetz", "Text"]]})
+    store.put_rows(key, 0, [("alt", "", "neu")])
+    assert store.get_pdf(key) == b"%PDF-1.4 Drucksache"
+    assert store.get_overview(key) == {
+        "name": "drucksache.pdf",
+        "laws": [["Gesetz", "Text"]],
+    }
+    assert store.get_rows(key, 0) == [("alt", "", "neu")]
+    assert store.get_rows(key, 1) is None
+    # keys which are no file names are not looked up
+    assert store.get_pdf("../" + key) is None
+    assert store.get_overview("../" + key) is None
+
+
+def test_result_store_version(tmp_path):
+    """Test if results of other pipeline versions are not used, but the pdf is kept."""
+    key = pdf_hash(b"%PDF")
+    old_store = ResultStore(str(tmp_path), version=1)
+    old_store.put_pdf(key, b"%PDF")
+    old_store.put_overview(key, {"name": "drucksache.pdf"})
+    old_store.put_rows(key, 0, [("alt", "", "neu")])
+
+    new_store = ResultStore(str(tmp_path), version=2)
+    assert new_store.get_overview(key) is None
+    assert new_store.get_rows(key, 0) is None
+    assert new_store.get_pdf(key) == b"%PDF"
+
+
+def test_result_store_pdf_file(tmp_path):
+    """Test if a pdf is stored from a file and its path is looked up."""
+    store = ResultStore(str(tmp_path / "results"))
+    pdf_path = tmp_path / "upload.pdf"
+    pdf_path.write_bytes(b"%PDF-1.4 Drucksache")
+    key = pdf_hash(b"%PDF-1.4 Drucksache")
+    assert store.pdf_path(key) is None
+
+    store.put_pdf_file(key, str(pdf_path))
+    assert store.get_pdf(key) == b"%PDF-1.4 Drucksache"
+    with open(store.pdf_path(key), "rb") as stored:
+        assert stored.read() == b"%PDF-1.4 Drucksache"
+    assert store.pdf_path("../" + key) is None
@@ -0,0 +1,84 @@
+"""Test the rule-based sentence splitter for statute texts."""
+import pytest
+
+from lawinprogress.parsing.sentence_rules import sentence_spans, split_sentences
+from lawinprogress.parsing.sentence_segmentation import SentenceSegmenter
+
+
+def test_split_simple_sentences():
+    """Test if basic multi-sentence text is properly split."""
+    sentences = split_sentences("This is a sentence. This is another sentence.")
+
+    assert sentences == ["This is a sentence.", "This is another sentence."]
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "Es gilt § 3 Abs. 1 Nr. 2 Buchst. a entsprechend.",
+        "Die Verordnung vom 2. Juli 2021 (BGBl. I S. 2345) gilt.",
+        "Dies gilt i. V. m. § 5 z. B. für Anträge.",
+        "Der 3. Abschnitt bleibt unberührt.",
+        "Die Frist endet am 31. Dezember 2025.",
+        "Am 31. 12. 2025 endet die Frist.",
+    ],
+)
+def test_abbreviations_dates_and_ordinals_do_not_split(text):
+    """Test if statute abbreviations, dates and ordinals are kept in one sentence."""
+    assert split_sentences(text) == [text]
+
+
+def test_split_after_enumeration_letter_and_numeric_date():
+    """Test if a sentence ending with a lowercase letter or a numeric date is split."""
+    assert split_sentences("Es gilt Buchstabe a. Satz 2 bleibt.") == [
+        "Es gilt Buchstabe a.",
+        "Satz 2 bleibt.",
+    ]
+    assert split_sentences("Das gilt ab 1. 1. 2020. Danach nicht.") == [
+        "Das gilt ab 1. 1. 2020.",
+        "Danach nicht.",
+    ]
+
+
+def test_split_after_number_and_quotes():
+    """Test if sentences ending with a number or a quote are split."""
+    text = "Die Erlaubnis nach Satz 1 ist nachzuholen. Es gilt „Satz 2.“ Ende nach Nummer 3. Neu."
+
+    assert split_sentences(text) == [
+        "Die Erlaubnis nach Satz 1 ist nachzuholen.",
+        "Es gilt „Satz 2.“",
+        "Ende nach Nummer 3.",
+        "Neu.",
+    ]
+
+
+def test_hard_statute_text():
+    """Test if a long statute text is split at its full stops only."""
+    text = """Auch für Aufgrabungen und Baumaßnahmen der Versorgungsunternehmen im  Zusammenhang  mit  Maßnahmen  nach  den  Absätzen  5  und  6  bedarf  es  der  straßenrechtlichen  Erlaubnis.  Notfälle,  in  denen  sofortiges  Handeln  zur  Schadensabwehr geboten ist, sind der Straßenbaubehörde anzuzeigen; die Einholung der Erlaubnis nach  Satz  1  ist  unverzüglich  nachzuholen.  Eine  Sicherheitsleistung  darf  nur  verlangt  werden."""
+
+    sentences = split_sentences(text)
+
+    assert len(sentences) == 3
+    assert sentences[1].startswith("Notfälle,")
+    assert all(not sentence[0].isspace() for sentence in sentences)
+
+
+def test_sentence_spans_are_offsets():
+    """Test if the spans point to the sentences in the text."""
+    text = "  Erster Satz.   Zweiter Satz.  "
+
+    assert [text[start:end] for start, end in sentence_spans(text)] == [
+        "Erster Satz.",
+        "Zweiter Satz.",
+    ]
+
+
+def test_segmenter_with_rules_backend():
+    """Test if the segmenter can be configured to use the rule-based splitter."""
+    segmenter = SentenceSegmenter(backend="rules")
+    segmenter.prefetch(["Satz eins. Satz zwei."])
+
+    assert segmenter.split("Satz eins. Satz zwei.") == ["Satz eins.", "Satz zwei."]
+    assert segmenter.hits == 1
+    with pytest.raises(ValueError):
+        SentenceSegmenter(backend="unknown")
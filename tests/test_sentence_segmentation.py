@@ -0,0 +1,103 @@
+"""Test the batched and cached sentence segmentation."""
+from lawinprogress.apply_changes.apply_changes import apply_changes
+from lawinprogress.parsing.lawtree import LawTextNode
+from lawinprogress.parsing.parse_change_law import Change
+from lawinprogress.parsing.sentence_segmentation import SEGMENTER, SentenceSegmenter
+
+
+class FakeSpan:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeDoc:
+    def __init__(self, text):
+        self.sents = [
+            FakeSpan(sent.strip() + ".") for sent in text.split(".") if sent.strip()
+        ]
+
+
+class CountingNLP:
+    """Split on dots and count the calls to the pipeline."""
+
+    def __init__(self):
+        self.n_calls = 0
+        self.n_piped = 0
+
+    def __call__(self, text):
+        self.n_calls += 1
+        return FakeDoc(text)
+
+    def pipe(self, texts, batch_size=1):
+        for text in texts:
+            self.n_piped += 1
+            yield FakeDoc(text)
+
+
+def test_split_is_cached():
+    """Test if a text is only segmented once and callers get independent lists."""
+    nlp = CountingNLP()
+    segmenter = SentenceSegmenter(nlp=nlp)
+
+    first = segmenter.split("Satz eins. Satz zwei.")
+    first.pop()
+    second = segmenter.split("Satz eins. Satz zwei.")
+
+    assert nlp.n_calls == 1
+    assert second == ["Satz eins.", "Satz zwei."]
+    assert segmenter.hits == 1
+
+
+def test_prefetch_segments_in_batch():
+    """Test if prefetched texts are piped once and not segmented again."""
+    nlp = CountingNLP()
+    segmenter = SentenceSegmenter(nlp=nlp)
+
+    segmenter.prefetch(["A. B.", "C. D.", "A. B."])
+    segmenter.split("A. B.")
+    segmenter.split("C. D.")
+
+    assert nlp.n_piped == 2
+    assert nlp.n_calls == 0
+
+
+def test_cache_is_bounded_and_invalidated():
+    """Test if the least recently used texts are dropped and invalidation works."""
+    nlp = CountingNLP()
+    segmenter = SentenceSegmenter(maxsize=2, nlp=nlp)
+    for text in ["A.", "B.", "C."]:
+        segmenter.split(text)
+    segmenter.split("A.")
+    assert nlp.n_calls == 4
+
+    segmenter.invalidate("C.")
+    segmenter.split("C.")
+    assert nlp.n_calls == 5
+
+
+def test_apply_changes_prefetches_sentence_changes(monkeypatch):
+    """Test if apply_changes segments the targeted nodes upfront."""
+    nlp = CountingNLP()
+    monkeypatch.setattr(SEGMENTER, "_nlp", nlp)
+    SEGMENTER.clear()
+    tree = LawTextNode(text="Gesetz", bulletpoint="Titel:")
+    LawTextNode(text="Satz eins. Satz zwei. Satz drei.", bulletpoint="§ 1", parent=tree)
+    changes = [
+        Change(
+            ["§ 1"],
+            ["Satz 1"],
+            ["Neuer Satz."],
+            "rephrase",
+            "§ 1 Satz 1 wird neu gefasst",
+        ),
+        Change(["§ 1"], ["Satz 3"], [], "cancelled", "§ 1 Satz 3 wird aufgehoben"),
+    ]
+
+    res_tree, _, n_success = apply_changes(tree, changes)
+
+    assert n_success == 2
+    assert res_tree.children[0].text == "Neuer Satz. Satz zwei."
+    assert nlp.n_piped == 1
+    # the second change sees the changed text and has to segment it again
+    assert nlp.n_calls == 1
+    SEGMENTER.clear()
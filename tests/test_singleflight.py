@@ -0,0 +1,169 @@
+"""Test coalescing concurrent identical work."""
+import threading
+import time
+
+import pytest
+
+from lawinprogress.singleflight import SingleFlight, single_flight
+
+
+def run_threads(n_threads: int, target) -> tuple:
+    """Start target in threads; return them and the list their results are added to."""
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(target()))
+        for _ in range(n_threads)
+    ]
+    for thread in threads:
+        thread.start()
+    return threads, results
+
+
+def test_do_shares_one_call():
+    """Test if concurrent callers of a key wait for one call and share its result."""
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def compute(value):
+        calls.append(value)
+        started.set()
+        release.wait(timeout=10)
+        return value * 2
+
+    leader, leader_results = run_threads(1, lambda: flight.do("a", compute, 21))
+    started.wait(timeout=10)
+    followers, results = run_threads(4, lambda: flight.do("a", compute, 0))
+    # another key is not coalesced
+    assert flight.do("b", lambda: "other") == "other"
+    # let the followers wait for the leader
+    time.sleep(0.2)
+    release.set()
+    for thread in leader + followers:
+        thread.join()
+
+    assert calls == [21]
+    assert leader_results + results == [42] * 5
+    # later calls start a new computation
+    assert flight.do("a", compute, 1) == 2
+
+
+def test_do_shares_errors():
+    """Test if the error of the shared call is raised in every caller."""
+    flight = SingleFlight()
+
+    def fail():
+        raise ValueError("broken")
+
+    with pytest.raises(ValueError, match="broken"):
+        flight.do("a", fail)
+    assert flight.do("a", lambda: "ok") == "ok"
+
+
+def test_iterate_produces_items_once():
+    """Test if every consumer gets all items while they are produced once."""
+    flight = SingleFlight()
+    produced = []
+
+    def items(n_items):
+        for item in range(n_items):
+            produced.append(item)
+            yield item
+
+    first = flight.iterate("a", items, 3)
+    second = flight.iterate("a", items, 3)
+    assert next(first) == 0
+    assert list(second) == [0, 1, 2]
+    assert list(first) == [1, 2]
+    assert produced == [0, 1, 2]
+    # finished iterators are not shared anymore
+    assert list(flight.iterate("a", items, 2)) == [0, 1]
+
+
+def test_iterate_drops_passed_items():
+    """Test if items are only kept until every consumer got them."""
+    flight = SingleFlight()
+    produced = []
+
+    def items(n_items):
+        for item in range(n_items):
+            produced.append(item)
+            yield item
+
+    first = flight.iterate("a", items, 3)
+    second = flight.iterate("a", items, 3)
+    assert next(first) == 0
+    shared = flight._iterators["a"]
+    assert list(shared.items) == [0]
+    assert next(second) == 0
+    assert not shared.items
+    assert next(first) == 1
+    # the first item is gone; a later consumer starts over
+    third = flight.iterate("a", items, 3)
+    assert list(third) == [0, 1, 2]
+    assert list(first) == [2] and list(second) == [1, 2]
+    assert produced == [0, 1, 0, 1, 2, 2]
+    assert not shared.items
+
+
+def test_iterate_closes_abandoned_iterators():
+    """Test if the iterator is closed once no consumer is left."""
+    flight = SingleFlight()
+    closed = []
+
+    def items():
+        try:
+            yield from range(10)
+        finally:
+            closed.append(True)
+
+    first = flight.iterate("a", items)
+    second = flight.iterate("a", items)
+    assert next(first) == next(second) == 0
+    first.close()
+    assert not closed
+    assert next(second) == 1
+    second.close()
+    assert closed == [True]
+    assert next(flight.iterate("a", items)) == 0
+
+
+def test_iterate_shares_errors():
+    """Test if every consumer gets the items before the error and then the error."""
+    flight = SingleFlight()
+
+    def items():
+        yield 1
+        raise ValueError("broken")
+
+    first = flight.iterate("a", items)
+    second = flight.iterate("a", items)
+    assert next(first) == next(second) == 1
+    with pytest.raises(ValueError):
+        next(first)
+    with pytest.raises(ValueError):
+        next(second)
+
+
+def test_single_flight_decorator():
+    """Test if the decorator coalesces calls with the same arguments."""
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    @single_flight
+    def fetch(slug):
+        calls.append(slug)
+        started.set()
+        release.wait(timeout=10)
+        return slug.upper()
+
+    leader, _ = run_threads(1, lambda: fetch("bgb"))
+    started.wait(timeout=10)
+    followers, results = run_threads(3, lambda: fetch("bgb"))
+    time.sleep(0.2)
+    release.set()
+    for thread in leader + followers:
+        thread.join()
+    assert calls == ["bgb"]
+    assert results == ["BGB"] * 3
+    assert fetch.__name__ == "fetch"
@@ -1,7 +1,12 @@
 """ test the functions for getting and handling source laws """
+import json
+import os
+import time
+
 import pytest
 import requests
 
+from lawinprogress.processing import source_law_retrieval
 from lawinprogress.processing.source_law_retrieval import (
     FuzzyLawSlugRetriever,
     get_source_law_rechtsinformationsportal,
@@ -10,6 +15,9 @@ from lawinprogress.processing.source_law_retrieval import (
 
 class MockResponse:
 
+    # mock response without any caching headers
+    headers = {}
+
     # mock status_code property always returns 200
     @property
     def status_code(self):
@@ -74,3 +82,56 @@ def test_fuzzy_slug_retrieval(test_law_title, expected_slug):
     """Test if slug retieval works and fails as expected."""
     slug = FuzzyLawSlugRetriever.fuzzyfind(test_law_title)
     assert slug == expected_slug
+
+
+@pytest.fixture(scope="function")
+def temporary_lookup(tmp_path, monkeypatch):
+    """Point the retriever to a temporary lookup file and restore it afterwards."""
+    lookup_path = tmp_path / "lookup.json"
+
+    def write_lookup(laws):
+        tmp_file = tmp_path / "lookup.json.tmp"
+        tmp_file.write_text(json.dumps([laws]), encoding="utf8")
+        os.replace(tmp_file, lookup_path)
+
+    write_lookup(
+        [{"titleShort": "Zivilprozessordnung", "titleLong": None, "slug": "zpo"}]
+    )
+    monkeypatch.setattr(
+        source_law_retrieval, "SOURCE_LAW_LOOKUP_PATH", str(lookup_path)
+    )
+    monkeypatch.setattr(FuzzyLawSlugRetriever, "index", None)
+    yield write_lookup
+    FuzzyLawSlugRetriever.stop_reloader()
+
+
+def test_lookup_reload_swaps_index(temporary_lookup):
+    """Test if a new lookup file is picked up and the memoized results are dropped."""
+    snapshot = FuzzyLawSlugRetriever.get_index()
+    assert FuzzyLawSlugRetriever.fuzzyfind("Zivilprozessordnung") == "zpo"
+    assert not FuzzyLawSlugRetriever.reload_if_changed()
+
+    temporary_lookup(
+        [{"titleShort": "Zivilprozessordnung", "titleLong": None, "slug": "zpo_neu"}]
+    )
+
+    assert FuzzyLawSlugRetriever.reload_if_changed()
+    assert FuzzyLawSlugRetriever.fuzzyfind("Zivilprozessordnung") == "zpo_neu"
+    # the old snapshot stays consistent for requests still using it
+    assert snapshot.fuzzyfind("Zivilprozessordnung") == "zpo"
+
+
+def test_lookup_reloader_thread(temporary_lookup):
+    """Test if the background reloader swaps in a new lookup."""
+    FuzzyLawSlugRetriever.get_index()
+    FuzzyLawSlugRetriever.start_reloader(interval=0.01)
+
+    temporary_lookup(
+        [{"titleShort": "Strafprozessordnung", "titleLong": None, "slug": "stpo"}]
+    )
+    for _ in range(200):
+        if "Strafprozessordnung" in FuzzyLawSlugRetriever.get_lookup():
+            break
+        time.sleep(0.01)
+
+    assert FuzzyLawSlugRetriever.fuzzyfind("Strafprozessordnung") == "stpo"
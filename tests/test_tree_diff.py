@@ -0,0 +1,103 @@
+"""Test diffing law trees by their subtree hashes."""
+import copy
+
+import pytest
+
+from lawinprogress.libdiff.html_diff import html_diffs, html_tree_diffs
+from lawinprogress.libdiff.tree_diff import align_trees
+from lawinprogress.parsing.lawtree import LawTextNode
+
+
+@pytest.fixture(scope="function")
+def law_tree() -> LawTextNode:
+    """Return a law tree with some paragraphs."""
+    tree = LawTextNode(text="Gesetz", bulletpoint="Titel:")
+    for paragraph in range(1, 6):
+        node = LawTextNode(
+            text=f"Paragraph {paragraph}.", bulletpoint=f"§ {paragraph}", parent=tree
+        )
+        for absatz in range(1, 4):
+            absatz_node = LawTextNode(
+                text=f"Absatz {absatz} von § {paragraph}. (weggefallen)",
+                bulletpoint=f"({absatz})",
+                parent=node,
+            )
+            LawTextNode(text="Nummer eins.", bulletpoint="1.", parent=absatz_node)
+    return tree
+
+
+def test_subtree_hashes(law_tree):
+    """Test if subtrees with the same content have the same hash."""
+    other_tree = copy.deepcopy(law_tree)
+    hashes, other_hashes = law_tree.subtree_hashes(), other_tree.subtree_hashes()
+
+    assert hashes[id(law_tree)] == other_hashes[id(other_tree)]
+    # the subtrees of 1. nodes are the same everywhere
+    assert len({hashes[id(node)] for node in law_tree.leaves}) == 1
+
+    other_tree.children[2].children[1].text = "Neuer Text."
+    changed_hashes = other_tree.subtree_hashes()
+    assert changed_hashes[id(other_tree)] != hashes[id(law_tree)]
+    assert (
+        changed_hashes[id(other_tree.children[1])] == hashes[id(law_tree.children[1])]
+    )
+
+
+def test_align_identical_trees(law_tree):
+    """Test if identical trees give equal lines only."""
+    aligned = align_trees(law_tree, copy.deepcopy(law_tree))
+
+    assert [line_a for line_a, _, _ in aligned] == law_tree.to_text().split("\n")
+    assert all(equal for _, _, equal in aligned)
+
+
+def edit_text(tree):
+    tree.children[2].children[1].text = "Absatz 2 von § 3. (geändert)"
+
+
+def insert_node(tree):
+    tree.children[1].insert_child(text="Neuer Absatz.", bulletpoint="(2)")
+
+
+def remove_node(tree):
+    tree.children[3].remove_child(bulletpoint="(1)")
+
+
+def replace_and_append(tree):
+    tree.children[0].remove_child(bulletpoint="(1)")
+    tree.children[0].insert_child(text="Angehängt.", bulletpoint="(3)")
+    tree.children[4].text = "Neu."
+
+
+@pytest.mark.parametrize("edit", [edit_text, insert_node, replace_and_append])
+def test_tree_diff_html_is_identical_to_text_diff(law_tree, edit):
+    """Test if the tree diff renders the same html as diffing the texts of the trees."""
+    new_tree = copy.deepcopy(law_tree)
+    edit(new_tree)
+
+    assert html_tree_diffs(law_tree, new_tree, [], title="T") == html_diffs(
+        law_tree.to_text(), new_tree.to_text(), [], title="T"
+    )
+
+
+def test_tree_diff_marks_only_changed_lines(law_tree):
+    """Test if repeated lines in unchanged nodes are not marked as changed."""
+    new_tree = copy.deepcopy(law_tree)
+    remove_node(new_tree)
+
+    # difflib breaks the tie between the repeated 1. lines like this
+    aligned = align_trees(law_tree, new_tree, engine="difflib")
+
+    # only the lines of § 4 differ
+    assert [(line_a, line_b) for line_a, line_b, equal in aligned if not equal] == [
+        (
+            "        (1) Absatz 1 von § 4. (weggefallen)",
+            "        (1) Absatz 2 von § 4. (weggefallen)",
+        ),
+        (
+            "        (2) Absatz 2 von § 4. (weggefallen)",
+            "        (2) Absatz 3 von § 4. (weggefallen)",
+        ),
+        ("        (3) Absatz 3 von § 4. (weggefallen)", ""),
+        ("            1. Nummer eins.", ""),
+    ]
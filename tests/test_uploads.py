@@ -0,0 +1,89 @@
+"""Test spooling and checking uploaded pdfs."""
+import hashlib
+import io
+
+import pytest
+
+from lawinprogress.app.uploads import (
+    UploadRejected,
+    accept_upload,
+    check_content_length,
+    spool_upload,
+)
+
+
+def make_pdf(n_pages: int) -> bytes:
+    """A minimal pdf with empty pages."""
+    kids = " ".join(f"{3 + idx} 0 R" for idx in range(n_pages))
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        f"<< /Type /Pages /Kids [{kids}] /Count {n_pages} >>".encode(),
+    ] + [b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] >>"] * n_pages
+    pdf = b"%PDF-1.4\n"
+    offsets = []
+    for idx, obj in enumerate(objects):
+        offsets.append(len(pdf))
+        pdf += f"{idx + 1} 0 obj\n".encode() + obj + b"\nendobj\n"
+    xref_offset = len(pdf)
+    pdf += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    pdf += b"".join(f"{offset:010d} 00000 n \n".encode() for offset in offsets)
+    pdf += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\n".encode()
+    pdf += f"startxref\n{xref_offset}\n%%EOF\n".encode()
+    return pdf
+
+
+def test_spool_upload(tmp_path):
+    """Test if an upload is copied to disk and hashed."""
+    data = b"%PDF-1.4 " + b"x" * 200_000
+    upload = spool_upload(io.BytesIO(data), max_bytes=10**6, directory=str(tmp_path))
+    assert upload.sha256 == hashlib.sha256(data).hexdigest()
+    assert upload.size == len(data)
+    with open(upload.path, "rb") as spooled:
+        assert spooled.read() == data
+    upload.remove()
+    assert not list(tmp_path.iterdir())
+
+
+def test_spool_upload_too_large(tmp_path):
+    """Test if uploads beyond the limit are rejected and not kept."""
+    with pytest.raises(UploadRejected) as err:
+        spool_upload(io.BytesIO(b"x" * 1001), max_bytes=1000, directory=str(tmp_path))
+    assert err.value.status_code == 413
+    assert not list(tmp_path.iterdir())
+    # 0 disables the limit
+    spool_upload(io.BytesIO(b"x" * 1001), max_bytes=0, directory=str(tmp_path))
+
+
+def test_accept_upload(tmp_path):
+    """Test if pdfs are accepted up to the page limit."""
+    upload = accept_upload(
+        io.BytesIO(make_pdf(3)), max_pages=3, directory=str(tmp_path)
+    )
+    assert upload.n_pages == 3
+    upload.remove()
+
+    with pytest.raises(UploadRejected) as err:
+        accept_upload(io.BytesIO(make_pdf(4)), max_pages=3, directory=str(tmp_path))
+    assert err.value.status_code == 413
+    assert "4 Seiten" in str(err.value)
+    assert not list(tmp_path.iterdir())
+
+
+@pytest.mark.parametrize(
+    "data", [b"", b"<html>kein pdf</html>", b"%PDF-1.4\nabgeschnitten"]
+)
+def test_accept_upload_no_pdf(tmp_path, data):
+    """Test if files that are no readable pdfs are rejected."""
+    with pytest.raises(UploadRejected) as err:
+        accept_upload(io.BytesIO(data), directory=str(tmp_path))
+    assert err.value.status_code == 422
+    assert not list(tmp_path.iterdir())
+
+
+def test_check_content_length():
+    """Test if requests are rejected by their Content-Length."""
+    check_content_length(None, max_bytes=1000)
+    check_content_length("1000", max_bytes=1000)
+    check_content_length(str(10**9), max_bytes=0)
+    with pytest.raises(UploadRejected):
+        check_content_length(str(10**9), max_bytes=1000)